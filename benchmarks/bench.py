@@ -0,0 +1,217 @@
+import argparse
+import asyncio
+import json
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from gofile_dl.downloader import (
+    FolderWalker,
+    GoFileAPI,
+    GoFileDownloader,
+    ProgressTracker,
+    create_writer,
+)
+from gofile_dl.session import create_session
+
+from .mock_gofile import MockConfig, MockGofile
+
+# "<ファイル数>x<サイズ>[/<フォルダ数>]"
+CASE_PATTERN = re.compile(r"(\d+)x(\d+)([KMG]?)(?:/(\d+))?", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+DEFAULT_CASES = ["1x256M", "16x16M", "256x1M", "2048x16K/32"]
+
+# 指標と、値が大きいほど良いかどうか
+METRICS = {
+    "throughput_mb_s": True,
+    "listing_seconds": False,
+    "peak_rss_mb": False,
+    "cpu_seconds_per_gb": False,
+}
+
+
+def parse_case(case: str) -> Tuple[int, int, int]:
+    """ケースの指定を (ファイル数, サイズ, フォルダ数) に変換"""
+    match = CASE_PATTERN.fullmatch(case)
+    if not match:
+        raise ValueError(f"Invalid benchmark case: {case}")
+    files, size, unit, folders = match.groups()
+    return (
+        int(files),
+        int(size) * SIZE_UNITS[unit.upper()],
+        int(folders or 1),
+    )
+
+
+async def run_case(case: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """モックサーバーを起動し、別プロセスでケースを計測"""
+    files, size, folders = parse_case(case)
+    mock = MockGofile(
+        MockConfig(latency=args.latency, bandwidth=args.bandwidth)
+    )
+    root = mock.build_tree(files, size, folders)
+    runs = []
+    async with mock:
+        spec = {
+            "content_url": mock.content_url,
+            "root": root,
+            "writer": args.writer,
+            "connections": args.connections,
+            "tmpdir": args.tmpdir,
+        }
+        for _ in range(args.repeat):
+            # 計測のたびに新しいプロセスでピークメモリを測る
+            process = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-m",
+                "benchmarks.bench",
+                "--worker",
+                json.dumps(spec),
+                stdout=asyncio.subprocess.PIPE,
+            )
+            stdout, _ = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(f"Benchmark worker failed for {case}")
+            runs.append(json.loads(stdout))
+
+    result: Dict[str, Any] = {
+        "case": case,
+        "files": files,
+        "file_size": size,
+        "folders": folders,
+        "runs": len(runs),
+        "status": runs[-1]["status"],
+    }
+    for metric in METRICS:
+        result[metric] = round(statistics.median(r[metric] for r in runs), 3)
+    return result
+
+
+async def measure(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """一覧の取得とダウンロードを計測（ワーカープロセスで実行）"""
+    GoFileAPI.CONTENT_URL = spec["content_url"]
+    async with create_session() as session:
+        # 一覧の取得のみの時間
+        started = time.perf_counter()
+        api = GoFileAPI(session, "bench")
+        content_data = await api.fetch_content(spec["root"])
+        entries = await FolderWalker(api).walk(content_data)
+        listing_seconds = time.perf_counter() - started
+
+        downloader = GoFileDownloader(
+            session,
+            "bench",
+            max_concurrent_downloads=spec["connections"],
+            progress=ProgressTracker("none"),
+            writer=create_writer(spec["writer"]),
+        )
+        await downloader.init()
+        with tempfile.TemporaryDirectory(dir=spec["tmpdir"]) as output:
+            started = time.perf_counter()
+            cpu_started = time.process_time()
+            result = await downloader.download(spec["root"], output_dir=output)
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+
+    total = sum(entry.size or 0 for entry in entries)
+    # Linuxの ru_maxrss はKiB単位
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "status": result["status"],
+        "bytes": total,
+        "elapsed": elapsed,
+        "throughput_mb_s": total / elapsed / 1024**2,
+        "listing_seconds": listing_seconds,
+        "peak_rss_mb": peak_kib / 1024,
+        "cpu_seconds_per_gb": cpu / (total / 1024**3) if total else 0.0,
+    }
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """ベースラインより tolerance を超えて悪化した指標を列挙"""
+    previous = {result["case"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result["case"])
+        if not before:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = before[metric], result[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(
+                    f"{result['case']} {metric}: {old} -> {new} "
+                    f"({change:+.1%})"
+                )
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> int:
+    """全ケースを計測して結果を出力"""
+    results = [await run_case(case, args) for case in args.cases]
+    report: Dict[str, Any] = {"results": results}
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        report["regressions"] = compare(results, baseline, args.tolerance)
+
+    text = json.dumps(report, indent=2) + "\n"
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    sys.stdout.write(text)
+    return 1 if report.get("regressions") else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """引数パーサーを生成"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark GoFileDownloader against a mock Gofile"
+    )
+    parser.add_argument(
+        "cases",
+        nargs="*",
+        default=DEFAULT_CASES,
+        help="'<files>x<size>[/<folders>]', e.g. 16x16M or 2048x16K/32",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float, help="bytes/s per file")
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--writer", default="auto")
+    parser.add_argument("--tmpdir", help="where downloaded files are written")
+    parser.add_argument("--output", help="also write the results here")
+    parser.add_argument("--baseline", help="results to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed relative regression against the baseline",
+    )
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ベンチマークのエントリーポイント"""
+    args = build_parser().parse_args(argv)
+    if args.worker:
+        result = asyncio.run(measure(json.loads(args.worker)))
+        sys.stdout.write(json.dumps(result))
+        return
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
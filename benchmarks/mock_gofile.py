@@ -0,0 +1,403 @@
+import argparse
+import asyncio
+import contextlib
+import gzip
+import hashlib
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Set, Tuple
+
+from aiohttp import web
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+BLOCK_SIZE = 64 * 1024
+
+
+@dataclass
+class MockConfig:
+    """モックサーバーの動作設定"""
+
+    # 各リクエストに加える遅延（秒）
+    latency: float = 0.0
+    # レスポンスごとの帯域（バイト/秒、None は無制限）
+    bandwidth: Optional[float] = None
+    # Rangeリクエストに対応するかどうか
+    range_support: bool = True
+    # error_status を返すリクエストの割合
+    error_rate: float = 0.0
+    error_status: int = 500
+    # ダウンロードを途中で切断する割合
+    disconnect_rate: float = 0.0
+    # Authorizationヘッダーを必須にするかどうか
+    require_token: bool = True
+    # 受け付けるクライアントにはファイルをgzipで圧縮して返すかどうか
+    compress: bool = False
+    # ダウンロードに 403 を返すトークン
+    rejected_tokens: Set[str] = field(default_factory=set)
+    seed: int = 0
+
+
+@dataclass
+class _Node:
+    """モックサーバー上のファイルまたはフォルダ"""
+
+    id: str
+    name: str
+    type: str
+    parent: Optional[str]
+    size: int = 0
+    md5: Optional[str] = None
+    password: Optional[str] = None
+    create_time: int = 0
+    children: Dict[str, "_Node"] = field(default_factory=dict)
+
+
+class MockGofile:
+    """api.gofile.io とストアサーバーのローカルの代替
+
+    ``/accounts``、``/accounts/website``、``/contents/{id}`` と
+    ファイル配信の ``/download/{id}/{name}`` を提供する。ファイルの内容は
+    IDから決まるデータをその場で生成するため、大きなファイルでも
+    メモリを使わない。
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        self.config = config or MockConfig()
+        self.stats: Dict[str, int] = {
+            "accounts": 0,
+            "contents": 0,
+            "downloads": 0,
+            "bytes_sent": 0,
+            "errors": 0,
+            "compressed": 0,
+        }
+        self._nodes: Dict[str, _Node] = {}
+        self._counter = 0
+        self._random = random.Random(self.config.seed)  # noqa: S311
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    @property
+    def content_url(self) -> str:
+        """``GoFileAPI.CONTENT_URL`` に設定するURL"""
+        return f"{self.base_url}/contents"
+
+    def add_folder(
+        self,
+        name: str,
+        parent: Optional[str] = None,
+        password: Optional[str] = None,
+    ) -> str:
+        """フォルダを追加してIDを返す"""
+        node = self._add(name, "folder", parent)
+        if password:
+            node.password = hashlib.sha256(password.encode()).hexdigest()
+        return node.id
+
+    def add_file(self, parent: str, name: str, size: int) -> str:
+        """size バイトのファイルを追加してIDを返す"""
+        node = self._add(name, "file", parent)
+        node.size = size
+        digest = hashlib.md5()  # noqa: S324
+        for chunk in self._generate(node.id, 0, size - 1):
+            digest.update(chunk)
+        node.md5 = digest.hexdigest()
+        return node.id
+
+    def describe(self, node_id: str) -> Dict[str, Any]:
+        """ファイルまたはフォルダのAPIでの表現（リンクやMD5を含む）"""
+        return self._describe(self._nodes[node_id], False)
+
+    def remove(self, node_id: str) -> None:
+        """ファイルまたはフォルダを削除"""
+        node = self._nodes.pop(node_id)
+        if node.parent is not None:
+            del self._nodes[node.parent].children[node_id]
+
+    def content(self, file_id: str) -> bytes:
+        """ファイルの内容全体"""
+        node = self._nodes[file_id]
+        return b"".join(self._generate(file_id, 0, node.size - 1))
+
+    def build_tree(
+        self,
+        file_count: int,
+        file_size: int,
+        folders: int = 1,
+        password: Optional[str] = None,
+    ) -> str:
+        """file_count 個のファイルを folders 個のフォルダに分けて配置
+
+        ルートフォルダのIDを返す。
+        """
+        root = self.add_folder("root", password=password)
+        parents = [root] + [
+            self.add_folder(f"folder{i}", root) for i in range(folders - 1)
+        ]
+        for i in range(file_count):
+            self.add_file(parents[i % len(parents)], f"file{i}.bin", file_size)
+        return root
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """サーバーを起動してベースURLを返す"""
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{bound_port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        """サーバーを停止"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockGofile":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+    def app(self) -> web.Application:
+        """aiohttpのアプリケーションを生成"""
+        app = web.Application()
+        app.router.add_post("/accounts", self._accounts)
+        app.router.add_get("/accounts/website", self._account_status)
+        app.router.add_get("/contents/{id}", self._contents)
+        app.router.add_get("/download/{id}/{name}", self._download)
+        return app
+
+    def _add(self, name: str, node_type: str, parent: Optional[str]) -> _Node:
+        """ノードを追加"""
+        self._counter += 1
+        node = _Node(
+            id=f"{node_type[0]}{self._counter:08d}",
+            name=name,
+            type=node_type,
+            parent=parent,
+            create_time=1700000000 + self._counter,
+        )
+        self._nodes[node.id] = node
+        if parent is not None:
+            self._nodes[parent].children[node.id] = node
+        return node
+
+    async def _prepare(self, request: web.Request) -> Optional[web.Response]:
+        """遅延、認証、エラー注入を適用（エラー時はレスポンスを返す）"""
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        if self._random.random() < self.config.error_rate:
+            self.stats["errors"] += 1
+            return web.json_response(
+                {"status": "error-injected"}, status=self.config.error_status
+            )
+        if self.config.require_token and not request.headers.get(
+            "Authorization", ""
+        ).startswith("Bearer "):
+            return web.json_response({"status": "error-auth"}, status=401)
+        return None
+
+    async def _accounts(self, request: web.Request) -> web.Response:
+        """ゲストアカウントを作成"""
+        if self.config.latency:
+            await asyncio.sleep(self.config.latency)
+        self.stats["accounts"] += 1
+        token = f"mock{self.stats['accounts']:06d}"
+        return web.json_response(
+            {"status": "ok", "data": {"id": token, "token": token}}
+        )
+
+    async def _account_status(self, request: web.Request) -> web.Response:
+        """アカウントの状態を返す"""
+        error = await self._prepare(request)
+        if error is not None:
+            return error
+        return web.json_response(
+            {
+                "status": "ok",
+                "data": {
+                    "email": "guest@example.com",
+                    "tier": "guest",
+                    "ipTraffic30": self.stats["bytes_sent"],
+                    "statsCurrent": {
+                        "trafficWebDownloaded": self.stats["bytes_sent"]
+                    },
+                },
+            }
+        )
+
+    async def _contents(self, request: web.Request) -> web.Response:
+        """コンテンツの情報を返す"""
+        error = await self._prepare(request)
+        if error is not None:
+            return error
+        self.stats["contents"] += 1
+        node = self._nodes.get(request.match_info["id"])
+        if node is None:
+            return web.json_response({"status": "error-notFound"})
+        if node.password and request.query.get("password") != node.password:
+            return web.json_response({"status": "error-passwordRequired"})
+        return web.json_response(
+            {"status": "ok", "data": self._describe(node, True)}
+        )
+
+    def _describe(self, node: _Node, with_children: bool) -> Dict[str, Any]:
+        """ノードをAPIのレスポンスの形式に変換"""
+        data: Dict[str, Any] = {
+            "id": node.id,
+            "type": node.type,
+            "name": node.name,
+            "createTime": node.create_time,
+        }
+        if node.type == "file":
+            data.update(
+                size=node.size,
+                md5=node.md5,
+                link=f"{self.base_url}/download/{node.id}/{node.name}",
+            )
+        elif with_children:
+            data["children"] = {
+                child.id: self._describe(child, False)
+                for child in node.children.values()
+            }
+        else:
+            data["childrenCount"] = len(node.children)
+        return data
+
+    async def _download(self, request: web.Request) -> web.StreamResponse:
+        """ファイルを配信（Rangeと帯域制限に対応）"""
+        error = await self._prepare(request)
+        if error is not None:
+            return error
+        token = request.headers.get("Authorization", "")[len("Bearer ") :]
+        if token in self.config.rejected_tokens:
+            return web.Response(status=403)
+        node = self._nodes.get(request.match_info["id"])
+        if node is None or node.type != "file":
+            return web.Response(status=404)
+        self.stats["downloads"] += 1
+
+        start, end, status = 0, node.size - 1, 200
+        byte_range = self._parse_range(request, node.size)
+        if byte_range is not None:
+            start, end = byte_range
+            status = 206
+
+        accepts_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+        if self.config.compress and status == 200 and accepts_gzip:
+            # Content-Length は圧縮後の長さになる
+            self.stats["compressed"] += 1
+            body = b"".join(self._generate(node.id, start, end))
+            return web.Response(
+                body=gzip.compress(body),
+                headers={"Content-Encoding": "gzip"},
+            )
+
+        response = web.StreamResponse(status=status)
+        response.content_length = end - start + 1
+        response.headers["Accept-Ranges"] = (
+            "bytes" if self.config.range_support else "none"
+        )
+        if status == 206:
+            response.headers["Content-Range"] = (
+                f"bytes {start}-{end}/{node.size}"
+            )
+        await response.prepare(request)
+
+        disconnect_at = None
+        if self._random.random() < self.config.disconnect_rate:
+            disconnect_at = start + (end - start) // 2
+        async for chunk in self._throttled(node.id, start, end):
+            if disconnect_at is not None and start >= disconnect_at:
+                # 途中で接続を切る
+                request.transport.close()
+                return response
+            await response.write(chunk)
+            start += len(chunk)
+            self.stats["bytes_sent"] += len(chunk)
+        await response.write_eof()
+        return response
+
+    def _parse_range(
+        self, request: web.Request, size: int
+    ) -> Optional[Tuple[int, int]]:
+        """Rangeヘッダーを解析（非対応の設定では None）"""
+        header = request.headers.get("Range")
+        if not header or not self.config.range_support:
+            return None
+        match = RANGE_PATTERN.fullmatch(header.strip())
+        if not match:
+            return None
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        return start, min(end, size - 1)
+
+    async def _throttled(
+        self, file_id: str, start: int, end: int
+    ) -> AsyncIterator[bytes]:
+        """帯域の設定に合わせてチャンクを返す"""
+        started = time.monotonic()
+        sent = 0
+        for chunk in self._generate(file_id, start, end):
+            yield chunk
+            sent += len(chunk)
+            if self.config.bandwidth:
+                delay = sent / self.config.bandwidth - (
+                    time.monotonic() - started
+                )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+    @staticmethod
+    def _generate(file_id: str, start: int, end: int) -> Iterator[bytes]:
+        """ファイルIDから決まる内容の start から end までを生成"""
+        seed = hashlib.sha256(file_id.encode()).digest()
+        block = seed * (BLOCK_SIZE // len(seed))
+        position = start
+        while position <= end:
+            offset = position % BLOCK_SIZE
+            length = min(BLOCK_SIZE - offset, end - position + 1)
+            yield block[offset : offset + length]
+            position += length
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    """コマンドラインから起動したサーバーを実行"""
+    config = MockConfig(
+        latency=args.latency,
+        bandwidth=args.bandwidth,
+        range_support=not args.no_range,
+        error_rate=args.error_rate,
+    )
+    mock = MockGofile(config)
+    root = mock.build_tree(args.files, args.size, args.folders, args.password)
+    await mock.start(args.host, args.port)
+    sys.stderr.write(f"Serving {root} at {mock.content_url}\n")
+    await asyncio.Event().wait()
+
+
+def main() -> None:
+    """モックサーバーを単体で起動"""
+    parser = argparse.ArgumentParser(description="Mock Gofile server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--size", type=int, default=1024 * 1024)
+    parser.add_argument("--folders", type=int, default=1)
+    parser.add_argument("--password")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=float)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-range", action="store_true")
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
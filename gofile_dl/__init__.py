@@ -7,11 +7,21 @@ from gofile_dl.downloader.file_downloader import FileDownloader
 from gofile_dl.downloader.go_file_api import GoFileAPI
 from gofile_dl.downloader.go_file_downloader import GoFileDownloader
 from gofile_dl.logger import Logger
+from gofile_dl.metrics import MetricsRegistry
+from gofile_dl.session import (
+    ConnectionPoolConfig,
+    ConnectionStats,
+    create_session,
+)
 from gofile_dl.ui.cli import CLI
 
 __all__ = [
     "CLI",
+    "ConnectionPoolConfig",
+    "ConnectionStats",
+    "create_session",
     "Logger",
+    "MetricsRegistry",
     "FileDownloader",
     "GoFileAPI",
     "GoFileDownloader",
@@ -0,0 +1,3 @@
+from gofile_dl.ui.cli import main
+
+main()
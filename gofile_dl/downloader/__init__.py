@@ -1,9 +1,65 @@
+from gofile_dl.downloader.archive import (
+    ArchiveWriter,
+    TarArchiveWriter,
+    ZipArchiveWriter,
+    create_archive,
+)
+from gofile_dl.downloader.concurrency import ConcurrencyController
+from gofile_dl.downloader.content_cache import ContentCache
+from gofile_dl.downloader.dedup_store import DedupStore
 from gofile_dl.downloader.file_downloader import FileDownloader
+from gofile_dl.downloader.folder_walker import FolderWalker
 from gofile_dl.downloader.go_file_api import GoFileAPI
 from gofile_dl.downloader.go_file_downloader import GoFileDownloader
+from gofile_dl.downloader.manifest import SyncManifest
+from gofile_dl.downloader.models import FileEntry
+from gofile_dl.downloader.progress import ProgressTracker
+from gofile_dl.downloader.rate_limiter import RateLimiter
+from gofile_dl.downloader.retry import (
+    CircuitBreaker,
+    DownloadError,
+    RetryPolicy,
+)
+from gofile_dl.downloader.scheduler import DownloadScheduler
+from gofile_dl.downloader.stream import (
+    BinaryIOSink,
+    StreamWriterSink,
+    stdout_sink,
+)
+from gofile_dl.downloader.work_queue import WorkQueue
+from gofile_dl.downloader.writer import (
+    AiofilesWriter,
+    ThreadedWriter,
+    WriterBackend,
+    create_writer,
+)
 
 __all__ = [
+    "AiofilesWriter",
+    "ArchiveWriter",
+    "BinaryIOSink",
+    "CircuitBreaker",
+    "ConcurrencyController",
+    "ContentCache",
+    "DedupStore",
+    "DownloadError",
+    "DownloadScheduler",
     "FileDownloader",
+    "FileEntry",
+    "FolderWalker",
     "GoFileAPI",
     "GoFileDownloader",
+    "ProgressTracker",
+    "RateLimiter",
+    "RetryPolicy",
+    "StreamWriterSink",
+    "SyncManifest",
+    "TarArchiveWriter",
+    "ThreadedWriter",
+    "WorkQueue",
+    "WriterBackend",
+    "ZipArchiveWriter",
+    "create_archive",
+    "create_writer",
+    "stdout_sink",
 ]
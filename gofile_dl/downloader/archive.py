@@ -0,0 +1,232 @@
+import asyncio
+import tarfile
+import time
+import zipfile
+from collections import deque
+from typing import AsyncIterator, Deque, Optional
+
+from .writer import FileSink
+
+ARCHIVE_FORMATS = ("tar", "zip")
+
+# tarのブロックとレコードの大きさ
+BLOCK_SIZE = tarfile.BLOCKSIZE
+RECORD_SIZE = tarfile.RECORDSIZE
+
+
+class ChunkBuffer:
+    """ダウンロード済みでアーカイブに未追加のチャンクを保持する
+
+    保持するバイト数が ``limit`` に達すると ``put`` が待つため、
+    アーカイブへの追加が追いつくまでダウンロードも止まる。
+    """
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._chunks: Deque[bytes] = deque()
+        self._size = 0
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+
+    async def put(self, chunk: bytes) -> None:
+        """チャンクを追加（空きができるまで待つ）"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._size < self._limit)
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[BaseException] = None) -> None:
+        """全てのチャンクを追加し終えたことを通知"""
+        async with self._changed:
+            self._done = True
+            self._error = error
+            self._changed.notify_all()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """追加された順にチャンクを返し、失敗していれば最後に送出"""
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: self._chunks or self._done
+                )
+                if not self._chunks:
+                    break
+                chunk = self._chunks.popleft()
+                self._size -= len(chunk)
+                self._changed.notify_all()
+            yield chunk
+        if self._error is not None:
+            raise self._error
+
+
+class ArchiveWriter:
+    """ファイルを1つのアーカイブとして順にシンクへ書き込む
+
+    エントリーのヘッダーは最初のチャンクを受け取ってから書くため、
+    データを受け取る前に失敗したファイルはアーカイブに含まれない。
+    """
+
+    def __init__(self, sink: FileSink):
+        self._sink = sink
+
+    async def add(
+        self,
+        name: str,
+        size: Optional[int],
+        chunks: AsyncIterator[bytes],
+        mtime: Optional[float] = None,
+    ) -> int:
+        """ファイルを1つ追加し、書き込んだデータのバイト数を返す
+
+        途中で失敗した場合もアーカイブが壊れないようにエントリーを
+        閉じてから例外を送出する。
+        """
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """アーカイブの終端を書き込む（シンクは閉じない）"""
+        raise NotImplementedError
+
+
+class TarArchiveWriter(ArchiveWriter):
+    """tar（PAX形式）のストリームを書き込む
+
+    ヘッダーにサイズが必要なため、サイズが分からないファイルは
+    追加できない。途中で失敗したファイルは残りを0で埋める。
+    """
+
+    def __init__(self, sink: FileSink):
+        super().__init__(sink)
+        self._offset = 0
+
+    async def add(
+        self,
+        name: str,
+        size: Optional[int],
+        chunks: AsyncIterator[bytes],
+        mtime: Optional[float] = None,
+    ) -> int:
+        if size is None:
+            raise ValueError(f"Size of {name} is required for tar output")
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mode = 0o644
+        info.mtime = int(mtime if mtime is not None else time.time())
+
+        written = 0
+        try:
+            async for chunk in chunks:
+                if not written:
+                    await self._write(info.tobuf(tarfile.PAX_FORMAT))
+                chunk = chunk[: size - written]
+                await self._write(chunk)
+                written += len(chunk)
+            if not written:
+                # 空のファイル
+                await self._write(info.tobuf(tarfile.PAX_FORMAT))
+        finally:
+            if written:
+                await self._write(bytes(size - written))
+                await self._pad(BLOCK_SIZE)
+        return written
+
+    async def close(self) -> None:
+        await self._write(bytes(BLOCK_SIZE * 2))
+        await self._pad(RECORD_SIZE)
+        await self._sink.flush()
+
+    async def _write(self, data: bytes) -> None:
+        """シンクに書き込んで位置を進める"""
+        if data:
+            await self._sink.write(data)
+            self._offset += len(data)
+
+    async def _pad(self, size: int) -> None:
+        """位置が size の倍数になるまで0で埋める"""
+        await self._write(bytes(-self._offset % size))
+
+
+class _Spool:
+    """zipfile が書き込んだデータを溜めるシークできないファイル"""
+
+    def __init__(self) -> None:
+        self._data = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._data += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        """溜まったデータを取り出す"""
+        data = bytes(self._data)
+        self._data.clear()
+        return data
+
+
+class ZipArchiveWriter(ArchiveWriter):
+    """zipのストリームを書き込む
+
+    シークできない出力のため、各エントリーのサイズとCRCはデータの
+    後ろ（データディスクリプター）に書かれる。データは無圧縮で格納する。
+    途中で失敗したファイルは受け取った分だけのエントリーになる。
+    """
+
+    def __init__(self, sink: FileSink):
+        super().__init__(sink)
+        self._spool = _Spool()
+        self._zip = zipfile.ZipFile(self._spool, "w", zipfile.ZIP_STORED)
+
+    async def add(
+        self,
+        name: str,
+        size: Optional[int],
+        chunks: AsyncIterator[bytes],
+        mtime: Optional[float] = None,
+    ) -> int:
+        info = zipfile.ZipInfo(
+            name,
+            time.localtime(mtime if mtime is not None else time.time())[:6],
+        )
+        info.external_attr = 0o644 << 16
+        large = size is None or size >= zipfile.ZIP64_LIMIT
+        entry = None
+        written = 0
+        try:
+            async for chunk in chunks:
+                if entry is None:
+                    entry = self._zip.open(info, "w", force_zip64=large)
+                entry.write(chunk)
+                written += len(chunk)
+                await self._drain()
+            if entry is None:
+                entry = self._zip.open(info, "w")
+        finally:
+            if entry is not None:
+                entry.close()
+                await self._drain()
+        return written
+
+    async def close(self) -> None:
+        self._zip.close()
+        await self._drain()
+        await self._sink.flush()
+
+    async def _drain(self) -> None:
+        """溜まったデータをシンクに書き込む"""
+        data = self._spool.take()
+        if data:
+            await self._sink.write(data)
+
+
+def create_archive(archive_format: str, sink: FileSink) -> ArchiveWriter:
+    """形式の名前からアーカイブの書き込み先を生成"""
+    if archive_format == "tar":
+        return TarArchiveWriter(sink)
+    if archive_format == "zip":
+        return ZipArchiveWriter(sink)
+    raise ValueError(f"Unknown archive format: {archive_format}")
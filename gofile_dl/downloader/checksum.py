@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+from contextlib import closing, suppress
+from pathlib import Path
+from typing import Any, Optional, Union
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def new_md5() -> Any:
+    """MD5のハッシュオブジェクトを生成（改ざん検出ではなく整合性確認用）"""
+    return hashlib.md5()  # noqa: S324
+
+
+async def file_md5(path: Path) -> str:
+    """ファイルのMD5をスレッドプールで計算"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _file_md5, path)
+
+
+class ChecksumIndex:
+    """検証済みのファイルのMD5をサイズ・更新日時とともに記録するSQLite
+
+    ファイルのサイズと更新日時が記録と同じなら、読み直さずに記録の
+    MD5を使う。ファイルは索引の置かれたディレクトリからの相対パスで
+    記録し、操作はスレッドプールで接続を開いて行う。
+    """
+
+    FILE_NAME = ".gofile-checksums.sqlite"
+
+    def __init__(self, path: Union[str, Path], timeout: float = 30.0):
+        self._path = Path(path)
+        self._timeout = timeout
+
+    async def lookup(self, path: Path, stat: os.stat_result) -> Optional[str]:
+        """stat と記録が一致すれば記録のMD5を返す（なければ None）"""
+        return await self._run(self._lookup, self._key(path), stat)
+
+    async def record(self, path: Path, md5: str) -> None:
+        """現在のサイズと更新日時でファイルのMD5を記録"""
+        await self._run(self._record, path, md5)
+
+    def _lookup(self, key: str, stat: os.stat_result) -> Optional[str]:
+        """記録を検索"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT md5 FROM files "
+                "WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (key, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        return row["md5"] if row else None
+
+    def _record(self, path: Path, md5: str) -> None:
+        """記録を追加または更新"""
+        stat = path.stat()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, md5) "
+                "VALUES (?, ?, ?, ?)",
+                (self._key(path), stat.st_size, stat.st_mtime_ns, md5),
+            )
+
+    def _key(self, path: Path) -> str:
+        """索引のディレクトリからの相対パス"""
+        return os.path.relpath(path, self._path.parent)
+
+    def _connect(self) -> sqlite3.Connection:
+        """自動コミットの接続を開き、テーブルがなければ作成"""
+        conn = sqlite3.connect(
+            str(self._path), timeout=self._timeout, isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                md5 TEXT NOT NULL
+            )
+            """
+        )
+        return conn
+
+    @staticmethod
+    async def _run(func: Any, *args: Any) -> Any:
+        """スレッドプールで func を実行"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+
+def has_size(path: Path, size: Optional[int]) -> bool:
+    """ファイルが存在し、サイズが分かっていれば一致するかどうか"""
+    try:
+        actual = path.stat().st_size
+    except FileNotFoundError:
+        return False
+    return size is None or actual == size
+
+
+async def is_identical(
+    path: Path,
+    size: Optional[int],
+    md5: Optional[str],
+    index: Optional[ChecksumIndex] = None,
+) -> bool:
+    """ローカルのファイルがリモートと同じかどうか
+
+    サイズとMD5の両方が分かっていて、どちらも一致する場合のみ True。
+    サイズを先に比べ、index にサイズと更新日時が一致する記録があれば
+    ハッシュを計算せずにその記録と比べる。計算したハッシュは記録する。
+    """
+    if size is None or not md5:
+        return False
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return False
+    if stat.st_size != size:
+        return False
+    md5 = md5.lower()
+    if index is not None:
+        try:
+            recorded = await index.lookup(path, stat)
+        except (OSError, sqlite3.Error):
+            # 索引が使えなければハッシュを計算する
+            recorded = None
+        if recorded is not None:
+            return recorded == md5
+
+    actual = await file_md5(path)
+    if index is not None:
+        await remember_md5(index, path, actual)
+    return actual == md5
+
+
+async def remember_md5(index: ChecksumIndex, path: Path, md5: str) -> None:
+    """検証済みのMD5を記録（記録できなくても処理は続ける）"""
+    with suppress(OSError, sqlite3.Error):
+        await index.record(path, md5.lower())
+
+
+def _file_md5(path: Path) -> str:
+    """ファイルのMD5を計算"""
+    digest = new_md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,148 @@
+import asyncio
+from typing import Optional
+
+from .scheduler import DownloadScheduler
+
+
+class ConcurrencyController:
+    """観測したスループットからスケジューラーの同時接続数を調整する
+
+    ``interval`` 秒ごとに全体のスループットを測り、開始待ちの転送が
+    ある間は上限を1ずつ増やす（加算的増加）。増やしても ``gain`` 以上
+    伸びなければ1つ戻して ``hold`` 回の間留まり、その後また試す。
+    区間内の転送のうち一時的な失敗や429の割合が ``max_error_rate``
+    以上なら ``backoff`` 倍に減らす（乗算的減少）。
+    ``adapt_chunk_size`` が真の場合、転送1本あたりのスループットから
+    読み込みのチャンクサイズも決める。
+    """
+
+    def __init__(
+        self,
+        scheduler: DownloadScheduler,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        interval: float = 2.0,
+        gain: float = 0.05,
+        backoff: float = 0.5,
+        max_error_rate: float = 0.1,
+        hold: int = 5,
+        adapt_chunk_size: bool = True,
+        min_chunk_size: int = 64 * 1024,
+        max_chunk_size: int = 4 * 1024 * 1024,
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(
+                f"Invalid concurrency range: {min_limit}-{max_limit}"
+            )
+        self._scheduler = scheduler
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._interval = interval
+        self._gain = gain
+        self._backoff = backoff
+        self._max_error_rate = max_error_rate
+        self._hold = hold
+        self._adapt_chunk_size = adapt_chunk_size
+        self._min_chunk_size = min_chunk_size
+        self._max_chunk_size = max_chunk_size
+        self._set_limit(scheduler.max_connections)
+
+        self._bytes = 0
+        self._errors = 0
+        self._finished = 0
+        self._started: Optional[float] = None
+        # 直前に上限を増やす前のスループット
+        self._baseline: Optional[float] = None
+        self._holding = 0
+        self._chunk_size: Optional[int] = None
+        self.throughput = 0.0
+
+    @property
+    def limit(self) -> int:
+        """現在の同時接続数の上限"""
+        return self._scheduler.max_connections
+
+    @property
+    def chunk_size(self) -> Optional[int]:
+        """推奨するチャンクサイズ（計測前や無効時は None）"""
+        return self._chunk_size
+
+    def record_bytes(self, amount: int) -> None:
+        """受信したバイト数を記録"""
+        self._bytes += amount
+        self._tick()
+
+    def record_success(self) -> None:
+        """転送の完了を記録"""
+        self._finished += 1
+
+    def record_error(self) -> None:
+        """再試行が必要な失敗（タイムアウト、5xx、429など）を記録"""
+        self._errors += 1
+        self._tick()
+
+    def _tick(self) -> None:
+        """区間が終わっていれば上限を調整"""
+        now = asyncio.get_running_loop().time()
+        if self._started is None:
+            self._started = now
+            return
+        elapsed = now - self._started
+        if elapsed < self._interval:
+            return
+        throughput = self._bytes / elapsed
+        attempts = self._errors + self._finished
+        error_rate = self._errors / attempts if attempts else 0.0
+        self._bytes = 0
+        self._errors = 0
+        self._finished = 0
+        self._started = now
+        self.throughput = throughput
+        self._update_chunk_size(throughput)
+        self._adjust(throughput, error_rate)
+
+    def _adjust(self, throughput: float, error_rate: float) -> None:
+        """1区間の結果から上限を決める"""
+        if error_rate and error_rate >= self._max_error_rate:
+            self._set_limit(int(self.limit * self._backoff))
+            self._baseline = None
+            self._holding = self._hold
+            return
+        if not self._scheduler.pending:
+            # 転送が足りず上限に達していないため評価しない
+            self._baseline = None
+            return
+        if self._baseline is not None and throughput < self._baseline * (
+            1 + self._gain
+        ):
+            # 増やしても伸びなかったので戻して留まる
+            self._set_limit(self.limit - 1)
+            self._baseline = None
+            self._holding = self._hold
+            return
+        if self._holding:
+            self._holding -= 1
+            self._baseline = None
+            return
+        if self.limit >= self._max_limit:
+            self._baseline = None
+            return
+        self._baseline = throughput
+        self._set_limit(self.limit + 1)
+
+    def _update_chunk_size(self, throughput: float) -> None:
+        """転送1本あたり約0.1秒分のデータを2の累乗で丸めた値にする"""
+        active = self._scheduler.active
+        if not self._adapt_chunk_size or not active or not throughput:
+            return
+        target = int(throughput / active / 10)
+        size = self._min_chunk_size
+        while size < target and size < self._max_chunk_size:
+            size *= 2
+        self._chunk_size = size
+
+    def _set_limit(self, value: int) -> None:
+        """範囲内に収めてスケジューラーに反映"""
+        self._scheduler.max_connections = min(
+            self._max_limit, max(self._min_limit, value)
+        )
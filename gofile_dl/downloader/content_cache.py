@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+
+
+class ContentCache:
+    """コンテンツAPIのレスポンスのキャッシュ
+
+    有効期限付きのLRUでメモリに保持し、``cache_dir`` を指定すると
+    再起動後も使えるようディスクにも保存する。同じキーの同時の
+    読み込みは1回のリクエストにまとめる。
+
+    ディスクにはパスワード付きのコンテンツの一覧も残るため、
+    ディレクトリとファイルは所有者のみ読み書きできるようにし、
+    キーのパスワードはキャッシュごとの秘密鍵でHMACにする。
+    """
+
+    KEY_NAME = "hmac.key"
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 300.0,
+        cache_dir: Optional[Union[str, Path]] = None,
+    ):
+        """初期化: 最大件数、有効期限（秒）、保存先のディレクトリ"""
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._cache_dir = Path(cache_dir) if cache_dir else None
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = (
+            OrderedDict()
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._secret = secrets.token_bytes(32)
+        if self._cache_dir:
+            self._cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            os.chmod(self._cache_dir, 0o700)
+            self._secret = self._load_secret()
+
+    def make_key(self, content_id: str, password: Optional[str] = None) -> str:
+        """コンテンツIDとパスワードからキーを生成"""
+        if not password:
+            return f"{content_id}:"
+        digest = hmac.new(self._secret, password.encode(), hashlib.sha256)
+        return f"{content_id}:{digest.hexdigest()}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """期限内のエントリーを取得（なければ None）"""
+        entry = self._entries.get(key)
+        if entry is None and self._cache_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None:
+            return None
+
+        stored_at, data = entry
+        if time.time() - stored_at > self._ttl:
+            self.invalidate(key)
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def set(self, key: str, data: Dict[str, Any]) -> None:
+        """エントリーを保存"""
+        entry = (time.time(), data)
+        self._remember(key, entry)
+        if self._cache_dir:
+            self._write_disk(key, entry)
+
+    def invalidate(self, key: str) -> None:
+        """エントリーを削除"""
+        self._entries.pop(key, None)
+        if self._cache_dir:
+            path = self._disk_path(key)
+            if path.exists():
+                path.unlink()
+
+    def clear(self) -> None:
+        """全てのエントリーを削除"""
+        for key in list(self._entries):
+            self.invalidate(key)
+        if self._cache_dir:
+            for path in self._cache_dir.glob("*.json"):
+                path.unlink()
+
+    async def get_or_load(
+        self, key: str, loader: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """キャッシュを返すか、待機者全員のために1回だけ読み込む"""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # 一つの呼び出し元のキャンセルが他の待機者に波及しないようにする
+        return await asyncio.shield(future)
+
+    async def _load(
+        self, key: str, loader: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """エントリーを読み込んで保存"""
+        data = await loader()
+        if data:
+            self.set(key, data)
+        return data
+
+    def _remember(self, key: str, entry: Tuple[float, Dict[str, Any]]) -> None:
+        """メモリに保持し、最も使われていないものを追い出す"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _load_secret(self) -> bytes:
+        """ディスクの秘密鍵を読み込む（なければ作成）"""
+        path = self._cache_dir / self.KEY_NAME
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            secret = path.read_bytes()
+            if secret:
+                return secret
+            # 他のプロセスが書き込み中なら、そのプロセスの鍵を待たずに
+            # このプロセスだけの鍵を使う
+            return self._secret
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._secret)
+        return self._secret
+
+    def _disk_path(self, key: str) -> Path:
+        """キーに対応するディスク上のファイル"""
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return self._cache_dir / f"{name}.json"
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """ディスクからエントリーを読み込む"""
+        try:
+            with open(self._disk_path(key), "r") as f:
+                stored = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if stored.get("key") != key:
+            return None
+        return stored["stored_at"], stored["data"]
+
+    def _write_disk(
+        self, key: str, entry: Tuple[float, Dict[str, Any]]
+    ) -> None:
+        """ディスクにエントリーをアトミックに書き込む"""
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"key": key, "stored_at": entry[0], "data": entry[1]}, f)
+        os.replace(tmp_path, path)
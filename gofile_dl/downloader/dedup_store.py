@@ -0,0 +1,267 @@
+import asyncio
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar, Union
+
+from .models import FileEntry
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LINK_MODES = ("auto", "reflink", "hardlink", "copy")
+
+# Linux の ioctl(FICLONE)
+FICLONE = 0x40049409
+
+T = TypeVar("T")
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    """コピーオンライトでファイルを複製（対応していなければ OSError）"""
+    if fcntl is None:
+        raise OSError("reflink is not supported on this platform")
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            dst.unlink(missing_ok=True)
+            raise
+
+
+def _link(src: Path, dst: Path, mode: str) -> None:
+    """mode に従ってリフリンク・ハードリンク・コピーのいずれかで複製
+
+    ``auto`` はリフリンク、ハードリンク、コピーの順に試す。
+    """
+    if mode in ("auto", "reflink"):
+        try:
+            _reflink(src, dst)
+            return
+        except OSError:
+            if mode == "reflink":
+                raise
+    if mode in ("auto", "hardlink"):
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            if mode == "hardlink":
+                raise
+    shutil.copy2(src, dst)
+
+
+class DedupStore:
+    """リモートのMD5とサイズをキーにファイルを保持する内容アドレスのストア
+
+    ストアにあるファイルはダウンロードせずに保存先へリンクし、
+    ダウンロードしたファイルはストアに追加する。合計が
+    ``max_bytes`` を超えると最も長く使われていないファイルから削除する。
+    ハードリンクは保存先と中身を共有するため、保存先が書き換えられた
+    ファイル（サイズか更新日時が記録と異なるもの）はストアから外す。
+    複数のプロセスで共有できる。
+
+    他のプロセスがロックを持っていてもイベントループを止めないよう、
+    操作はスレッドプールで接続を開いて行う。
+    """
+
+    INDEX_NAME = "index.sqlite"
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_bytes: Optional[int] = None,
+        link_mode: str = "auto",
+        timeout: float = 30.0,
+    ):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"link_mode must be one of {LINK_MODES}")
+        self._root = Path(root)
+        self._objects = self._root / "objects"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._link_mode = link_mode
+        self._timeout = timeout
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS objects (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS objects_last_used "
+                "ON objects (last_used)"
+            )
+
+    def __enter__(self) -> "DedupStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @staticmethod
+    def key_for(entry: FileEntry) -> Optional[str]:
+        """ファイルのキー（MD5かサイズが分からなければ None）"""
+        if not entry.md5 or entry.size is None:
+            return None
+        return f"{entry.md5.lower()}-{entry.size}"
+
+    async def link(self, entry: FileEntry, path: Path) -> bool:
+        """ストアにあるファイルを path に置き、置けたら True を返す"""
+        key = self.key_for(entry)
+        if key is None:
+            return False
+        return await self._run(self._link_object, key, path)
+
+    async def add(self, entry: FileEntry, path: Path) -> bool:
+        """ダウンロードしたファイルをストアに追加し、追加できたら True"""
+        key = self.key_for(entry)
+        if key is None:
+            return False
+        if self._max_bytes is not None and entry.size > self._max_bytes:
+            return False
+        return await self._run(self._add_object, key, entry.size, path)
+
+    async def total_bytes(self) -> int:
+        """ストアにあるファイルの合計サイズ"""
+        return await self._run(self._total_bytes)
+
+    def close(self) -> None:
+        """何もしない（接続は操作ごとに開いて閉じる）"""
+
+    def _link_object(self, key: str, path: Path) -> bool:
+        """ストアのファイルを path に置く"""
+        with closing(self._connect()) as conn:
+            if not self._is_valid(conn, key):
+                return False
+            try:
+                self._place(self._object_path(key), path)
+            except OSError:
+                # 他のプロセスが削除した場合などはダウンロードに戻す
+                return False
+            conn.execute(
+                "UPDATE objects SET last_used = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return True
+
+    def _add_object(self, key: str, size: int, path: Path) -> bool:
+        """path をストアに複製して記録し、上限を超えた分を削除"""
+        with closing(self._connect()) as conn:
+            if self._is_valid(conn, key):
+                return True
+            target = self._object_path(key)
+            try:
+                self._place(path, target)
+                mtime_ns = target.stat().st_mtime_ns
+            except OSError:
+                return False
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO objects
+                        (key, size, mtime_ns, last_used)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    (key, size, mtime_ns, time.time()),
+                )
+                self._evict(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return True
+
+    def _total_bytes(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """合計サイズ（conn がなければ接続して調べる）"""
+        if conn is None:
+            with closing(self._connect()) as conn:
+                return self._total_bytes(conn)
+        row = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) AS total FROM objects"
+        ).fetchone()
+        return row["total"]
+
+    def _object_path(self, key: str) -> Path:
+        """キーに対応するストア内のパス"""
+        return self._objects / key[:2] / key
+
+    def _is_valid(self, conn: sqlite3.Connection, key: str) -> bool:
+        """ストアのファイルが記録どおり残っているかどうか"""
+        row = conn.execute(
+            "SELECT size, mtime_ns FROM objects WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return False
+        try:
+            stat = self._object_path(key).stat()
+        except FileNotFoundError:
+            stat = None
+        if (
+            stat is None
+            or stat.st_size != row["size"]
+            or stat.st_mtime_ns != row["mtime_ns"]
+        ):
+            self._remove(conn, key)
+            return False
+        return True
+
+    def _place(self, src: Path, dst: Path) -> None:
+        """src を一時ファイルに複製してから dst に置き換える"""
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f"{dst.name}.{uuid.uuid4().hex[:8]}.dedup")
+        try:
+            _link(src, tmp, self._link_mode)
+            os.replace(tmp, dst)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """合計が上限に収まるまで最も長く使われていないファイルを削除"""
+        if self._max_bytes is None:
+            return
+        excess = self._total_bytes(conn) - self._max_bytes
+        if excess <= 0:
+            return
+        rows = conn.execute(
+            "SELECT key, size FROM objects ORDER BY last_used"
+        ).fetchall()
+        for row in rows:
+            if excess <= 0:
+                break
+            self._remove(conn, row["key"])
+            excess -= row["size"]
+
+    def _remove(self, conn: sqlite3.Connection, key: str) -> None:
+        """ファイルと記録を削除"""
+        conn.execute("DELETE FROM objects WHERE key = ?", (key,))
+        self._object_path(key).unlink(missing_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        """操作ごとに接続する（スレッドをまたいで共有しない）"""
+        conn = sqlite3.connect(
+            str(self._root / self.INDEX_NAME),
+            timeout=self._timeout,
+            isolation_level=None,
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    async def _run(func: Callable[..., T], *args: Any) -> T:
+        """スレッドプールで実行して結果を返す"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
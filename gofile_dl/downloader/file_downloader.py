@@ -1,9 +1,24 @@
 import asyncio
+import re
+import time
+import urllib.parse
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, List, Optional, Tuple
 
-import aiofiles
 import aiohttp
-from tqdm import tqdm
+
+from ..metrics import MetricsRegistry
+from ..token.token_pool import TokenPool, retry_after_seconds
+from .checksum import file_md5, new_md5
+from .concurrency import ConcurrencyController
+from .journal import DownloadJournal
+from .progress import FileProgress, ProgressTracker
+from .rate_limiter import RateLimiter
+from .retry import DownloadError, is_retryable
+from .writer import FileSink, WriterBackend, create_writer
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
 
 
 class FileDownloader:
@@ -15,33 +30,242 @@ class FileDownloader:
         token: str,
         chunk_size: int = 1024 * 1024,
         max_concurrent_requests: int = 10,
+        segments: int = 4,
+        min_segment_size: int = 16 * 1024 * 1024,
+        journal_interval: int = 8 * 1024 * 1024,
+        token_pool: Optional[TokenPool] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        progress: Optional[ProgressTracker] = None,
+        writer: Optional[WriterBackend] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        concurrency: Optional[ConcurrencyController] = None,
     ):
         self.session = session
         self.token = token
         self._chunk_size = chunk_size
         self._max_concurrent_requests = max_concurrent_requests
+        self._segments = max(1, segments)
+        self._min_segment_size = min_segment_size
+        self._journal_interval = journal_interval
+        self._token_pool = token_pool
+        # 全ダウンロードで共有する帯域制限
+        self.rate_limiter = rate_limiter
+        self.progress = progress or ProgressTracker()
+        self._writer = writer or create_writer()
+        self._metrics = metrics
+        # スループットを計測してチャンクサイズを調整する
+        self._concurrency = concurrency
 
     @property
     def chunk_size(self) -> int:
         """ファイルダウンロードのチャンクサイズ"""
+        if self._concurrency and self._concurrency.chunk_size:
+            return self._concurrency.chunk_size
         return self._chunk_size
 
-    async def download_file(self, url: str, file_path: Path) -> bool:
-        """単一ファイルをダウンロード"""
-        response = await self._download_file_session(url, self.token)
-        if response.status != 200:
-            raise ValueError(
-                f"Failed to download file: HTTP {response.status}"
+    async def download_file(
+        self,
+        url: str,
+        file_path: Path,
+        size: Optional[int] = None,
+        md5: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> bool:
+        """単一ファイルをダウンロード
+
+        サイズが分かっている場合はジャーナルで進捗を記録し、中断された
+        ダウンロードはRangeリクエストで続きから再開する。十分に大きい
+        ファイルは分割して並列にダウンロードする。md5 を指定すると
+        ダウンロードしたデータのハッシュを検証する。rate_limiter を
+        指定しない場合は共有の帯域制限を使う。
+        """
+        limiter = rate_limiter or self.rate_limiter
+        started = time.monotonic()
+        success = False
+        try:
+            async with self._lease_token(size) as token:
+                success = await self._download_file(
+                    url, file_path, size, md5, token, limiter
+                )
+            return success
+        finally:
+            if self._metrics:
+                self._metrics.record_file(
+                    file_path.name,
+                    urllib.parse.urlsplit(url).hostname,
+                    size,
+                    time.monotonic() - started,
+                    success,
+                )
+
+    async def _download_file(
+        self,
+        url: str,
+        file_path: Path,
+        size: Optional[int],
+        md5: Optional[str],
+        token: str,
+        limiter: Optional[RateLimiter] = None,
+    ) -> bool:
+        """トークンを指定して単一ファイルをダウンロード"""
+        tmp_file = self._part_path(file_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        journal = DownloadJournal.load(tmp_file, size) if size else None
+
+        if journal and journal.is_complete():
+            await self._finalize(file_path, journal, md5)
+            return True
+        if journal and journal.completed_bytes and self._metrics:
+            self._metrics.retries.inc(operation="resume")
+        if journal and (journal.completed_bytes or self._should_segment(size)):
+            return await self._download_ranges(
+                url, file_path, journal, md5, token, limiter
             )
-        await self._write_file(response, file_path)
+
+        response = await self._download_file_session(url, token)
+        async with response:
+            if response.status != 200:
+                raise self._status_error(response, "file")
+            await self._write_file(response, file_path, journal, md5, limiter)
         return True
 
+    async def stream_file(
+        self,
+        url: str,
+        size: Optional[int] = None,
+        md5: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_resumes: int = 3,
+    ) -> AsyncIterator[bytes]:
+        """ファイルの内容をディスクに書き込まずにチャンクごとに返す
+
+        次のチャンクは呼び出し元が受け取ってから読み込むため、消費が
+        遅ければ受信も止まる。サイズが分かっている場合は、途中で
+        切断されてもRangeリクエストで続きから最大 max_resumes 回
+        再開する。md5 を指定すると最後のチャンクの後で検証し、
+        一致しなければ ValueError を送出する。
+        """
+        limiter = rate_limiter or self.rate_limiter
+        parts = urllib.parse.urlsplit(url)
+        name = urllib.parse.unquote(parts.path.rsplit("/", 1)[-1])
+        digest = new_md5() if md5 else None
+        position, resumes = 0, 0
+        started = time.monotonic()
+        success = False
+        try:
+            async with self._lease_token(size) as token:
+                with self._progress_bar(size or 0, name) as pbar:
+                    while True:
+                        try:
+                            async for chunk in self._iter_response(
+                                url, token, position, size, pbar, limiter
+                            ):
+                                position += len(chunk)
+                                if digest:
+                                    digest.update(chunk)
+                                yield chunk
+                            break
+                        except Exception as e:
+                            if not (
+                                size
+                                and is_retryable(e)
+                                and resumes < max_resumes
+                            ):
+                                raise
+                            resumes += 1
+                            if self._metrics:
+                                self._metrics.retries.inc(operation="resume")
+
+            actual_md5 = digest.hexdigest() if digest else None
+            if md5 and actual_md5 != md5.lower():
+                raise ValueError(
+                    f"Checksum mismatch for {name}: "
+                    f"expected {md5}, got {actual_md5}"
+                )
+            success = True
+        finally:
+            if self._metrics:
+                self._metrics.record_file(
+                    name,
+                    parts.hostname,
+                    size,
+                    time.monotonic() - started,
+                    success,
+                )
+
+    async def download_to(
+        self,
+        url: str,
+        sink: FileSink,
+        size: Optional[int] = None,
+        md5: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> int:
+        """ファイルの内容をシンクに書き込み、書き込んだバイト数を返す
+
+        シンクへの書き込みが終わるまで次のチャンクを受信しない。
+        シンクは閉じないため、呼び出し元で閉じる。
+        """
+        written = 0
+        async for chunk in self.stream_file(url, size, md5, rate_limiter):
+            await sink.write(chunk)
+            written += len(chunk)
+        await sink.flush()
+        return written
+
+    async def _iter_response(
+        self,
+        url: str,
+        token: str,
+        offset: int,
+        size: Optional[int],
+        pbar: FileProgress,
+        limiter: Optional[RateLimiter] = None,
+    ) -> AsyncIterator[bytes]:
+        """offset の位置からファイルを取得してチャンクごとに返す"""
+        byte_range = (offset, size - 1) if offset and size else None
+        response = await self._download_file_session(url, token, byte_range)
+        received = 0
+        try:
+            async with response:
+                if response.status != (206 if byte_range else 200):
+                    raise self._status_error(response, "file")
+                if (
+                    byte_range
+                    and self._parse_content_range(response)[:2] != byte_range
+                ):
+                    raise ValueError(
+                        "Failed to resume stream: unexpected Content-Range "
+                        f"{response.headers.get('Content-Range')!r}"
+                    )
+                async for chunk in response.content.iter_chunked(
+                    self.chunk_size
+                ):
+                    if limiter:
+                        await limiter.acquire(len(chunk))
+                    received += len(chunk)
+                    self._record_received(pbar, len(chunk))
+                    yield chunk
+        finally:
+            if self._metrics:
+                self._metrics.download_bytes.inc(
+                    received, host=response.url.host
+                )
+
+        if size is not None and offset + received != size:
+            raise DownloadError(
+                f"Download incomplete: {offset + received}/{size} bytes",
+                retryable=True,
+            )
+
+    def connections_for(self, size: Optional[int]) -> int:
+        """ファイルのダウンロードで使う最大接続数"""
+        if not self._should_segment(size):
+            return 1
+        return len(self._plan_ranges([(0, size - 1)]))
+
     async def download_files(self, urls: list, file_paths: list) -> bool:
         """複数ファイルを並列でダウンロード"""
-        tasks = []
-        for url, file_path in zip(urls, file_paths):
-            tasks.append(self.download_file(url, file_path))
-
         # 並列ダウンロードを制御するため、最大同時リクエスト数を設定
         semaphore = asyncio.Semaphore(self._max_concurrent_requests)
 
@@ -57,53 +281,389 @@ class FileDownloader:
         )
         return True
 
+    @asynccontextmanager
+    async def _lease_token(
+        self, size: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """リクエストに使うトークンを取得（プールがあればプールから）
+
+        size にはダウンロードするバイト数を指定し、プールが
+        アカウントの残りの通信量を見積もるのに使う。
+        """
+        if not self._token_pool:
+            yield self.token
+            return
+        async with self._token_pool.lease(size) as token:
+            yield token
+
     async def _download_file_session(
-        self, url: str, token: str
+        self,
+        url: str,
+        token: str,
+        byte_range: Optional[Tuple[int, int]] = None,
     ) -> aiohttp.ClientResponse:
         """ファイルダウンロードのためのHTTPセッションを生成"""
+        # 圧縮されるとオフセットや長さが Content-Length とずれるため、
+        # 常に無圧縮で受け取る
         headers = {
             "Authorization": f"Bearer {token}",
             "User-Agent": "Mozilla/5.0",
-            "Accept-Encoding": "gzip, deflate, br",
+            "Accept-Encoding": "identity",
         }
-        return await self.session.get(url, headers=headers)
+        if byte_range:
+            headers["Range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+        response = await self.session.get(url, headers=headers)
+        if self._token_pool:
+            await self._token_pool.report(
+                token, response.status, retry_after_seconds(response.headers)
+            )
+        return response
+
+    @staticmethod
+    def _part_path(file_path: Path) -> Path:
+        """ダウンロード中の一時ファイルのパス"""
+        return file_path.with_suffix(f"{file_path.suffix}.part")
+
+    def _should_segment(self, size: Optional[int]) -> bool:
+        """分割ダウンロードを行うかどうか"""
+        return (
+            self._segments > 1
+            and size is not None
+            and size >= self._min_segment_size * 2
+        )
+
+    def _plan_ranges(
+        self, missing: List[Tuple[int, int]]
+    ) -> List[Tuple[int, int]]:
+        """未ダウンロードの範囲をセグメント単位のバイト範囲に分割"""
+        missing_bytes = sum(end - start + 1 for start, end in missing)
+        piece = max(
+            self._min_segment_size, -(-missing_bytes // self._segments)
+        )
+        ranges = []
+        for start, end in missing:
+            while start <= end:
+                stop = min(start + piece, end + 1)
+                ranges.append((start, stop - 1))
+                start = stop
+        return ranges
+
+    @staticmethod
+    def _status_error(
+        response: aiohttp.ClientResponse, what: str
+    ) -> DownloadError:
+        """想定外のステータスのレスポンスからエラーを生成"""
+        return DownloadError(
+            f"Failed to download {what}: HTTP {response.status}",
+            status=response.status,
+            retry_after=retry_after_seconds(response.headers),
+        )
+
+    @staticmethod
+    def _parse_content_range(
+        response: aiohttp.ClientResponse,
+    ) -> Tuple[int, int, int]:
+        """Content-Rangeヘッダーから (start, end, total) を取得"""
+        header = response.headers.get("Content-Range", "")
+        match = CONTENT_RANGE_PATTERN.fullmatch(header.strip())
+        if not match:
+            raise ValueError(f"Invalid Content-Range header: {header!r}")
+        start, end, total = (int(value) for value in match.groups())
+        return start, end, total
+
+    @staticmethod
+    async def _run_all(coros: List[Awaitable[Any]]) -> None:
+        """全て並列に実行し、いずれかが失敗したら残りをキャンセル"""
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _download_ranges(
+        self,
+        url: str,
+        file_path: Path,
+        journal: DownloadJournal,
+        md5: Optional[str],
+        token: str,
+        limiter: Optional[RateLimiter] = None,
+    ) -> bool:
+        """未ダウンロードの範囲をRangeリクエストで並列に取得
+
+        セグメントは順不同に届くため、ハッシュは完了後に計算する。
+        """
+        ranges = self._plan_ranges(journal.missing_ranges())
+        response = await self._download_file_session(
+            url, token, byte_range=ranges[0]
+        )
+        async with response:
+            if response.status == 200:
+                # サーバーがRangeに対応していない場合は最初から単一ストリーム
+                journal.reset()
+                await self._write_file(
+                    response, file_path, journal, md5, limiter
+                )
+                return True
+            if response.status != 206:
+                raise self._status_error(response, "file")
+            if self._parse_content_range(response) != (
+                *ranges[0],
+                journal.size,
+            ):
+                raise ValueError(
+                    "Failed to download file: unexpected Content-Range "
+                    f"{response.headers.get('Content-Range')!r}"
+                )
+
+            tmp_file = journal.part_path
+            try:
+                # 各セグメントを書き込めるように、先に全体サイズを確保
+                await self._writer.preallocate(tmp_file, journal.size)
+
+                # 最初のセグメントは既に開いているレスポンスを使う
+                semaphore = asyncio.Semaphore(max(1, self._segments - 1))
+                with self._progress_bar(
+                    journal.size, file_path.name, journal.completed_bytes
+                ) as pbar:
+                    await self._run_all(
+                        [
+                            self._write_segment(
+                                response,
+                                tmp_file,
+                                ranges[0],
+                                pbar,
+                                journal,
+                                limiter,
+                            ),
+                            *(
+                                self._fetch_segment(
+                                    url,
+                                    tmp_file,
+                                    byte_range,
+                                    pbar,
+                                    journal,
+                                    semaphore,
+                                    token,
+                                    limiter,
+                                )
+                                for byte_range in ranges[1:]
+                            ),
+                        ]
+                    )
+
+            except BaseException:
+                # 中断やキャンセルでも再開できるように.partファイルと
+                # ジャーナルを残す
+                journal.save()
+                raise
+
+        await self._finalize(file_path, journal, md5)
+        return True
+
+    async def _fetch_segment(
+        self,
+        url: str,
+        tmp_file: Path,
+        byte_range: Tuple[int, int],
+        pbar: FileProgress,
+        journal: DownloadJournal,
+        semaphore: asyncio.Semaphore,
+        token: str,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        """1セグメント分をRangeリクエストで取得"""
+        async with semaphore:
+            response = await self._download_file_session(
+                url, token, byte_range=byte_range
+            )
+            async with response:
+                if response.status != 206:
+                    raise self._status_error(response, "segment")
+                if self._parse_content_range(response)[:2] != byte_range:
+                    raise ValueError(
+                        "Failed to download segment: unexpected "
+                        "Content-Range "
+                        f"{response.headers.get('Content-Range')!r}"
+                    )
+                await self._write_segment(
+                    response, tmp_file, byte_range, pbar, journal, limiter
+                )
+
+    async def _write_segment(
+        self,
+        response: aiohttp.ClientResponse,
+        tmp_file: Path,
+        byte_range: Tuple[int, int],
+        pbar: FileProgress,
+        journal: DownloadJournal,
+        limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        """セグメントを.partファイルの該当オフセットに書き込み"""
+        start, end = byte_range
+        expected = end - start + 1
+        async with self._writer.open(tmp_file, start) as f:
+            written = await self._stream_to_file(
+                response, f, start, pbar, journal, expected, limiter=limiter
+            )
+
+        if written != expected:
+            raise DownloadError(
+                f"Segment {start}-{end} incomplete: "
+                f"{written}/{expected} bytes",
+                retryable=True,
+            )
+
+    async def _stream_to_file(
+        self,
+        response: aiohttp.ClientResponse,
+        f: FileSink,
+        offset: int,
+        pbar: FileProgress,
+        journal: Optional[DownloadJournal] = None,
+        limit: Optional[int] = None,
+        digest: Optional[Any] = None,
+        limiter: Optional[RateLimiter] = None,
+    ) -> int:
+        """レスポンスをoffsetの位置から書き込み、書き込んだバイト数を返す
+
+        ジャーナルがある場合は、ディスクにフラッシュ済みの範囲だけを
+        一定間隔で記録する。digest を指定するとチャンクごとにハッシュを
+        更新し、limiter を指定するとチャンクごとに帯域を待つ。
+        """
+        position = offset
+        committed = offset
+
+        async def commit() -> None:
+            nonlocal committed
+            if journal and position > committed:
+                await f.flush()
+                journal.add(committed, position - 1)
+                committed = position
+
+        try:
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                if (
+                    limit is not None
+                    and position - offset + len(chunk) > limit
+                ):
+                    raise ValueError(
+                        f"Received more than {limit} bytes at offset {offset}"
+                    )
+                if limiter:
+                    await limiter.acquire(len(chunk))
+                await f.write(chunk)
+                if digest:
+                    digest.update(chunk)
+                position += len(chunk)
+                self._record_received(pbar, len(chunk))
+
+                if journal and position - committed >= self._journal_interval:
+                    await commit()
+                    journal.save()
+        except BaseException:
+            # キャンセルされた場合も受信済みの範囲を記録する
+            await commit()
+            raise
+        finally:
+            if self._metrics:
+                self._metrics.download_bytes.inc(
+                    position - offset, host=response.url.host
+                )
+
+        await commit()
+        return position - offset
+
+    def _record_received(self, pbar: FileProgress, amount: int) -> None:
+        """受信したバイト数を進捗と同時接続数の調整に反映"""
+        pbar.update(amount)
+        if self._concurrency:
+            self._concurrency.record_bytes(amount)
+
+    def _progress_bar(
+        self, total: int, name: str, initial: int = 0
+    ) -> FileProgress:
+        """ダウンロードの進捗をトラッカーに登録"""
+        return self.progress.start_file(name, total, initial)
 
     async def _write_file(
-        self, response: aiohttp.ClientResponse, file_path: Path
+        self,
+        response: aiohttp.ClientResponse,
+        file_path: Path,
+        journal: Optional[DownloadJournal] = None,
+        md5: Optional[str] = None,
+        limiter: Optional[RateLimiter] = None,
     ) -> None:
-        """ファイルを書き込み"""
-        tmp_file = file_path.with_suffix(f"{file_path.suffix}.part")
+        """ファイルを書き込み
+
+        ジャーナルがある場合は、失敗やキャンセルでも.partファイルを残して
+        次回のダウンロードで再開できるようにする。ハッシュは書き込みと
+        同時に計算するため、ファイルを読み直さない。
+        """
+        tmp_file = self._part_path(file_path)
         file_path.parent.mkdir(parents=True, exist_ok=True)
+        digest = new_md5() if md5 else None
 
         try:
-            async with aiofiles.open(tmp_file, "wb") as f:
-                total_size = int(response.headers.get("Content-Length", "0"))
-                downloaded = 0
-
-                # tqdmのpositionを0にして進捗バーを固定表示
-                with tqdm(
-                    total=total_size,
-                    desc=f"Downloading {file_path.name}",
-                    unit="B",
-                    unit_scale=True,
-                    bar_format=(
-                        "{desc} {percentage:3.0f}%|{bar}|\n"
-                        " {n_fmt}/{total_fmt} [{elapsed}<{remaining}]"
-                    ),
-                    position=0,  # ここで位置を固定
-                    leave=True,
-                    dynamic_ncols=True,
-                ) as pbar:
-                    async for chunk in response.content.iter_chunked(
-                        self.chunk_size
-                    ):
-                        await f.write(chunk)
-                        downloaded += len(chunk)
-                        pbar.update(len(chunk))
+            total_size = int(response.headers.get("Content-Length", "0"))
+            if journal:
+                total_size = journal.size
+
+            # APIのサイズが分かっている場合だけ書き込み先を先に確保する
+            # （Content-Length は受信するデータの長さと異なることがある）
+            async with self._writer.open(
+                tmp_file, size=journal.size if journal else None, truncate=True
+            ) as f:
+                with self._progress_bar(total_size, file_path.name) as pbar:
+                    written = await self._stream_to_file(
+                        response,
+                        f,
+                        0,
+                        pbar,
+                        journal,
+                        digest=digest,
+                        limiter=limiter,
+                    )
+
+            if journal and written != journal.size:
+                raise DownloadError(
+                    f"Download incomplete: {written}/{journal.size} bytes",
+                    retryable=True,
+                )
 
-            tmp_file.rename(file_path)
+        except BaseException:
+            # キャンセルされた場合も同じく再開に備える
+            if journal:
+                journal.save()
+            elif tmp_file.exists():
+                tmp_file.unlink()
+            raise
+
+        await self._finalize(
+            file_path, journal, md5, digest.hexdigest() if digest else None
+        )
 
-        except Exception as e:
-            if tmp_file.exists():
+    async def _finalize(
+        self,
+        file_path: Path,
+        journal: Optional[DownloadJournal],
+        md5: Optional[str],
+        actual_md5: Optional[str] = None,
+    ) -> None:
+        """ハッシュを検証して.partファイルを確定"""
+        tmp_file = self._part_path(file_path)
+        if journal:
+            journal.remove()
+        if md5:
+            actual_md5 = actual_md5 or await file_md5(tmp_file)
+            if actual_md5 != md5.lower():
+                # 壊れたデータから再開しないよう.partファイルを破棄
                 tmp_file.unlink()
-            raise e
+                raise ValueError(
+                    f"Checksum mismatch for {file_path.name}: "
+                    f"expected {md5}, got {actual_md5}"
+                )
+        tmp_file.rename(file_path)
@@ -0,0 +1,184 @@
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from .go_file_api import GoFileAPI
+from .models import FileEntry
+
+_DONE = object()
+
+
+class FolderWalker:
+    """フォルダツリーを並列に走査してファイル情報を抽出するクラス
+
+    兄弟フォルダの取得を同時に行い、APIへの同時リクエスト数は
+    ``max_concurrency`` で制限する。
+    """
+
+    def __init__(
+        self,
+        api: GoFileAPI,
+        max_concurrency: int = 8,
+        queue_size: int = 1000,
+    ):
+        self._api = api
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queue_size = queue_size
+
+    async def walk(
+        self,
+        content_data: Dict[str, Any],
+        password: Optional[str] = None,
+        parent_path: str = "",
+    ) -> List[FileEntry]:
+        """コンテンツデータ以下の全ファイル情報を平坦なリストで取得
+
+        返すファイルの順序は逐次走査した場合と同じ。
+        """
+        if content_data["type"] == "file":
+            return [self._file_entry(content_data, parent_path)]
+        if content_data["type"] != "folder":
+            return []
+
+        folder_path = os.path.join(parent_path, content_data["name"])
+        parts: List[Optional[FileEntry]] = []
+        subfolders = []
+        for child in content_data.get("children", {}).values():
+            if child["type"] == "folder":
+                # サブフォルダの位置を確保し、後で結果を差し込む
+                parts.append(None)
+                subfolders.append(
+                    self._walk_folder(child["id"], password, folder_path)
+                )
+            else:
+                parts.append(self._file_entry(child, folder_path))
+
+        subfolder_files = iter(await asyncio.gather(*subfolders))
+        files = []
+        for part in parts:
+            if part is None:
+                files.extend(next(subfolder_files))
+            else:
+                files.append(part)
+        return files
+
+    async def iter_files(
+        self, content_data: Dict[str, Any], password: Optional[str] = None
+    ) -> AsyncIterator[FileEntry]:
+        """ファイル情報を見つかった順に返す非同期ジェネレーター
+
+        ツリーの走査はバックグラウンドで進み、未消費のファイル情報は
+        ``queue_size`` 件までに制限される。順序は保証しない。
+        """
+        if content_data["type"] == "file":
+            yield self._file_entry(content_data, "")
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(self._queue_size)
+        pending: Set[asyncio.Future] = set()
+        supervisor = asyncio.ensure_future(
+            self._supervise(content_data, password, queue, pending)
+        )
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            tasks = [supervisor, *pending]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _supervise(
+        self,
+        content_data: Dict[str, Any],
+        password: Optional[str],
+        queue: asyncio.Queue,
+        pending: Set[asyncio.Future],
+    ) -> None:
+        """走査タスクを見守り、終了または失敗をキューに通知"""
+        try:
+            pending.add(
+                asyncio.ensure_future(
+                    self._visit(content_data, "", password, queue, pending)
+                )
+            )
+            # 走査中に追加されたタスクも含め、全て終わるまで待つ
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_EXCEPTION
+                )
+                pending.difference_update(done)
+                for error in [task.exception() for task in done]:
+                    if error:
+                        raise error
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_DONE)
+
+    async def _visit(
+        self,
+        folder_data: Dict[str, Any],
+        parent_path: str,
+        password: Optional[str],
+        queue: asyncio.Queue,
+        pending: Set[asyncio.Future],
+    ) -> None:
+        """フォルダ直下のファイルをキューに入れ、サブフォルダの走査を開始"""
+        folder_path = os.path.join(parent_path, folder_data["name"])
+        for child in folder_data.get("children", {}).values():
+            if child["type"] == "folder":
+                pending.add(
+                    asyncio.ensure_future(
+                        self._visit_folder(
+                            child["id"], folder_path, password, queue, pending
+                        )
+                    )
+                )
+            else:
+                await queue.put(self._file_entry(child, folder_path))
+
+    async def _visit_folder(
+        self,
+        folder_id: str,
+        parent_path: str,
+        password: Optional[str],
+        queue: asyncio.Queue,
+        pending: Set[asyncio.Future],
+    ) -> None:
+        """サブフォルダを取得して走査"""
+        async with self._semaphore:
+            folder_data = await self._api.fetch_content(folder_id, password)
+        if folder_data:
+            await self._visit(
+                folder_data, parent_path, password, queue, pending
+            )
+
+    async def _walk_folder(
+        self, folder_id: str, password: Optional[str], parent_path: str
+    ) -> List[FileEntry]:
+        """サブフォルダを取得して走査"""
+        async with self._semaphore:
+            folder_data = await self._api.fetch_content(folder_id, password)
+        if not folder_data:
+            return []
+        return await self.walk(folder_data, password, parent_path)
+
+    @staticmethod
+    def _file_entry(
+        content_data: Dict[str, Any], parent_path: str
+    ) -> FileEntry:
+        """ファイル情報を抽出"""
+        return FileEntry(
+            name=os.path.join(parent_path, content_data["name"]),
+            link=content_data["link"],
+            size=content_data.get("size"),
+            md5=content_data.get("md5"),
+            id=content_data.get("id"),
+            create_time=content_data.get("createTime"),
+        )
@@ -4,6 +4,10 @@ from typing import Any, Dict, Optional
 
 import aiohttp
 
+from ..metrics import MetricsRegistry, track_api
+from ..token.token_pool import TokenPool, retry_after_seconds
+from .content_cache import ContentCache
+
 
 class GoFileAPI:
     """GoFile API client"""
@@ -16,19 +20,57 @@ class GoFileAPI:
     SORT_DIRECTION = "1"
 
     def __init__(
-        self, session: aiohttp.ClientSession, token: Optional[str] = None
+        self,
+        session: aiohttp.ClientSession,
+        token: Optional[str] = None,
+        cache: Optional[ContentCache] = None,
+        token_pool: Optional[TokenPool] = None,
+        metrics: Optional[MetricsRegistry] = None,
     ):
         """Initialize the API client"""
         self._session = session
         self._token = token
+        self._cache = cache
+        self._token_pool = token_pool
+        self._metrics = metrics
 
     async def fetch_content(
         self, content_id: str, password: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch content data from API, using the cache if configured"""
+        if not self._cache:
+            return await self._fetch_content(content_id, password)
+        key = self._cache.make_key(content_id, password)
+        return await self._cache.get_or_load(
+            key, lambda: self._fetch_content(content_id, password)
+        )
+
+    async def _fetch_content(
+        self, content_id: str, password: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
         """Fetch content data from API"""
         url = self._build_url(content_id, password)
+        if not self._token_pool:
+            return await self._request_content(url, self._token)
+        async with self._token_pool.lease() as token:
+            return await self._request_content(url, token)
+
+    async def _request_content(
+        self, url: str, token: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Request content data with the given token"""
         try:
-            response = await self._session.get(url, headers=self._headers)
+            with track_api(self._metrics, "contents") as call:
+                response = await self._session.get(
+                    url, headers=self._build_headers(token)
+                )
+                call.status = response.status
+            if self._token_pool:
+                await self._token_pool.report(
+                    token,
+                    response.status,
+                    retry_after_seconds(response.headers),
+                )
             response.raise_for_status()
         except aiohttp.ClientError as e:
             raise ValueError(f"Failed to fetch content: {e}") from e
@@ -56,8 +98,7 @@ class GoFileAPI:
             f"{self.CONTENT_URL}/{content_id}?{urllib.parse.urlencode(params)}"
         )
 
-    @property
-    def _headers(self) -> Dict[str, str]:
+    def _build_headers(self, token: Optional[str]) -> Dict[str, str]:
         """Create headers for API requests"""
         headers = {
             "User-Agent": "Mozilla/5.0",
@@ -65,8 +106,8 @@ class GoFileAPI:
             "Accept": "*/*",
             "Connection": "keep-alive",
         }
-        if self._token:
-            headers["Authorization"] = f"Bearer {self._token}"
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
         return headers
 
     def _convert_to_sha256(self, password: str) -> str:
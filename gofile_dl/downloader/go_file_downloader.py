@@ -1,37 +1,176 @@
 # go_file_downloader.py
 
 import asyncio
-import os
 import re
+import sqlite3
+import urllib.parse
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 import aiohttp
 
+from ..logger import Logger
+from ..metrics import MetricsRegistry
 from ..token.token_manager import TokenManager
+from ..token.token_pool import REJECTED_STATUSES, TokenPool
+from .archive import ArchiveWriter, ChunkBuffer, create_archive
+from .checksum import (
+    ChecksumIndex,
+    has_size,
+    is_identical,
+    remember_md5,
+)
+from .concurrency import ConcurrencyController
+from .content_cache import ContentCache
+from .dedup_store import DedupStore
 from .file_downloader import FileDownloader
+from .folder_walker import FolderWalker
 from .go_file_api import GoFileAPI
+from .manifest import SyncManifest
+from .models import FileEntry
+from .progress import ProgressTracker
+from .rate_limiter import RateLimiter
+from .retry import CircuitBreaker, DownloadError, RetryPolicy, is_retryable
+from .scheduler import DownloadScheduler
+from .stream import BinaryIOSink
+from .work_queue import WorkQueue, default_worker_id
+from .writer import FileSink, WriterBackend
+
+# ワークキューにまとめて登録するファイル数
+PUBLISH_BATCH = 500
+
+
+class _SharedDownload:
+    """複数の呼び出し元で共有するダウンロード
+
+    待っている呼び出し元が全てキャンセルされた場合のみ中断する。
+    """
+
+    def __init__(self, coro: Awaitable[bool]):
+        self.future = asyncio.ensure_future(coro)
+        self._waiters = 0
+
+    async def wait(self) -> bool:
+        """ダウンロードの完了を待つ"""
+        self._waiters += 1
+        try:
+            return await asyncio.shield(self.future)
+        except asyncio.CancelledError:
+            if self._waiters == 1:
+                self.future.cancel()
+            raise
+        finally:
+            self._waiters -= 1
 
 
 class GoFileDownloader:
     """GoFile.ioのコンテンツをダウンロードするメインクラス"""
 
     def __init__(
-        self, session: aiohttp.ClientSession, token: Optional[str] = None
+        self,
+        session: aiohttp.ClientSession,
+        token: Optional[str] = None,
+        max_concurrent_listings: int = 8,
+        max_concurrent_downloads: int = 10,
+        content_cache: Optional[ContentCache] = None,
+        scheduler: Optional[DownloadScheduler] = None,
+        max_pending_downloads: int = 1000,
+        token_pool: Optional[TokenPool] = None,
+        rate_limit: Optional[float] = None,
+        progress: Optional[ProgressTracker] = None,
+        writer: Optional[WriterBackend] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        concurrency: Optional[ConcurrencyController] = None,
+        dedup_store: Optional[DedupStore] = None,
+        logger: Optional[Logger] = None,
     ):
         self.session = session
         self.token = token
+        self._max_concurrent_listings = max_concurrent_listings
+        self._content_cache = content_cache
+        # スケジューラーは同じインスタンスの全ジョブで共有する
+        self._scheduler = scheduler or DownloadScheduler(
+            max_concurrent_downloads, metrics=metrics
+        )
+        self._max_pending_downloads = max_pending_downloads
+        self._token_pool = token_pool
+        # 全ジョブで共有する帯域制限（rate を変更すると実行中にも反映）
+        self.rate_limiter = RateLimiter(rate_limit)
+        # 全ジョブの進捗をまとめて表示する
+        self.progress = progress or ProgressTracker()
+        self._writer = writer
+        self._metrics = metrics
+        self._retry_policy = retry_policy or RetryPolicy()
+        # ストアサーバーの状態は全ジョブで共有する
+        self._circuit_breaker = circuit_breaker or CircuitBreaker()
+        # scheduler の同時接続数を実行中に調整する
+        self._concurrency = concurrency
+        # 同じ内容のファイルをダウンロードせずにリンクする
+        self._dedup_store = dedup_store
+        # ダウンロード自体は成功した処理の失敗を記録する
+        self._logger = logger
         self._api = None
         self._downloader = None
         self._token_manager = None
+        self._walker = None
+        # 同じ保存先への同時ダウンロードを1つにまとめる
+        self._inflight: Dict[Path, _SharedDownload] = {}
+        # ストアに追加中の内容（キーごと）
+        self._storing: Dict[str, asyncio.Future] = {}
+
+    @property
+    def metrics(self) -> Optional[MetricsRegistry]:
+        """計測値を記録するレジストリ"""
+        return self._metrics
+
+    @property
+    def concurrency(self) -> Optional[ConcurrencyController]:
+        """同時接続数を調整するコントローラー"""
+        return self._concurrency
 
     async def init(self):
         """非同期の初期化処理"""
-        if not self.token:
-            self._token_manager = TokenManager()
+        if not self.token and not self._token_pool:
+            self._token_manager = TokenManager(
+                session=self.session, metrics=self._metrics
+            )
             self.token = await self._token_manager.get_or_create_token()
-        self._api = GoFileAPI(self.session, self.token)
-        self._downloader = FileDownloader(self.session, self.token)
+        self._api = GoFileAPI(
+            self.session,
+            self.token,
+            self._content_cache,
+            self._token_pool,
+            self._metrics,
+        )
+        self._downloader = FileDownloader(
+            self.session,
+            self.token,
+            token_pool=self._token_pool,
+            rate_limiter=self.rate_limiter,
+            progress=self.progress,
+            writer=self._writer,
+            metrics=self._metrics,
+            concurrency=self._concurrency,
+        )
+        self._walker = FolderWalker(self._api, self._max_concurrent_listings)
+
+    def job_rate_limiter(self, rate: Optional[float]) -> RateLimiter:
+        """全体の制限の下で働くジョブ用の帯域制限を生成"""
+        return RateLimiter(rate, parent=self.rate_limiter)
 
     def _normalize_url(self, url_or_id: str) -> str:
         """URLまたはIDからGoFileのIDを抽出"""
@@ -44,47 +183,319 @@ class GoFileDownloader:
         return f"Invalid URL or ID format: {url_or_id}"
 
     async def _extract_files(
-        self, content_data: Dict[str, Any], parent_path: str = ""
-    ) -> List[Dict[str, Any]]:
+        self,
+        content_data: Dict[str, Any],
+        parent_path: str = "",
+        password: Optional[str] = None,
+    ) -> List[FileEntry]:
         """コンテンツデータからファイル情報を抽出"""
-        files = []
-
-        if content_data["type"] == "file":
-            files.append(
-                {
-                    "name": os.path.join(parent_path, content_data["name"]),
-                    "link": content_data["link"],
-                    "size": content_data.get("size"),
-                }
+        return await self._walker.walk(content_data, password, parent_path)
+
+    async def _download_entries(
+        self,
+        entries: AsyncGenerator[FileEntry, None],
+        output_dir: Path,
+        result: Dict[str, Any],
+        priority: int = 0,
+        on_complete: Optional[Callable[[FileEntry, Path], None]] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> None:
+        """ファイル情報を受け取り次第、スケジューラー経由でダウンロード
+
+        待機中のファイルは ``max_pending_downloads`` 件までに制限し、
+        その中でスケジューラーが開始順を決める。ファイルが揃うたびに
+        ``on_complete`` を呼び出す。
+        """
+        semaphore = asyncio.Semaphore(self._max_pending_downloads)
+        active: Set[asyncio.Future] = set()
+        index = ChecksumIndex(output_dir / ChecksumIndex.FILE_NAME)
+
+        async def download(entry: FileEntry) -> None:
+            file_path = output_dir / entry.name
+            skipped, error = False, None
+            try:
+                # サイズとハッシュが一致する既存のファイルはダウンロードしない
+                skipped = await is_identical(
+                    file_path, entry.size, entry.md5, index
+                )
+                if not skipped:
+                    await self._download_once(
+                        entry, file_path, priority, rate_limiter
+                    )
+                    await self._remember_md5(index, entry, file_path)
+            except Exception as e:
+                # 失敗はファイル単位で記録し、他のファイルは続行する
+                error = str(e)
+            finally:
+                semaphore.release()
+            self._record_file(result, entry, str(file_path), error, skipped)
+            if error is None and on_complete:
+                on_complete(entry, file_path)
+
+        try:
+            async for entry in entries:
+                # 空きができるまで一覧の消費を止める
+                await semaphore.acquire()
+                task = asyncio.ensure_future(download(entry))
+                task.add_done_callback(active.discard)
+                active.add(task)
+            await asyncio.gather(*active)
+        finally:
+            for task in list(active):
+                task.cancel()
+            await asyncio.gather(*active, return_exceptions=True)
+            await entries.aclose()
+
+    @staticmethod
+    async def _remember_md5(
+        index: ChecksumIndex, entry: FileEntry, file_path: Path
+    ) -> None:
+        """ダウンロード時に検証したMD5を次回の比較のために記録"""
+        if entry.md5:
+            await remember_md5(index, file_path, entry.md5)
+
+    @staticmethod
+    def _record_file(
+        result: Dict[str, Any],
+        entry: FileEntry,
+        path: str,
+        error: Optional[str],
+        skipped: bool = False,
+    ) -> None:
+        """ファイルごとの結果を記録"""
+        result["files"].append(
+            {
+                "filename": entry.name,
+                "path": path,
+                "size": entry.size,
+                "success": error is None,
+                "skipped": skipped,
+                "error": error,
+            }
+        )
+        if error is not None:
+            result["errors"].append(f"{entry.name}: {error}")
+
+    async def _download_once(
+        self,
+        entry: FileEntry,
+        file_path: Path,
+        priority: int,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> bool:
+        """ファイルをダウンロード（同じ保存先へのダウンロード中は相乗り）"""
+        shared = self._inflight.get(file_path)
+        if shared is None:
+            shared = self._inflight[file_path] = _SharedDownload(
+                self._fetch_file(entry, file_path, priority, rate_limiter)
             )
-        elif content_data["type"] == "folder":
-            folder_path = os.path.join(parent_path, content_data["name"])
-            for _, child in content_data.get("children", {}).items():
-                if child["type"] == "folder":
-                    folder_data = await self._api.fetch_content(child["id"])
-                    if folder_data:
-                        folder_files = await self._extract_files(
-                            folder_data, folder_path
-                        )
-                        files.extend(folder_files)
-                else:
-                    files.append(
-                        {
-                            "name": os.path.join(folder_path, child["name"]),
-                            "link": child["link"],
-                            "size": child.get("size"),
-                        }
+            shared.future.add_done_callback(
+                lambda _: self._inflight.pop(file_path, None)
+            )
+        return await shared.wait()
+
+    async def _fetch_file(
+        self,
+        entry: FileEntry,
+        file_path: Path,
+        priority: int,
+        rate_limiter: Optional[RateLimiter],
+    ) -> bool:
+        """ストアにある内容はリンクし、なければダウンロードして追加
+
+        同じ内容を別の保存先へ同時にダウンロードしないよう、追加中の
+        内容があればその完了を待ってからリンクする。
+        """
+        store = self._dedup_store
+        key = store.key_for(entry) if store else None
+        if key is None:
+            return await self._download_with_retry(
+                entry, file_path, priority, rate_limiter
+            )
+        while True:
+            if await store.link(entry, file_path):
+                if self._metrics:
+                    self._metrics.dedup_hits.inc()
+                    self._metrics.dedup_bytes.inc(entry.size)
+                return True
+            pending = self._storing.get(key)
+            if pending is None:
+                break
+            # 先のダウンロードが失敗した場合はこちらでダウンロードする
+            await asyncio.wait([pending])
+
+        pending = self._storing[key] = (
+            asyncio.get_running_loop().create_future()
+        )
+        try:
+            success = await self._download_with_retry(
+                entry, file_path, priority, rate_limiter
+            )
+            try:
+                await store.add(entry, file_path)
+            except (OSError, sqlite3.Error) as e:
+                # ストアに追加できなくてもダウンロードは完了している
+                if self._logger:
+                    self._logger.warning(
+                        f"Could not add {entry.name} to the dedup store: {e}"
+                    )
+            return success
+        finally:
+            del self._storing[key]
+            pending.set_result(None)
+
+    async def _download_with_retry(
+        self,
+        entry: FileEntry,
+        file_path: Path,
+        priority: int,
+        rate_limiter: Optional[RateLimiter],
+    ) -> bool:
+        """一時的な失敗はバックオフを挟んで再試行
+
+        失敗が続くストアサーバーへの転送は、サーキットブレーカーが
+        回復を確認するまで待たせる。待機中は接続枠を使わない。
+        トークンのプールがあれば、トークンを拒否された転送は
+        プールのトークン数まで別のトークンで試す。
+        """
+        host = urllib.parse.urlsplit(entry.link).hostname or ""
+        attempt = rejected = 0
+        while True:
+            attempt += 1
+            trial = await self._circuit_breaker.acquire(host)
+            try:
+                success = await self._scheduler.run(
+                    lambda: self._downloader.download_file(
+                        entry.link,
+                        file_path,
+                        entry.size,
+                        entry.md5,
+                        rate_limiter,
+                    ),
+                    size=entry.size,
+                    host=host,
+                    priority=priority,
+                    weight=self._downloader.connections_for(entry.size),
+                )
+            except Exception as e:
+                if self._is_token_rejection(e):
+                    rejected += 1
+                    if rejected < self._token_pool.max_size:
+                        self._circuit_breaker.record_success(host)
+                        continue
+                if not is_retryable(e):
+                    # サーバーは応答しているため回路は閉じる
+                    self._circuit_breaker.record_success(host)
+                    raise e
+                self._record_failure(host, trial)
+                if attempt >= self._retry_policy.attempts:
+                    raise e
+                if self._metrics:
+                    self._metrics.retries.inc(operation="download")
+                await asyncio.sleep(
+                    self._retry_policy.delay(
+                        attempt, getattr(e, "retry_after", None)
                     )
+                )
+            except BaseException:
+                self._circuit_breaker.release(host, trial)
+                raise
+            else:
+                self._record_success(host)
+                return success
+
+    def _is_token_rejection(self, error: Exception) -> bool:
+        """プールのトークンが拒否された失敗かどうか"""
+        return (
+            self._token_pool is not None
+            and isinstance(error, DownloadError)
+            and error.status in REJECTED_STATUSES
+        )
+
+    def _record_success(self, host: str) -> None:
+        """転送の成功をサーキットブレーカーと同時接続数の調整に反映"""
+        self._circuit_breaker.record_success(host)
+        if self._concurrency:
+            self._concurrency.record_success()
+
+    def _record_failure(
+        self, host: str, trial: Optional[asyncio.Future]
+    ) -> None:
+        """転送の失敗をサーキットブレーカーと同時接続数の調整に反映"""
+        if self._concurrency:
+            self._concurrency.record_error()
+        opened = self._circuit_breaker.record_failure(host, trial)
+        if self._metrics and opened:
+            self._metrics.circuit_opens.inc(host=host)
 
-        return files
+    async def _resolve_content(
+        self,
+        url_or_id: str,
+        password: Optional[str],
+        output_dir: Optional[str],
+        result: Dict[str, Any],
+    ) -> Optional[Tuple[str, Path, Dict[str, Any]]]:
+        """コンテンツを取得し、保存先のディレクトリを作成
+
+        失敗した場合は result にエラーを設定して None を返す。
+        """
+        content_id = self._normalize_url(url_or_id)
+        if "Invalid URL or ID format" in content_id:
+            result["status"] = "error"
+            result["message"] = content_id
+            return None
+
+        output_path = Path(output_dir) if output_dir else Path("./downloads")
+        output_path.mkdir(parents=True, exist_ok=True)
+
+        # ファイルIDのディレクトリを作成
+        content_id_dir = output_path / content_id
+        content_id_dir.mkdir(parents=True, exist_ok=True)
+
+        # APIからコンテンツデータを取得
+        content_data = await self._api.fetch_content(content_id, password)
+        if isinstance(
+            content_data, str
+        ):  # APIからエラーメッセージを受け取った場合
+            result["status"] = "error"
+            result["message"] = content_data
+            return None
+        if not content_data:
+            result["status"] = "error"
+            result["message"] = "Failed to fetch content data"
+            return None
+        return content_id, content_id_dir, content_data
+
+    @staticmethod
+    def _summarize(result: Dict[str, Any]) -> None:
+        """ダウンロード結果のメッセージを設定"""
+        failed = sum(1 for file in result["files"] if not file["success"])
+        if failed:
+            succeeded = len(result["files"]) - failed
+            result["status"] = "partial" if succeeded else "error"
+            result["message"] = (
+                f"Downloaded {succeeded} of {len(result['files'])} files, "
+                f"{failed} failed"
+            )
+        else:
+            result["message"] = (
+                f"Successfully downloaded {len(result['files'])} files"
+            )
 
     async def download(
         self,
         url_or_id: str,
         password: Optional[str] = None,
         output_dir: Optional[str] = None,
+        priority: int = 0,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> Dict[str, Any]:
-        """GoFileからファイルをダウンロード"""
+        """GoFileからファイルをダウンロード
+
+        priority が大きいジョブのファイルほど先に開始される。
+        rate_limiter には ``job_rate_limiter`` で生成したジョブごとの
+        帯域制限を指定できる。
+        """
         result = {
             "status": "success",
             "message": "",
@@ -93,70 +504,547 @@ class GoFileDownloader:
         }
 
         try:
-            content_id = self._normalize_url(url_or_id)
-            if "Invalid URL or ID format" in content_id:
-                result["status"] = "error"
-                result["message"] = content_id
+            resolved = await self._resolve_content(
+                url_or_id, password, output_dir, result
+            )
+            if resolved is None:
                 return result
+            _, content_id_dir, content_data = resolved
 
-            output_path = (
-                Path(output_dir) if output_dir else Path("./downloads")
+            # 一覧の取得と並行してダウンロードを開始する
+            await self._download_entries(
+                self._walker.iter_files(content_data, password),
+                content_id_dir,
+                result,
+                priority,
+                rate_limiter=rate_limiter,
             )
-            output_path.mkdir(parents=True, exist_ok=True)
-
-            # ファイルIDのディレクトリを作成
-            content_id_dir = output_path / content_id
-            content_id_dir.mkdir(parents=True, exist_ok=True)
-
-            # APIからコンテンツデータを取得
-            content_data = await self._api.fetch_content(content_id, password)
-            if isinstance(
-                content_data, str
-            ):  # APIからエラーメッセージを受け取った場合
-                result["status"] = "error"
-                result["message"] = content_data
-                return result
-            if not content_data:
-                result["status"] = "error"
-                result["message"] = "Failed to fetch content data"
-                return result
+            self._summarize(result)
+
+        except Exception as e:
+            result["status"] = "error"
+            result["message"] = f"Error during download: {str(e)}"
+            result["errors"].append(f"Error during download: {str(e)}")
+
+        return result
+
+    async def stream(
+        self,
+        url_or_id: str,
+        password: Optional[str] = None,
+        path: Optional[str] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> AsyncIterator[bytes]:
+        """1つのファイルの内容をディスクに書き込まずにチャンクごとに返す
+
+        フォルダの場合は path（``download`` の保存先と同じ相対パス）で
+        ファイルを指定する。ファイルが1つだけなら省略できる。
+        受信は呼び出し元の消費に合わせるため、接続枠は使わない。
+        """
+        entry = await self._find_entry(url_or_id, password, path)
+        chunks = self._downloader.stream_file(
+            entry.link, entry.size, entry.md5, rate_limiter
+        )
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def stream_to(
+        self,
+        url_or_id: str,
+        sink: FileSink,
+        password: Optional[str] = None,
+        path: Optional[str] = None,
+        priority: int = 0,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> int:
+        """1つのファイルをシンクに書き込み、書き込んだバイト数を返す
+
+        他のダウンロードと同じくスケジューラーの接続枠を使う。
+        シンクは閉じないため、呼び出し元で閉じる。
+        """
+        entry = await self._find_entry(url_or_id, password, path)
+        return await self._scheduler.run(
+            lambda: self._downloader.download_to(
+                entry.link, sink, entry.size, entry.md5, rate_limiter
+            ),
+            size=entry.size,
+            host=urllib.parse.urlsplit(entry.link).hostname or "",
+            priority=priority,
+        )
+
+    async def _find_entry(
+        self,
+        url_or_id: str,
+        password: Optional[str],
+        path: Optional[str],
+    ) -> FileEntry:
+        """ストリーミングするファイルの情報を取得"""
+        content_data = await self._fetch_content_data(url_or_id, password)
+        found: List[FileEntry] = []
+        entries = self._walker.iter_files(content_data, password)
+        try:
+            async for entry in entries:
+                if path is not None and entry.name == path.strip("/"):
+                    return entry
+                found.append(entry)
+        finally:
+            await entries.aclose()
+        if path is not None:
+            raise ValueError(f"File not found: {path}")
+        if len(found) != 1:
+            raise ValueError(
+                f"Content has {len(found)} files; specify a path to stream"
+            )
+        return found[0]
+
+    async def download_archive(
+        self,
+        url_or_id: str,
+        destination: Union[str, Path, FileSink],
+        archive_format: str = "tar",
+        password: Optional[str] = None,
+        priority: int = 0,
+        rate_limiter: Optional[RateLimiter] = None,
+        max_buffered_files: int = 16,
+        buffer_size: int = 8 * 1024 * 1024,
+    ) -> Dict[str, Any]:
+        """GoFileのコンテンツを1つのtarまたはzipとして書き込む
+
+        destination にはファイルのパスかシンクを指定する（シンクは
+        閉じない）。一覧の取得と並行して最大 max_buffered_files 件を
+        同時にダウンロードし、見つかった順にアーカイブへ追加する。
+        エントリーの名前は ``download`` の保存先と同じ相対パスになり、
+        ファイルごとのバッファは buffer_size バイトまでに制限する。
+        """
+        result = {
+            "status": "success",
+            "message": "",
+            "files": [],
+            "errors": [],
+        }
+        sink = destination if isinstance(destination, FileSink) else None
+        try:
+            content_data = await self._fetch_content_data(url_or_id, password)
+            if sink is None:
+                path = Path(destination)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                sink = BinaryIOSink(path.open("wb"), close=True)
+            archive = create_archive(archive_format, sink)
+            await self._archive_entries(
+                self._walker.iter_files(content_data, password),
+                archive,
+                result,
+                priority,
+                rate_limiter,
+                max_buffered_files,
+                buffer_size,
+            )
+            await archive.close()
+            self._summarize(result)
+
+        except Exception as e:
+            result["status"] = "error"
+            result["message"] = f"Error during download: {str(e)}"
+            result["errors"].append(f"Error during download: {str(e)}")
+        finally:
+            if sink is not None and sink is not destination:
+                await sink.close()
+
+        return result
+
+    async def _archive_entries(
+        self,
+        entries: AsyncGenerator[FileEntry, None],
+        archive: ArchiveWriter,
+        result: Dict[str, Any],
+        priority: int,
+        rate_limiter: Optional[RateLimiter],
+        max_buffered_files: int,
+        buffer_size: int,
+    ) -> None:
+        """ファイルを並列にダウンロードし、見つかった順にアーカイブへ追加"""
+        slots = asyncio.Semaphore(max(1, max_buffered_files))
+        queue: asyncio.Queue = asyncio.Queue()
+        filling: Set[asyncio.Future] = set()
+
+        async def append() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                entry, buffer = item
+                error = None
+                try:
+                    await archive.add(
+                        entry.name, entry.size, buffer, entry.create_time
+                    )
+                except Exception as e:
+                    # 失敗はファイル単位で記録し、他のファイルは続行する
+                    error = str(e)
+                finally:
+                    slots.release()
+                self._record_file(result, entry, entry.name, error)
+
+        appender = asyncio.ensure_future(append())
+        previous = asyncio.Event()
+        previous.set()
+        try:
+            async for entry in entries:
+                # アーカイブへの追加が追いつくまで次のファイルを始めない
+                await slots.acquire()
+                if appender.done():
+                    break
+                buffer = ChunkBuffer(buffer_size)
+                started = asyncio.Event()
+                task = asyncio.ensure_future(
+                    self._fill_buffer(
+                        entry,
+                        buffer,
+                        previous,
+                        started,
+                        priority,
+                        rate_limiter,
+                    )
+                )
+                previous = started
+                task.add_done_callback(filling.discard)
+                filling.add(task)
+                queue.put_nowait((entry, buffer))
+            queue.put_nowait(None)
+            await appender
+        finally:
+            for task in [appender, *filling]:
+                task.cancel()
+            await asyncio.gather(appender, *filling, return_exceptions=True)
+            await entries.aclose()
+
+    async def _fill_buffer(
+        self,
+        entry: FileEntry,
+        buffer: ChunkBuffer,
+        previous: asyncio.Event,
+        started: asyncio.Event,
+        priority: int,
+        rate_limiter: Optional[RateLimiter],
+    ) -> None:
+        """前のファイルが開始してから接続枠を予約し、バッファに受信する
+
+        バッファが一杯のダウンロードは接続枠を持ったまま追加を待つため、
+        スケジューラーのポリシーで後ろのファイルが先に枠を埋めると
+        先頭のファイルが始まらず止まってしまう。開始を見つかった順に
+        揃え、後ろのファイルが先に枠を取らないようにする。
+        """
+
+        def start() -> Awaitable[None]:
+            started.set()
+            return self._buffer_file(entry, buffer, rate_limiter)
+
+        error = None
+        try:
+            await previous.wait()
+            await self._scheduler.run(
+                start,
+                size=entry.size,
+                host=urllib.parse.urlsplit(entry.link).hostname or "",
+                priority=priority,
+            )
+        except Exception as e:
+            error = e
+        finally:
+            # 失敗した場合も次のファイルを待たせない
+            started.set()
+        await buffer.finish(error)
+
+    async def _buffer_file(
+        self,
+        entry: FileEntry,
+        buffer: ChunkBuffer,
+        rate_limiter: Optional[RateLimiter],
+    ) -> None:
+        """ファイルを受信してバッファに溜める"""
+        chunks = self._downloader.stream_file(
+            entry.link, entry.size, entry.md5, rate_limiter
+        )
+        try:
+            async for chunk in chunks:
+                await buffer.put(chunk)
+        finally:
+            await chunks.aclose()
+
+    async def _fetch_content_data(
+        self, url_or_id: str, password: Optional[str]
+    ) -> Dict[str, Any]:
+        """コンテンツデータを取得（失敗した場合は ValueError）"""
+        content_id = self._normalize_url(url_or_id)
+        if "Invalid URL or ID format" in content_id:
+            raise ValueError(content_id)
+        content_data = await self._api.fetch_content(content_id, password)
+        if isinstance(content_data, str):
+            raise ValueError(content_data)
+        if not content_data:
+            raise ValueError("Failed to fetch content data")
+        return content_data
 
-            files_to_download = await self._extract_files(content_data)
+    async def publish(
+        self,
+        url_or_id: str,
+        queue: WorkQueue,
+        password: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """コンテンツのファイル一覧をワークキューに登録
+
+        登録したファイルは ``work`` を実行している全てのワーカーで
+        分担してダウンロードする。
+        """
+        content_data = await self._fetch_content_data(url_or_id, password)
+        content_id = self._normalize_url(url_or_id)
+        total, published = 0, 0
+        batch: List[FileEntry] = []
+        entries = self._walker.iter_files(content_data, password)
+        try:
+            async for entry in entries:
+                batch.append(entry)
+                total += 1
+                if len(batch) >= PUBLISH_BATCH:
+                    published += await queue.publish(content_id, batch)
+                    batch = []
+        finally:
+            await entries.aclose()
+        published += await queue.publish(content_id, batch)
+        return {
+            "content_id": content_id,
+            "files": total,
+            "published": published,
+        }
+
+    async def work(
+        self,
+        queue: WorkQueue,
+        output_dir: Optional[str] = None,
+        worker_id: Optional[str] = None,
+        poll_interval: float = 1.0,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> Dict[str, Any]:
+        """ワークキューのファイルを他のワーカーと分担してダウンロード
 
-            download_tasks = [
-                self._downloader.download_file(
-                    file_info["link"], content_id_dir / file_info["name"]
+        他のワーカーの分を取りすぎないよう、スケジューラーの同時接続数
+        までのファイルを借り受け、リースの期限の1/3ごとに延長する。
+        保存先は ``download`` と同じく
+        ``<output_dir>/<コンテンツID>/<相対パス>`` になる。未処理と
+        処理中のファイルがなくなると戻り、他のワーカーが処理中の
+        ファイルが残っている間はリースが切れた場合に備えて待つ。
+        """
+        worker = worker_id or default_worker_id()
+        output_path = Path(output_dir) if output_dir else Path("./downloads")
+        result = {
+            "status": "success",
+            "message": "",
+            "worker": worker,
+            "files": [],
+            "errors": [],
+        }
+        loop = asyncio.get_running_loop()
+        renew_at = loop.time() + queue.lease_seconds / 3
+        active: Dict[asyncio.Future, Tuple[str, str]] = {}
+        try:
+            while True:
+                claimed = await queue.claim(
+                    worker, self._scheduler.max_connections - len(active)
                 )
-                for file_info in files_to_download
-            ]
-
-            download_results = await asyncio.gather(*download_tasks)
-
-            for file_info, success in zip(files_to_download, download_results):
-                file_result = {
-                    "filename": file_info["name"],
-                    "path": str(content_id_dir / file_info["name"]),
-                    "size": file_info.get("size"),
-                    "success": success,
-                }
-                result["files"].append(file_result)
-                if isinstance(success, str):  # エラーメッセージ
-                    result["errors"].append(success)
-
-            if result["errors"]:
-                result["status"] = "partial"
-                result["message"] = (
-                    f"Downloaded {len(result['files'])} files, "
-                    f"{len(result['errors'])} of which failed"
+                for content_id, entry in claimed:
+                    task = asyncio.ensure_future(
+                        self._work_file(
+                            queue,
+                            worker,
+                            content_id,
+                            entry,
+                            output_path,
+                            result,
+                            rate_limiter,
+                        )
+                    )
+                    active[task] = (content_id, queue.entry_key(entry))
+                if not active and not claimed:
+                    if not await queue.remaining():
+                        break
+                    await asyncio.sleep(poll_interval)
+                    continue
+
+                done, _ = await asyncio.wait(
+                    set(active),
+                    timeout=poll_interval,
+                    return_when=asyncio.FIRST_COMPLETED,
                 )
-            else:
-                result["message"] = (
-                    f"Successfully downloaded {len(result['files'])} files"
+                for task in done:
+                    del active[task]
+                if active and loop.time() >= renew_at:
+                    await queue.renew(worker, active.values())
+                    renew_at = loop.time() + queue.lease_seconds / 3
+        finally:
+            for task in active:
+                task.cancel()
+            await asyncio.gather(*active, return_exceptions=True)
+            # 中断したファイルはリースの期限を待たずに返す
+            await queue.release(worker, active.values())
+
+        self._summarize(result)
+        return result
+
+    async def _work_file(
+        self,
+        queue: WorkQueue,
+        worker: str,
+        content_id: str,
+        entry: FileEntry,
+        output_path: Path,
+        result: Dict[str, Any],
+        rate_limiter: Optional[RateLimiter],
+    ) -> None:
+        """借り受けたファイルをダウンロードして結果を報告"""
+        content_dir = output_path / content_id
+        file_path = content_dir / entry.name
+        index = ChecksumIndex(content_dir / ChecksumIndex.FILE_NAME)
+        skipped, error = False, None
+        try:
+            skipped = await is_identical(
+                file_path, entry.size, entry.md5, index
+            )
+            if not skipped:
+                await self._download_once(entry, file_path, 0, rate_limiter)
+                await self._remember_md5(index, entry, file_path)
+        except Exception as e:
+            error = str(e)
+
+        if error is None:
+            reported = await queue.complete(worker, content_id, entry)
+        else:
+            reported = await queue.fail(worker, content_id, entry, error)
+        if not reported:
+            # リースが他のワーカーに渡った場合や再試行される場合は、
+            # そのワーカーの結果に任せてここでは数えない
+            return
+        self._record_file(result, entry, str(file_path), error, skipped)
+
+    async def sync(
+        self,
+        url_or_id: str,
+        password: Optional[str] = None,
+        output_dir: Optional[str] = None,
+        prune: bool = False,
+        manifest_path: Optional[str] = None,
+        priority: int = 0,
+        rate_limiter: Optional[RateLimiter] = None,
+    ) -> Dict[str, Any]:
+        """GoFileのコンテンツをローカルのディレクトリと同期
+
+        前回の同期の記録（マニフェスト）と比べて、追加・変更された
+        ファイルのみダウンロードする。prune が True の場合は、
+        リモートから削除されたファイルをローカルからも削除する。
+        マニフェストは既定でコンテンツのディレクトリに保存する。
+        """
+        result = {
+            "status": "success",
+            "message": "",
+            "files": [],
+            "errors": [],
+            "sync": {"added": 0, "changed": 0, "unchanged": 0, "pruned": 0},
+        }
+
+        try:
+            resolved = await self._resolve_content(
+                url_or_id, password, output_dir, result
+            )
+            if resolved is None:
+                return result
+            content_id, content_id_dir, content_data = resolved
+
+            path = manifest_path or content_id_dir / SyncManifest.FILE_NAME
+            with SyncManifest(path) as manifest:
+                known = manifest.load(content_id)
+                seen: Set[str] = set()
+
+                def on_complete(entry: FileEntry, file_path: Path) -> None:
+                    record = known.get(SyncManifest.entry_key(entry))
+                    # 名前が変わったファイルは古いパスを片付ける
+                    if (
+                        prune
+                        and record
+                        and record["local_path"] != str(file_path)
+                    ):
+                        Path(record["local_path"]).unlink(missing_ok=True)
+                    manifest.upsert(content_id, entry, file_path)
+
+                await self._download_entries(
+                    self._changed_entries(
+                        self._walker.iter_files(content_data, password),
+                        content_id_dir,
+                        known,
+                        seen,
+                        result["sync"],
+                    ),
+                    content_id_dir,
+                    result,
+                    priority,
+                    on_complete,
+                    rate_limiter,
                 )
+                # 一覧を最後まで取得できた場合のみ削除する
+                if prune:
+                    result["sync"]["pruned"] = self._prune(
+                        manifest, content_id, known, seen
+                    )
+            self._summarize(result)
 
         except Exception as e:
             result["status"] = "error"
-            result["message"] = f"Error during download: {str(e)}"
-            result["errors"].append(f"Error during download: {str(e)}")
+            result["message"] = f"Error during sync: {str(e)}"
+            result["errors"].append(f"Error during sync: {str(e)}")
 
         return result
+
+    @staticmethod
+    async def _changed_entries(
+        entries: AsyncGenerator[FileEntry, None],
+        output_dir: Path,
+        known: Dict[str, Dict[str, Any]],
+        seen: Set[str],
+        counts: Dict[str, int],
+    ) -> AsyncGenerator[FileEntry, None]:
+        """マニフェストと比べて追加・変更されたファイルのみを返す"""
+        try:
+            async for entry in entries:
+                key = SyncManifest.entry_key(entry)
+                seen.add(key)
+                record = known.get(key)
+                if record is None:
+                    counts["added"] += 1
+                elif SyncManifest.is_unchanged(record, entry) and has_size(
+                    output_dir / entry.name, entry.size
+                ):
+                    counts["unchanged"] += 1
+                    continue
+                else:
+                    counts["changed"] += 1
+                yield entry
+        finally:
+            await entries.aclose()
+
+    @staticmethod
+    def _prune(
+        manifest: SyncManifest,
+        content_id: str,
+        known: Dict[str, Dict[str, Any]],
+        seen: Set[str],
+    ) -> int:
+        """リモートから削除されたファイルをローカルと記録から削除"""
+        pruned = 0
+        for key, record in known.items():
+            if key in seen:
+                continue
+            Path(record["local_path"]).unlink(missing_ok=True)
+            manifest.remove(content_id, key)
+            pruned += 1
+        return pruned
@@ -0,0 +1,102 @@
+import json
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+class DownloadJournal:
+    """.partファイルのダウンロード済みバイト範囲を記録するジャーナル
+
+    ジャーナルは .part ファイルの隣に ``<name>.part.journal`` として
+    保存され、プロセスが強制終了されても次回のダウンロードで
+    続きから再開できるようにする。範囲は (start, end) の閉区間。
+    """
+
+    SUFFIX = ".journal"
+
+    def __init__(self, part_path: Path, size: int):
+        self.part_path = part_path
+        self.path = part_path.with_suffix(f"{part_path.suffix}{self.SUFFIX}")
+        self.size = size
+        self._completed: List[Tuple[int, int]] = []
+
+    @classmethod
+    def load(cls, part_path: Path, size: int) -> "DownloadJournal":
+        """既存のジャーナルを読み込む
+
+        リモートのファイルサイズと一致しない場合や .part ファイルが
+        存在しない場合は、空のジャーナルを返す。
+        """
+        journal = cls(part_path, size)
+        data = journal._read()
+        if not data or data.get("size") != size or not part_path.exists():
+            return journal
+
+        # .partファイルに実際に存在する範囲のみを信頼する
+        part_length = min(part_path.stat().st_size, size)
+        for start, end in data.get("completed", []):
+            end = min(end, part_length - 1)
+            if 0 <= start <= end:
+                journal.add(start, end)
+        return journal
+
+    @property
+    def completed(self) -> List[Tuple[int, int]]:
+        """ダウンロード済みの範囲"""
+        return list(self._completed)
+
+    @property
+    def completed_bytes(self) -> int:
+        """ダウンロード済みのバイト数"""
+        return sum(end - start + 1 for start, end in self._completed)
+
+    def is_complete(self) -> bool:
+        """全範囲がダウンロード済みかどうか"""
+        return self._completed == [(0, self.size - 1)]
+
+    def add(self, start: int, end: int) -> None:
+        """ダウンロード済みの範囲を追加し、隣接する範囲と統合"""
+        merged: List[Tuple[int, int]] = []
+        for current in sorted([*self._completed, (start, end)]):
+            if merged and current[0] <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], current[1]))
+            else:
+                merged.append(current)
+        self._completed = merged
+
+    def missing_ranges(self) -> List[Tuple[int, int]]:
+        """未ダウンロードの範囲を取得"""
+        missing = []
+        position = 0
+        for start, end in self._completed:
+            if start > position:
+                missing.append((position, start - 1))
+            position = end + 1
+        if position < self.size:
+            missing.append((position, self.size - 1))
+        return missing
+
+    def reset(self) -> None:
+        """記録をすべて破棄"""
+        self._completed = []
+
+    def save(self) -> None:
+        """ジャーナルをアトミックに保存"""
+        data = {"size": self.size, "completed": self._completed}
+        tmp_path = self.path.with_suffix(f"{self.path.suffix}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        """ジャーナルファイルを削除"""
+        if self.path.exists():
+            self.path.unlink()
+
+    def _read(self) -> Optional[dict]:
+        """ジャーナルファイルを読み込む"""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
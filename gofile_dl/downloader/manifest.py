@@ -0,0 +1,111 @@
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Union
+
+from .models import FileEntry
+
+
+class SyncManifest:
+    """同期済みファイルを記録するSQLiteのマニフェスト
+
+    コンテンツIDごとに、各ファイルのリモートID・サイズ・MD5・
+    作成日時・ローカルのパスを保持する。
+    """
+
+    FILE_NAME = ".gofile-manifest.sqlite"
+    COMMIT_INTERVAL = 100
+
+    def __init__(self, path: Union[str, Path]):
+        self._conn = sqlite3.connect(str(path))
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                content_id TEXT NOT NULL,
+                remote_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER,
+                md5 TEXT,
+                create_time INTEGER,
+                local_path TEXT NOT NULL,
+                PRIMARY KEY (content_id, remote_id)
+            )
+            """
+        )
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def __enter__(self) -> "SyncManifest":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @staticmethod
+    def entry_key(entry: FileEntry) -> str:
+        """ファイルを識別するキー（リモートIDがなければパス）"""
+        return entry.id or entry.name
+
+    def load(self, content_id: str) -> Dict[str, Dict[str, Any]]:
+        """コンテンツIDの記録をリモートIDごとに取得"""
+        rows = self._conn.execute(
+            "SELECT * FROM files WHERE content_id = ?", (content_id,)
+        )
+        return {row["remote_id"]: dict(row) for row in rows}
+
+    @staticmethod
+    def is_unchanged(record: Dict[str, Any], entry: FileEntry) -> bool:
+        """記録とリモートのファイル情報が一致するかどうか"""
+        return (
+            record["name"] == entry.name
+            and record["size"] == entry.size
+            and record["md5"] == entry.md5
+            and record["create_time"] == entry.create_time
+        )
+
+    def upsert(
+        self, content_id: str, entry: FileEntry, local_path: Path
+    ) -> None:
+        """ファイルの記録を追加または更新"""
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO files (
+                content_id, remote_id, name, size, md5, create_time,
+                local_path
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                content_id,
+                self.entry_key(entry),
+                entry.name,
+                entry.size,
+                entry.md5,
+                entry.create_time,
+                str(local_path),
+            ),
+        )
+        self._maybe_commit()
+
+    def remove(self, content_id: str, remote_id: str) -> None:
+        """ファイルの記録を削除"""
+        self._conn.execute(
+            "DELETE FROM files WHERE content_id = ? AND remote_id = ?",
+            (content_id, remote_id),
+        )
+        self._maybe_commit()
+
+    def commit(self) -> None:
+        """未保存の変更を書き込む"""
+        self._conn.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        """変更を書き込んで接続を閉じる"""
+        self.commit()
+        self._conn.close()
+
+    def _maybe_commit(self) -> None:
+        """一定件数ごとにコミット"""
+        self._uncommitted += 1
+        if self._uncommitted >= self.COMMIT_INTERVAL:
+            self.commit()
@@ -0,0 +1,19 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class FileEntry:
+    """ダウンロード対象のファイル情報
+
+    巨大なフォルダでもメモリを抑えられるよう ``__slots__`` を使う。
+    """
+
+    __slots__ = ("name", "link", "size", "md5", "id", "create_time")
+
+    name: str
+    link: str
+    size: Optional[int]
+    md5: Optional[str]
+    id: Optional[str]
+    create_time: Optional[int]
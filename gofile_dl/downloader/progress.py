@@ -0,0 +1,235 @@
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional, TextIO
+
+from tqdm import tqdm
+
+MODES = ("bar", "json", "none")
+
+
+class FileProgress:
+    """1ファイル分の進捗
+
+    ``update`` はカウンターを増やすだけで、表示は ``ProgressTracker`` が
+    一定間隔でまとめて行う。
+    """
+
+    __slots__ = ("name", "total", "done", "started", "_tracker")
+
+    def __init__(
+        self, tracker: "ProgressTracker", name: str, total: int, initial: int
+    ):
+        self.name = name
+        self.total = total
+        self.done = initial
+        self.started = time.monotonic()
+        self._tracker = tracker
+
+    def update(self, amount: int) -> None:
+        """ダウンロードしたバイト数を加算"""
+        self.done += amount
+
+    def close(self, success: bool = True) -> None:
+        """ファイルのダウンロードを終了"""
+        self._tracker._finish(self, success)
+
+    def __enter__(self) -> "FileProgress":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        self.close(exc_type is None)
+
+
+class ProgressTracker:
+    """全ダウンロードの進捗を集約して表示するクラス
+
+    ダウンロードは ``start_file`` で得た ``FileProgress`` に加算する
+    だけで、表示は ``interval`` 秒ごとにまとめて更新する。
+
+    - ``bar``: 全体の進捗バーと、残りが大きい順に ``top_n`` 件の
+      ダウンロード中のファイルを表示
+    - ``json``: 進捗をJSON Lines形式のイベントとして出力
+    - ``none``: 何も表示しない
+    """
+
+    def __init__(
+        self,
+        mode: str = "bar",
+        interval: float = 0.5,
+        top_n: int = 5,
+        stream: Optional[TextIO] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown progress mode: {mode}")
+        self._mode = mode
+        self._interval = interval
+        self._top_n = top_n
+        self._stream = stream or sys.stderr
+        self._active: Dict[int, FileProgress] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._finished_bytes = 0
+        self._finished_total = 0
+        self._files = 0
+        self._failed = 0
+        self._task: Optional[asyncio.Task] = None
+        self._bars: List[tqdm] = []
+
+    @property
+    def enabled(self) -> bool:
+        """進捗を表示するかどうか"""
+        return self._mode != "none"
+
+    def start_file(
+        self, name: str, total: int, initial: int = 0
+    ) -> FileProgress:
+        """ファイルのダウンロード開始を登録"""
+        progress = FileProgress(self, name, total, initial)
+        if not self.enabled:
+            return progress
+
+        self._active[id(progress)] = progress
+        self._events.append(
+            {"event": "start", "file": name, "total": total, "bytes": initial}
+        )
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return progress
+
+    async def close(self) -> None:
+        """表示を終了（未表示の進捗は出力する）"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.enabled:
+            self._flush()
+            self._reset()
+
+    async def __aenter__(self) -> "ProgressTracker":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    def _finish(self, progress: FileProgress, success: bool) -> None:
+        """終了したファイルを集計に移す"""
+        if self._active.pop(id(progress), None) is None:
+            return
+        self._finished_bytes += progress.done
+        self._finished_total += progress.total
+        self._files += 1
+        if not success:
+            self._failed += 1
+        self._events.append(
+            {
+                "event": "finish",
+                "file": progress.name,
+                "success": success,
+                "bytes": progress.done,
+                "elapsed": round(time.monotonic() - progress.started, 3),
+            }
+        )
+
+    async def _run(self) -> None:
+        """ダウンロード中のファイルがある間、一定間隔で表示を更新"""
+        while True:
+            await asyncio.sleep(self._interval)
+            self._flush()
+            if not self._active:
+                # 全て終了したら次のダウンロードまで表示を閉じる
+                self._reset()
+                return
+
+    def _flush(self) -> None:
+        """溜まった進捗をまとめて表示"""
+        if self._mode == "json":
+            self._write_events()
+        elif self._mode == "bar" and (self._active or self._files):
+            self._render_bars()
+
+    def _totals(self) -> Dict[str, int]:
+        """全体のダウンロード済みバイト数と合計サイズ"""
+        active = self._active.values()
+        return {
+            "bytes": self._finished_bytes + sum(p.done for p in active),
+            "total": self._finished_total + sum(p.total for p in active),
+            "active": len(self._active),
+            "finished": self._files,
+            "failed": self._failed,
+        }
+
+    def _top_files(self) -> List[FileProgress]:
+        """残りが大きい順にダウンロード中のファイルを取得"""
+        files = sorted(self._active.values(), key=lambda p: p.done - p.total)
+        return files[: self._top_n]
+
+    def _write_events(self) -> None:
+        """イベントをJSON Lines形式で出力"""
+        events, self._events = self._events, []
+        events.append(
+            {
+                "event": "progress",
+                "time": round(time.time(), 3),
+                **self._totals(),
+                "files": [
+                    {"file": p.name, "bytes": p.done, "total": p.total}
+                    for p in self._top_files()
+                ],
+            }
+        )
+        for event in events:
+            self._stream.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._stream.flush()
+
+    def _render_bars(self) -> None:
+        """全体のバーと上位のファイルを描画"""
+        self._events.clear()
+        if not self._bars:
+            self._bars.append(
+                tqdm(
+                    desc="Total",
+                    unit="B",
+                    unit_scale=True,
+                    file=self._stream,
+                    dynamic_ncols=True,
+                )
+            )
+            for position in range(1, self._top_n + 1):
+                self._bars.append(
+                    tqdm(
+                        bar_format="{desc}",
+                        position=position,
+                        file=self._stream,
+                        leave=False,
+                    )
+                )
+
+        totals = self._totals()
+        overall = self._bars[0]
+        overall.total = totals["total"]
+        overall.n = totals["bytes"]
+        overall.set_postfix_str(
+            f"{totals['finished']} done, {totals['active']} active",
+            refresh=False,
+        )
+        overall.refresh()
+
+        files = self._top_files()
+        for index, bar in enumerate(self._bars[1:]):
+            desc = ""
+            if index < len(files):
+                p = files[index]
+                percent = p.done * 100 // p.total if p.total else 0
+                desc = f"  {p.name} {percent:3d}%"
+            bar.set_description_str(desc)
+
+    def _reset(self) -> None:
+        """表示を閉じて集計を初期化"""
+        for bar in reversed(self._bars):
+            bar.close()
+        self._bars.clear()
+        self._events.clear()
+        self._finished_bytes = self._finished_total = 0
+        self._files = self._failed = 0
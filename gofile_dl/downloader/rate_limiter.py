@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """トークンバケット方式の帯域制限
+
+    ``rate`` は1秒あたりのバイト数で、None の場合は制限しない。
+    ``parent`` を指定すると親の制限も同時に適用されるため、
+    ジョブごとの制限を全体の制限の下に置ける。``rate`` は実行中に
+    変更でき、次に読み込むチャンクから反映される。
+
+    バケットは不足分を前借りして待機するため、多数のストリームが
+    同時に読み込んでも合計の速度は ``rate`` を超えない。
+
+    自身にも親にも ``rate`` がない場合は偽と評価されるため、
+    ``if limiter:`` で制限のないチャンクの待機を省ける。
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        parent: Optional["RateLimiter"] = None,
+    ):
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Rate must be positive: {rate}")
+        self._rate = rate
+        self._burst = burst
+        self.parent = parent
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self) -> Optional[float]:
+        """1秒あたりの最大バイト数"""
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: Optional[float]) -> None:
+        if rate is not None and rate <= 0:
+            raise ValueError(f"Rate must be positive: {rate}")
+        self._refill()
+        self._rate = rate
+        self._tokens = min(self._tokens, self.capacity)
+
+    @property
+    def enabled(self) -> bool:
+        """自身か親のいずれかに制限があるかどうか"""
+        limiter: Optional[RateLimiter] = self
+        while limiter is not None:
+            if limiter._rate is not None:
+                return True
+            limiter = limiter.parent
+        return False
+
+    def __bool__(self) -> bool:
+        return self.enabled
+
+    @property
+    def capacity(self) -> float:
+        """一度に通せる最大バイト数（既定は1秒分）"""
+        if self._rate is None:
+            return 0.0
+        return self._burst or self._rate
+
+    async def acquire(self, amount: int) -> None:
+        """amount バイト分の帯域が空くまで待機"""
+        delay = 0.0
+        limiter: Optional[RateLimiter] = self
+        while limiter is not None:
+            delay = max(delay, limiter._reserve(amount))
+            limiter = limiter.parent
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _reserve(self, amount: int) -> float:
+        """帯域を予約し、使えるようになるまでの秒数を返す"""
+        if self._rate is None:
+            return 0.0
+        self._refill()
+        self._tokens -= amount
+        return -self._tokens / self._rate if self._tokens < 0 else 0.0
+
+    def _refill(self) -> None:
+        """経過時間分のトークンを補充"""
+        now = time.monotonic()
+        if self._rate is not None:
+            self._tokens = min(
+                self.capacity,
+                self._tokens + (now - self._updated) * self._rate,
+            )
+        self._updated = now
@@ -0,0 +1,167 @@
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import aiohttp
+
+# 再試行で回復が見込めるHTTPステータス
+RETRYABLE_STATUSES = (408, 429)
+
+
+class DownloadError(ValueError):
+    """ダウンロードの失敗
+
+    ``status`` はHTTPステータス、``retry_after`` はRetry-Afterの秒数。
+    ``retryable`` を省略した場合はステータスから判定する。
+    """
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: Optional[bool] = None,
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        if retryable is None:
+            retryable = status is not None and (
+                status >= 500 or status in RETRYABLE_STATUSES
+            )
+        self.retryable = retryable
+
+
+def is_retryable(error: BaseException) -> bool:
+    """再試行すべき一時的な失敗かどうか"""
+    if isinstance(error, DownloadError):
+        return error.retryable
+    return isinstance(
+        error,
+        (
+            asyncio.TimeoutError,
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+        ),
+    )
+
+
+@dataclass
+class RetryPolicy:
+    """ファイルごとの再試行の設定"""
+
+    attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(
+        self, attempt: int, retry_after: Optional[float] = None
+    ) -> float:
+        """attempt 回目の失敗後に待つ秒数（フルジッター）"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)  # noqa: S311
+
+
+class _Circuit:
+    """ストアサーバーごとの回路の状態"""
+
+    __slots__ = ("failures", "opened_until", "trial")
+
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opened_until = 0.0
+        self.trial: Optional[asyncio.Future] = None
+
+
+class CircuitBreaker:
+    """失敗が続くストアサーバーへのリクエストを一時的に止める
+
+    連続で ``failure_threshold`` 回失敗すると回路を開き、
+    ``reset_timeout`` 秒の間そのサーバーへの転送を待たせる。
+    その後は1件だけ試行し、成功すれば再開、失敗すれば再び開く。
+    試行の結果は ``acquire`` が返した値を渡した記録だけで判定し、
+    開く前から実行中だった転送の失敗や中断では試行を終えない。
+    """
+
+    def __init__(
+        self, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._circuits: Dict[str, _Circuit] = {}
+
+    def is_open(self, host: str) -> bool:
+        """回路が開いているかどうか"""
+        circuit = self._circuits.get(host)
+        return circuit is not None and circuit.opened_until > 0
+
+    async def acquire(self, host: str) -> Optional[asyncio.Future]:
+        """host へのリクエストが許可されるまで待つ
+
+        試行として通した場合は、結果の記録に渡す値を返す。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            circuit = self._circuits.get(host)
+            if circuit is None or not circuit.opened_until:
+                return None
+            if circuit.trial is not None:
+                # 試行中の転送の結果を待つ
+                await asyncio.shield(circuit.trial)
+                continue
+            wait = circuit.opened_until - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            circuit.trial = loop.create_future()
+            return circuit.trial
+
+    def record_success(self, host: str) -> None:
+        """成功を記録して回路を閉じる"""
+        circuit = self._circuits.pop(host, None)
+        if circuit is not None:
+            self._finish_trial(circuit)
+
+    def record_failure(
+        self, host: str, trial: Optional[asyncio.Future] = None
+    ) -> bool:
+        """失敗を記録し、回路を開いた場合は True を返す
+
+        trial には失敗した転送の ``acquire`` の戻り値を渡す。
+        """
+        circuit = self._circuits.setdefault(host, _Circuit())
+        circuit.failures += 1
+        was_trial = trial is not None and trial is circuit.trial
+        if was_trial:
+            self._finish_trial(circuit)
+        # 開く前から実行中だった転送の失敗では開き直さない
+        if not was_trial and (
+            circuit.opened_until or circuit.failures < self._failure_threshold
+        ):
+            return False
+        loop = asyncio.get_running_loop()
+        circuit.opened_until = loop.time() + self._reset_timeout
+        return True
+
+    def release(
+        self, host: str, trial: Optional[asyncio.Future] = None
+    ) -> None:
+        """結果が出ないまま終わった転送が試行なら取り消す"""
+        circuit = self._circuits.get(host)
+        if (
+            circuit is not None
+            and trial is not None
+            and trial is circuit.trial
+        ):
+            self._finish_trial(circuit)
+
+    @staticmethod
+    def _finish_trial(circuit: _Circuit) -> None:
+        """試行の結果を待っている転送を再開させる"""
+        if circuit.trial is not None:
+            if not circuit.trial.done():
+                circuit.trial.set_result(None)
+            circuit.trial = None
@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from ..metrics import MetricsRegistry
+
+T = TypeVar("T")
+
+POLICIES = ("fifo", "smallest_first", "largest_first")
+
+
+class _Ticket:
+    """スケジューラーの待ち行列に入る転送の予約"""
+
+    __slots__ = ("key", "host", "weight", "granted")
+
+    def __init__(
+        self,
+        key: Tuple[float, ...],
+        host: str,
+        weight: int,
+        granted: asyncio.Future,
+    ):
+        self.key = key
+        self.host = host
+        self.weight = weight
+        self.granted = granted
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return self.key < other.key
+
+
+class DownloadScheduler:
+    """全ジョブで共有するダウンロードのスケジューラー
+
+    同時接続数を全体とストアサーバーごとに制限し、待機中の転送を
+    優先度とポリシーの順に開始する。
+
+    - ``fifo``: 登録順
+    - ``smallest_first``: 小さいファイルから（すぐ終わる転送を優先）
+    - ``largest_first``: 大きいファイルから（全体の完了時間を短縮）
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 10,
+        max_per_host: Optional[int] = None,
+        policy: str = "smallest_first",
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self._max_connections = max_connections
+        # 指定がなければ全体の上限に従う
+        self._max_per_host = max_per_host
+        self._policy = policy
+        self._metrics = metrics
+        self._counter = itertools.count()
+        self._queues: Dict[str, List[_Ticket]] = {}
+        self._active = 0
+        self._active_per_host: Dict[str, int] = {}
+
+    @property
+    def max_connections(self) -> int:
+        """全体の同時接続数の上限"""
+        return self._max_connections
+
+    @max_connections.setter
+    def max_connections(self, value: int) -> None:
+        """上限を変更（増やした場合は待機中の転送をすぐに開始）"""
+        self._max_connections = max(1, value)
+        self._dispatch()
+
+    @property
+    def active(self) -> int:
+        """使用中の接続数"""
+        return self._active
+
+    @property
+    def pending(self) -> int:
+        """開始待ちの転送数"""
+        return sum(
+            1
+            for queue in self._queues.values()
+            for ticket in queue
+            if not ticket.granted.done()
+        )
+
+    async def run(
+        self,
+        func: Callable[[], Awaitable[T]],
+        size: Optional[int] = None,
+        host: str = "",
+        priority: int = 0,
+        weight: int = 1,
+    ) -> T:
+        """接続枠が割り当てられてから func を実行
+
+        Args:
+            func: 実行する転送
+            size: ファイルサイズ（ポリシーの並び替えに使用）
+            host: 接続先のストアサーバー
+            priority: 大きいほど先に開始される
+            weight: 転送が使う接続数
+        """
+        ticket = _Ticket(
+            self._make_key(size, priority),
+            host,
+            max(1, weight),
+            asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._queues.setdefault(host, []), ticket)
+        queued_at = time.monotonic()
+        self._dispatch()
+
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            # 枠を得た直後にキャンセルされた場合は返却する
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                self._release(ticket)
+            else:
+                ticket.granted.cancel()
+            raise
+
+        if self._metrics:
+            self._metrics.queue_wait_seconds.observe(
+                time.monotonic() - queued_at, host=host
+            )
+        try:
+            return await func()
+        finally:
+            self._release(ticket)
+
+    def _make_key(
+        self, size: Optional[int], priority: int
+    ) -> Tuple[float, ...]:
+        """待ち行列の並び順のキー"""
+        if self._policy == "smallest_first":
+            order = float("inf") if size is None else float(size)
+        elif self._policy == "largest_first":
+            order = float("inf") if size is None else -float(size)
+        else:
+            order = 0.0
+        return (-priority, order, next(self._counter))
+
+    def _fits(self, ticket: _Ticket) -> bool:
+        """ストアサーバーごとの上限内で開始できるかどうか"""
+        host_active = self._active_per_host.get(ticket.host, 0)
+        max_per_host = self._max_per_host or self._max_connections
+        # 上限より大きい転送も、何も動いていなければ開始する
+        return host_active == 0 or (
+            host_active + ticket.weight <= max_per_host
+        )
+
+    def _dispatch(self) -> None:
+        """開始できる転送に接続枠を割り当てる"""
+        while True:
+            best: Optional[_Ticket] = None
+            for host, queue in list(self._queues.items()):
+                # キャンセル済みの予約を取り除く
+                while queue and queue[0].granted.done():
+                    heapq.heappop(queue)
+                if not queue:
+                    del self._queues[host]
+                elif self._fits(queue[0]) and (
+                    best is None or queue[0] < best
+                ):
+                    best = queue[0]
+            if best is None:
+                return
+            if self._active and (
+                self._active + best.weight > self._max_connections
+            ):
+                return
+
+            heapq.heappop(self._queues[best.host])
+            if not self._queues[best.host]:
+                del self._queues[best.host]
+            self._active += best.weight
+            self._active_per_host[best.host] = (
+                self._active_per_host.get(best.host, 0) + best.weight
+            )
+            best.granted.set_result(None)
+
+    def _release(self, ticket: _Ticket) -> None:
+        """接続枠を返却して次の転送を開始"""
+        self._active -= ticket.weight
+        self._active_per_host[ticket.host] -= ticket.weight
+        if not self._active_per_host[ticket.host]:
+            del self._active_per_host[ticket.host]
+        self._dispatch()
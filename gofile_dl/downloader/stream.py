@@ -0,0 +1,70 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+from .writer import FileSink
+
+
+class StreamWriterSink(FileSink):
+    """asyncio.StreamWriter に書き込むシンク
+
+    書き込むたびに ``drain`` を待つため、相手が読み込むまで
+    ダウンロードも止まる。
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, close: bool = True):
+        self._writer = writer
+        self._close = close
+
+    async def write(self, data: bytes) -> None:
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def flush(self) -> None:
+        await self._writer.drain()
+
+    async def close(self) -> None:
+        await self._writer.drain()
+        if self._close:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+class BinaryIOSink(FileSink):
+    """標準出力やパイプなどのバイナリファイルオブジェクトに書き込むシンク
+
+    ブロッキングする書き込みを専用のスレッドで順に行い、書き込みが
+    終わるまで次のデータを受け取らない。
+    """
+
+    def __init__(self, file: BinaryIO, close: bool = False):
+        self._file = file
+        self._close = close
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="gofile-stream"
+        )
+
+    async def write(self, data: bytes) -> None:
+        await self._run(self._file.write, data)
+
+    async def flush(self) -> None:
+        await self._run(self._file.flush)
+
+    async def close(self) -> None:
+        try:
+            await self.flush()
+            if self._close:
+                await self._run(self._file.close)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args) -> None:
+        """専用のスレッドで実行して完了を待つ"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, func, *args)
+
+
+def stdout_sink() -> BinaryIOSink:
+    """標準出力に書き込むシンク（標準出力は閉じない）"""
+    return BinaryIOSink(sys.stdout.buffer)
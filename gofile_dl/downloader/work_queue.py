@@ -0,0 +1,357 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Tuple, TypeVar, Union
+
+from .models import FileEntry
+
+# ファイルの状態
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+T = TypeVar("T")
+
+
+def default_worker_id() -> str:
+    """ホスト名とプロセスIDからワーカーIDを生成"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue:
+    """複数のプロセス・ホストでファイルを分担するSQLiteのワークキュー
+
+    公開されたファイルをワーカーが期限付きで借り受け（リース）、
+    完了または失敗を報告する。期限までに更新されなかったリースは
+    ワーカーが落ちたものとみなし、他のワーカーが再び取得する。
+    リースが ``max_attempts`` 回切れたファイルは、ワーカーを落とす
+    ファイルとみなして失敗にする。共有ボリューム上でも動くよう、
+    WALではなく通常のジャーナルを使う。
+
+    ロックを待つ間もイベントループを止めないよう、操作は
+    スレッドプールで接続を開いて行う。
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        timeout: float = 30.0,
+    ):
+        self._path = str(path)
+        self._timeout = timeout
+        self.lease_seconds = lease_seconds
+        self._max_attempts = max_attempts
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS work (
+                    content_id TEXT NOT NULL,
+                    remote_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    link TEXT NOT NULL,
+                    size INTEGER,
+                    md5 TEXT,
+                    create_time INTEGER,
+                    status TEXT NOT NULL,
+                    worker TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    PRIMARY KEY (content_id, remote_id)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS work_status ON work (status)"
+            )
+
+    def __enter__(self) -> "WorkQueue":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def publish(
+        self, content_id: str, entries: Iterable[FileEntry]
+    ) -> int:
+        """ファイルを登録し、新たに追加した件数を返す
+
+        登録済みのファイルは状態を変えないため、同じコンテンツを
+        何度公開しても完了済みのファイルはやり直さない。
+        """
+        rows = [
+            (
+                content_id,
+                self.entry_key(entry),
+                entry.name,
+                entry.link,
+                entry.size,
+                entry.md5,
+                entry.create_time,
+                PENDING,
+            )
+            for entry in entries
+        ]
+        return await self._run(self._publish, rows)
+
+    def _publish(self, rows: List[Tuple[Any, ...]]) -> int:
+        """行を登録し、追加した件数を返す"""
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO work (
+                    content_id, remote_id, name, link, size, md5,
+                    create_time, status
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            return conn.total_changes - before
+
+    async def claim(
+        self, worker: str, limit: int = 1
+    ) -> List[Tuple[str, FileEntry]]:
+        """未処理か期限切れのファイルを最大 limit 件借り受ける
+
+        戻り値は (コンテンツID, ファイル情報) のリスト。大きい
+        ファイルから順に渡し、全体の完了時間を短くする。
+        """
+        if limit <= 0:
+            return []
+        return await self._run(self._claim, worker, limit)
+
+    def _claim(self, worker: str, limit: int) -> List[Tuple[str, FileEntry]]:
+        """期限切れのリースを片付けてから借り受ける"""
+        now = time.time()
+        with self._transaction() as conn:
+            # 試行回数を使い切ったまま期限が切れたファイルは再び渡さない
+            conn.execute(
+                """
+                UPDATE work
+                SET status = ?, worker = NULL, lease_until = NULL,
+                    error = 'Lease expired ' || attempts || ' times'
+                WHERE status = ? AND lease_until < ? AND attempts >= ?
+                """,
+                (FAILED, LEASED, now, self._max_attempts),
+            )
+            rows = conn.execute(
+                """
+                SELECT * FROM work
+                WHERE status = ? OR (status = ? AND lease_until < ?)
+                ORDER BY size DESC
+                LIMIT ?
+                """,
+                (PENDING, LEASED, now, limit),
+            ).fetchall()
+            conn.executemany(
+                """
+                UPDATE work
+                SET status = ?, worker = ?, lease_until = ?,
+                    attempts = attempts + 1
+                WHERE content_id = ? AND remote_id = ?
+                """,
+                [
+                    (
+                        LEASED,
+                        worker,
+                        now + self.lease_seconds,
+                        row["content_id"],
+                        row["remote_id"],
+                    )
+                    for row in rows
+                ],
+            )
+        return [(row["content_id"], self._to_entry(row)) for row in rows]
+
+    async def renew(
+        self, worker: str, keys: Iterable[Tuple[str, str]]
+    ) -> None:
+        """処理中のファイルのリースを延長"""
+        await self._run(self._renew, worker, list(keys))
+
+    def _renew(self, worker: str, keys: List[Tuple[str, str]]) -> None:
+        until = time.time() + self.lease_seconds
+        with self._transaction() as conn:
+            conn.executemany(
+                """
+                UPDATE work SET lease_until = ?
+                WHERE content_id = ? AND remote_id = ?
+                    AND status = ? AND worker = ?
+                """,
+                [
+                    (until, content_id, remote_id, LEASED, worker)
+                    for content_id, remote_id in keys
+                ],
+            )
+
+    async def complete(
+        self, worker: str, content_id: str, entry: FileEntry
+    ) -> bool:
+        """ファイルの完了を報告し、反映されたら True を返す
+
+        リースが切れて他のワーカーに渡ったファイルの報告は無視する。
+        """
+        return await self._run(
+            self._complete, worker, content_id, self.entry_key(entry)
+        )
+
+    def _complete(self, worker: str, content_id: str, remote_id: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE work SET status = ?, lease_until = NULL, error = NULL
+                WHERE content_id = ? AND remote_id = ?
+                    AND status = ? AND worker = ?
+                """,
+                (DONE, content_id, remote_id, LEASED, worker),
+            )
+            return cursor.rowcount > 0
+
+    async def fail(
+        self, worker: str, content_id: str, entry: FileEntry, error: str
+    ) -> bool:
+        """ファイルの失敗を報告し、再試行されない場合は True を返す
+
+        試行回数が ``max_attempts`` に達するまでは未処理に戻し、
+        他のワーカーにも試させる。リースが切れて他のワーカーに
+        渡ったファイルの報告は無視し、そのワーカーに任せる（False）。
+        """
+        return await self._run(
+            self._fail, worker, content_id, self.entry_key(entry), error
+        )
+
+    def _fail(
+        self, worker: str, content_id: str, remote_id: str, error: str
+    ) -> bool:
+        with self._transaction() as conn:
+            row = conn.execute(
+                """
+                SELECT attempts FROM work
+                WHERE content_id = ? AND remote_id = ?
+                    AND status = ? AND worker = ?
+                """,
+                (content_id, remote_id, LEASED, worker),
+            ).fetchone()
+            if row is None:
+                return False
+            final = row["attempts"] >= self._max_attempts
+            conn.execute(
+                """
+                UPDATE work SET status = ?, lease_until = NULL, error = ?
+                WHERE content_id = ? AND remote_id = ?
+                """,
+                (FAILED if final else PENDING, error, content_id, remote_id),
+            )
+        return final
+
+    async def release(
+        self, worker: str, keys: Iterable[Tuple[str, str]]
+    ) -> None:
+        """中断したファイルのリースを返却し、すぐに他のワーカーへ渡す"""
+        await self._run(self._release, worker, list(keys))
+
+    def _release(self, worker: str, keys: List[Tuple[str, str]]) -> None:
+        with self._transaction() as conn:
+            conn.executemany(
+                """
+                UPDATE work SET status = ?, lease_until = NULL
+                WHERE content_id = ? AND remote_id = ?
+                    AND status = ? AND worker = ?
+                """,
+                [
+                    (PENDING, content_id, remote_id, LEASED, worker)
+                    for content_id, remote_id in keys
+                ],
+            )
+
+    async def counts(self) -> Dict[str, int]:
+        """状態ごとのファイル数"""
+        return await self._run(self._counts)
+
+    def _counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM work GROUP BY status"
+            ).fetchall()
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    async def remaining(self) -> int:
+        """未処理または処理中のファイル数"""
+        counts = await self.counts()
+        return counts[PENDING] + counts[LEASED]
+
+    def close(self) -> None:
+        """何もしない（接続は操作ごとに開いて閉じる）"""
+
+    @staticmethod
+    def entry_key(entry: FileEntry) -> str:
+        """ファイルを識別するキー（リモートIDがなければパス）"""
+        return entry.id or entry.name
+
+    def _connect(self) -> sqlite3.Connection:
+        """操作ごとに接続する（スレッドをまたいで共有しない）"""
+        conn = sqlite3.connect(
+            self._path, timeout=self._timeout, isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _transaction(self) -> "_Transaction":
+        """書き込みロックを先に取るトランザクション"""
+        return _Transaction(self._connect())
+
+    @staticmethod
+    async def _run(func: Callable[..., T], *args: Any) -> T:
+        """スレッドプールで実行して結果を返す"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    @staticmethod
+    def _to_entry(row: sqlite3.Row) -> FileEntry:
+        """行をファイル情報に変換"""
+        return FileEntry(
+            name=row["name"],
+            link=row["link"],
+            size=row["size"],
+            md5=row["md5"],
+            id=row["remote_id"],
+            create_time=row["create_time"],
+        )
+
+
+class _Transaction:
+    """``BEGIN IMMEDIATE`` で始まり、例外がなければコミットする
+
+    終了時に接続を閉じる。
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self._conn.close()
+            raise
+        return self._conn
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        try:
+            if exc_type is None:
+                self._conn.execute("COMMIT")
+            else:
+                self._conn.execute("ROLLBACK")
+        finally:
+            self._conn.close()
@@ -0,0 +1,270 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+import aiofiles
+
+WRITERS = ("auto", "threaded", "aiofiles")
+
+
+class FileSink:
+    """ファイルの指定位置から順に書き込むハンドル"""
+
+    async def write(self, data: bytes) -> None:
+        """データを書き込む"""
+        raise NotImplementedError
+
+    async def flush(self) -> None:
+        """書き込んだデータをOSに渡す"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """残りのデータを書き込んでファイルを閉じる"""
+        raise NotImplementedError
+
+    async def __aenter__(self) -> "FileSink":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+
+class WriterBackend:
+    """ダウンロードしたデータをディスクに書き込むバックエンド"""
+
+    def open(
+        self,
+        path: Path,
+        offset: int = 0,
+        size: Optional[int] = None,
+        truncate: bool = False,
+    ) -> FileSink:
+        """offset の位置から書き込むハンドルを生成
+
+        Args:
+            path: 書き込むファイル
+            offset: 書き込みを始める位置
+            size: 分かっている場合はファイル全体のサイズ
+            truncate: 既存の内容を破棄して新規に書き込むかどうか
+        """
+        raise NotImplementedError
+
+    async def preallocate(self, path: Path, size: int) -> None:
+        """ファイルを size バイトまで確保（既存の内容は残す）"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """バックエンドのリソースを解放"""
+
+
+class _AiofilesSink(FileSink):
+    """aiofilesで書き込むハンドル"""
+
+    def __init__(self, path: Path, offset: int, truncate: bool):
+        self._path = path
+        self._offset = offset
+        self._truncate = truncate
+        self._file: Any = None
+
+    async def __aenter__(self) -> "_AiofilesSink":
+        mode = "wb" if self._truncate else "r+b"
+        self._file = await aiofiles.open(self._path, mode)
+        if self._offset:
+            await self._file.seek(self._offset)
+        return self
+
+    async def write(self, data: bytes) -> None:
+        await self._file.write(data)
+
+    async def flush(self) -> None:
+        await self._file.flush()
+
+    async def close(self) -> None:
+        if self._file is not None:
+            await self._file.close()
+            self._file = None
+
+
+class AiofilesWriter(WriterBackend):
+    """チャンクごとにaiofilesで書き込むバックエンド"""
+
+    def open(
+        self,
+        path: Path,
+        offset: int = 0,
+        size: Optional[int] = None,
+        truncate: bool = False,
+    ) -> FileSink:
+        return _AiofilesSink(path, offset, truncate)
+
+    async def preallocate(self, path: Path, size: int) -> None:
+        async with aiofiles.open(path, "ab") as f:
+            await f.truncate(size)
+
+
+class _ThreadedSink(FileSink):
+    """チャンクをまとめて書き込みスレッドで書き込むハンドル
+
+    書き込みは1件だけ先行させ、その間に次のバッファを溜めることで
+    ネットワークの受信とディスクへの書き込みを重ねる。
+    """
+
+    def __init__(
+        self,
+        writer: "ThreadedWriter",
+        path: Path,
+        offset: int,
+        size: Optional[int],
+        truncate: bool,
+    ):
+        self._writer = writer
+        self._path = path
+        self._size = size
+        self._truncate = truncate
+        self._fd: Optional[int] = None
+        self._buffer = bytearray()
+        # バッファの先頭が書き込まれる位置
+        self._position = offset
+        self._pending: Optional[asyncio.Future] = None
+
+    async def __aenter__(self) -> "_ThreadedSink":
+        self._fd = await self._writer.run(
+            self._writer.open_fd, self._path, self._truncate, self._size
+        )
+        return self
+
+    async def write(self, data: bytes) -> None:
+        self._buffer += data
+        block = self._writer.block_size
+        # ブロック境界に揃えて書き込む
+        boundary = block - self._position % block
+        while len(self._buffer) >= boundary:
+            await self._submit(boundary)
+            boundary = block
+
+    async def flush(self) -> None:
+        if self._buffer:
+            await self._submit(len(self._buffer))
+        await self._wait()
+
+    async def close(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            await self.flush()
+        finally:
+            fd, self._fd = self._fd, None
+            await self._writer.run(os.close, fd)
+
+    async def _submit(self, length: int) -> None:
+        """バッファの先頭 length バイトの書き込みを開始"""
+        await self._wait()
+        data = self._buffer[:length]
+        del self._buffer[:length]
+        self._pending = asyncio.ensure_future(
+            self._writer.run(
+                self._writer.write_at, self._fd, data, self._position
+            )
+        )
+        self._position += length
+
+    async def _wait(self) -> None:
+        """先行している書き込みの完了を待つ
+
+        待っている間にキャンセルされても書き込みは中断しない。
+        書き込み済みとして記録した範囲が欠けないようにするため。
+        """
+        if self._pending is not None:
+            await asyncio.shield(self._pending)
+            self._pending = None
+
+
+class ThreadedWriter(WriterBackend):
+    """専用のスレッドで位置指定の書き込みを行うバックエンド
+
+    小さなチャンクを ``block_size`` 単位にまとめ、``os.pwrite`` で
+    書き込む。サイズが分かっているファイルは ``posix_fallocate`` で
+    事前に確保し、断片化を防ぐ。
+    """
+
+    def __init__(self, block_size: int = 4 * 1024 * 1024, threads: int = 1):
+        self.block_size = block_size
+        self._threads = threads
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def open(
+        self,
+        path: Path,
+        offset: int = 0,
+        size: Optional[int] = None,
+        truncate: bool = False,
+    ) -> FileSink:
+        return _ThreadedSink(self, path, offset, size, truncate)
+
+    async def preallocate(self, path: Path, size: int) -> None:
+        fd = await self.run(self.open_fd, path, False, size)
+        await self.run(os.close, fd)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def run(self, func: Any, *args: Any) -> Any:
+        """書き込みスレッドで func を実行"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                self._threads, thread_name_prefix="gofile-writer"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    @staticmethod
+    def open_fd(path: Path, truncate: bool, size: Optional[int]) -> int:
+        """ファイルを開き、サイズが分かっていれば領域を確保"""
+        flags = os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if truncate else 0)
+        fd = os.open(path, flags, 0o666)
+        try:
+            if size and os.fstat(fd).st_size < size:
+                ThreadedWriter._allocate(fd, size)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    @staticmethod
+    def _allocate(fd: int, size: int) -> None:
+        """ファイルの領域を確保（非対応のファイルシステムでは拡張のみ）"""
+        if hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass
+        os.ftruncate(fd, size)
+
+    @staticmethod
+    def write_at(fd: int, data: bytearray, position: int) -> None:
+        """data を position の位置に全て書き込む"""
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, position)
+            view = view[written:]
+            position += written
+
+
+def create_writer(name: str = "auto") -> WriterBackend:
+    """名前から書き込みのバックエンドを生成
+
+    ``auto`` は ``os.pwrite`` が使える環境では ``threaded``、
+    それ以外では ``aiofiles`` を選ぶ。
+    """
+    if name not in WRITERS:
+        raise ValueError(f"Unknown writer: {name}")
+    if name == "threaded" and not hasattr(os, "pwrite"):
+        raise ValueError("The threaded writer requires os.pwrite")
+    if name == "threaded" or (name == "auto" and hasattr(os, "pwrite")):
+        return ThreadedWriter()
+    return AiofilesWriter()
@@ -0,0 +1,333 @@
+import bisect
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import aiohttp
+
+from .logger import Logger
+
+Labels = Tuple[Tuple[str, str], ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 60)
+# 64KiB/s から 1GiB/s まで4倍刻み
+THROUGHPUT_BUCKETS = tuple(float(4**n * 64 * 1024) for n in range(8))
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    """キーワード引数のラベルをハッシュ可能なキーに変換"""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    """ラベルの値をPrometheusのテキスト形式用にエスケープ"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple] = None) -> str:
+    """ラベルをPrometheusのテキスト形式で整形"""
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{key}="{_escape(value)}"' for key, value in pairs)
+    return "{" + body + "}"
+
+
+def _format_value(value: float) -> str:
+    """サンプルの値を精度を落とさずに整形"""
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    """ラベルの組ごとに単調増加する値"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        """初期化: メトリクス名と説明"""
+        self.name = name
+        self.help = help_text
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, value: float = 1.0, **labels: Any) -> None:
+        """カウンターに value を加える"""
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0.0) + value
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """(名前, ラベル, 値) のサンプルを返す"""
+        for labels, value in self.values.items():
+            yield self.name, _format_labels(labels), value
+
+    def as_dict(self) -> List[Dict[str, Any]]:
+        """値をJSONに変換できる辞書で返す"""
+        return [
+            {"labels": dict(labels), "value": value}
+            for labels, value in self.values.items()
+        ]
+
+
+class Histogram:
+    """ラベルの組ごとに上限値のバケットへ振り分けた観測値"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple = ()):
+        """初期化: メトリクス名、説明、バケットの上限値"""
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets or LATENCY_BUCKETS))
+        # ラベル -> [各バケットの件数..., 合計, 件数]
+        # （最大の上限を超えた値は件数だけに数え、+Inf は件数から求める）
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """観測値を1件記録"""
+        key = _labels(labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [0.0] * (len(self.buckets) + 2)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[index] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """累積のバケット、合計、件数のサンプルを返す"""
+        for labels, state in self.values.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(labels, ("le", repr(bound))),
+                    cumulative,
+                )
+            yield (
+                f"{self.name}_bucket",
+                _format_labels(labels, ("le", "+Inf")),
+                state[-1],
+            )
+            yield f"{self.name}_sum", _format_labels(labels), state[-2]
+            yield f"{self.name}_count", _format_labels(labels), state[-1]
+
+    def as_dict(self) -> List[Dict[str, Any]]:
+        """ラベルの組ごとの件数、合計、平均を返す"""
+        return [
+            {
+                "labels": dict(labels),
+                "count": state[-1],
+                "sum": state[-2],
+                "mean": state[-2] / state[-1] if state[-1] else 0.0,
+            }
+            for labels, state in self.values.items()
+        ]
+
+
+class _Call:
+    """計測中のAPI呼び出しの結果"""
+
+    __slots__ = ("status",)
+
+    def __init__(self) -> None:
+        self.status: Any = None
+
+
+class MetricsRegistry:
+    """リクエストと転送のメトリクスをプロセス内で集計する
+
+    API呼び出し、ファイルごとの転送、スケジューラーの待ち時間、
+    再試行は、レジストリを受け取ったコンポーネントが記録する。
+    ``trace_config`` を使うとホストごとのDNS、接続、最初のバイトまでの
+    時間も記録する。Prometheusのテキスト形式かJSONで出力でき、
+    logger を指定すると完了したファイルをdebugレベルで記録する。
+    """
+
+    def __init__(self, logger: Optional[Logger] = None, max_files: int = 1000):
+        """初期化: 標準のメトリクスを登録"""
+        self._logger = logger
+        self._metrics: Dict[str, Any] = {}
+        self.files: Deque[Dict[str, Any]] = deque(maxlen=max_files)
+
+        self.api_requests = self.counter(
+            "gofile_api_requests_total", "API requests by endpoint and status"
+        )
+        self.api_seconds = self.histogram(
+            "gofile_api_request_seconds", "API request latency"
+        )
+        self.dns_seconds = self.histogram(
+            "gofile_dns_seconds", "DNS resolution time per host"
+        )
+        self.connect_seconds = self.histogram(
+            "gofile_connect_seconds", "Connection setup time per host"
+        )
+        self.ttfb_seconds = self.histogram(
+            "gofile_ttfb_seconds", "Time until response headers per host"
+        )
+        self.download_bytes = self.counter(
+            "gofile_download_bytes_total", "Bytes received per store server"
+        )
+        self.downloads = self.counter(
+            "gofile_downloads_total", "Finished file downloads by outcome"
+        )
+        self.download_seconds = self.histogram(
+            "gofile_download_seconds", "Time to download a file"
+        )
+        self.download_throughput = self.histogram(
+            "gofile_download_throughput_bytes_per_second",
+            "Per-file throughput per store server",
+            THROUGHPUT_BUCKETS,
+        )
+        self.retries = self.counter(
+            "gofile_retries_total", "Retried or resumed operations"
+        )
+        self.circuit_opens = self.counter(
+            "gofile_circuit_open_total", "Times a store server circuit opened"
+        )
+        self.queue_wait_seconds = self.histogram(
+            "gofile_queue_wait_seconds", "Time transfers waited to start"
+        )
+        self.dedup_hits = self.counter(
+            "gofile_dedup_hits_total", "Files linked from the dedup store"
+        )
+        self.dedup_bytes = self.counter(
+            "gofile_dedup_bytes_total", "Bytes not downloaded thanks to dedup"
+        )
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        """カウンターを取得（なければ登録）"""
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help_text)
+        return self._metrics[name]
+
+    def histogram(
+        self, name: str, help_text: str, buckets: Tuple = ()
+    ) -> Histogram:
+        """ヒストグラムを取得（なければ登録）"""
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help_text, buckets)
+        return self._metrics[name]
+
+    @contextmanager
+    def track_api(self, endpoint: str) -> Iterator[_Call]:
+        """API呼び出しの時間を計測（返す値の ``status`` に結果を設定）"""
+        call = _Call()
+        started = time.monotonic()
+        try:
+            yield call
+        except Exception:
+            call.status = call.status or "error"
+            raise
+        finally:
+            self.api_seconds.observe(
+                time.monotonic() - started, endpoint=endpoint
+            )
+            self.api_requests.inc(endpoint=endpoint, status=call.status)
+
+    def record_file(
+        self,
+        name: str,
+        host: str,
+        size: Optional[int],
+        seconds: float,
+        success: bool,
+    ) -> None:
+        """完了したファイルのダウンロードを記録"""
+        outcome = "success" if success else "failure"
+        self.downloads.inc(host=host, outcome=outcome)
+        self.download_seconds.observe(seconds, host=host)
+        throughput = size / seconds if size and seconds > 0 else None
+        if success and throughput:
+            self.download_throughput.observe(throughput, host=host)
+        self.files.append(
+            {
+                "name": name,
+                "host": host,
+                "bytes": size,
+                "seconds": round(seconds, 3),
+                "throughput": round(throughput, 1) if throughput else None,
+                "success": success,
+            }
+        )
+        if self._logger:
+            rate = f"{throughput / 1024**2:.2f} MiB/s" if throughput else "-"
+            self._logger.debug(
+                f"{outcome}: {name} from {host} ({size} bytes, "
+                f"{seconds:.2f}s, {rate})"
+            )
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """DNS、接続、最初のバイトまでの時間を記録するトレース設定を生成"""
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_request_end.append(self._on_request_end)
+        trace_config.on_dns_resolvehost_start.append(self._on_dns_start)
+        trace_config.on_dns_resolvehost_end.append(self._on_dns_end)
+        trace_config.on_connection_create_start.append(self._on_connect_start)
+        trace_config.on_connection_create_end.append(self._on_connect_end)
+        return trace_config
+
+    def to_prometheus(self) -> str:
+        """全てのメトリクスをPrometheusのテキスト形式で出力"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> Dict[str, Any]:
+        """全てのメトリクスと最近のファイルをJSONに変換できる辞書で出力"""
+        return {
+            "metrics": {
+                name: {"type": metric.kind, "values": metric.as_dict()}
+                for name, metric in self._metrics.items()
+            },
+            "files": list(self.files),
+        }
+
+    async def _on_request_start(self, session, context, params) -> None:
+        """リクエストの開始時刻を記録"""
+        context.started = time.monotonic()
+        context.host = params.url.host
+
+    async def _on_request_end(self, session, context, params) -> None:
+        """レスポンスヘッダーが届くまでの時間を記録"""
+        self.ttfb_seconds.observe(
+            time.monotonic() - context.started, host=context.host
+        )
+
+    async def _on_dns_start(self, session, context, params) -> None:
+        """名前解決の開始時刻を記録"""
+        context.dns_started = time.monotonic()
+
+    async def _on_dns_end(self, session, context, params) -> None:
+        """名前解決にかかった時間を記録"""
+        self.dns_seconds.observe(
+            time.monotonic() - context.dns_started, host=params.host
+        )
+
+    async def _on_connect_start(self, session, context, params) -> None:
+        """接続の開始時刻を記録"""
+        context.connect_started = time.monotonic()
+
+    async def _on_connect_end(self, session, context, params) -> None:
+        """接続にかかった時間を記録"""
+        self.connect_seconds.observe(
+            time.monotonic() - context.connect_started, host=context.host
+        )
+
+
+@contextmanager
+def track_api(
+    metrics: Optional[MetricsRegistry], endpoint: str
+) -> Iterator[_Call]:
+    """レジストリがあればAPI呼び出しの時間を計測"""
+    if metrics is None:
+        yield _Call()
+        return
+    with metrics.track_api(endpoint) as call:
+        yield call
@@ -0,0 +1,8 @@
+from gofile_dl.service.job_store import JobStore
+from gofile_dl.service.server import DownloadService, create_app
+
+__all__ = [
+    "DownloadService",
+    "JobStore",
+    "create_app",
+]
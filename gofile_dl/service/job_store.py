@@ -0,0 +1,186 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+# ジョブの状態
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+STATUSES = (QUEUED, RUNNING, PAUSED, DONE, FAILED, CANCELLED)
+FINISHED = (DONE, FAILED, CANCELLED)
+
+MODES = ("download", "sync", "archive")
+
+
+class JobStore:
+    """ダウンロードジョブを永続化するSQLiteのキュー
+
+    再起動しても待機中・実行中のジョブを失わないよう、状態が変わる
+    たびにコミットする。パスワードも保存するため、ファイルは所有者
+    のみ読み書きできるようにする。
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path))
+        self._conn.row_factory = sqlite3.Row
+        os.chmod(path, 0o600)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                password TEXT,
+                output TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                archive_format TEXT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def __enter__(self) -> "JobStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def add(
+        self,
+        url: str,
+        output: str,
+        password: Optional[str] = None,
+        mode: str = "download",
+        archive_format: Optional[str] = None,
+        priority: int = 0,
+    ) -> Dict[str, Any]:
+        """ジョブを待機中として登録"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown job mode: {mode}")
+        if mode == "archive" and not archive_format:
+            raise ValueError("archive_format is required for archive jobs")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self._conn.execute(
+            """
+            INSERT INTO jobs (
+                id, url, password, output, mode, archive_format, priority,
+                status, created, updated
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                job_id,
+                url,
+                password,
+                output,
+                mode,
+                archive_format,
+                priority,
+                QUEUED,
+                now,
+                now,
+            ),
+        )
+        self._conn.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """ジョブを取得（存在しなければ None）"""
+        row = self._conn.execute(
+            "SELECT * FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def password(self, job_id: str) -> Optional[str]:
+        """ジョブのパスワードを取得"""
+        row = self._conn.execute(
+            "SELECT password FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return row["password"] if row else None
+
+    def list(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """ジョブを登録順に取得"""
+        if status:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created",
+                (status,),
+            )
+        else:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created")
+        return [self._to_dict(row) for row in rows]
+
+    def next_queued(
+        self, exclude: Sequence[str] = ()
+    ) -> Optional[Dict[str, Any]]:
+        """次に実行する待機中のジョブ（優先度順、同じなら登録順）"""
+        for row in self._conn.execute(
+            """
+            SELECT * FROM jobs WHERE status = ?
+            ORDER BY priority DESC, created
+            """,
+            (QUEUED,),
+        ):
+            if row["id"] not in exclude:
+                return self._to_dict(row)
+        return None
+
+    def set_status(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """ジョブの状態と結果を更新"""
+        if status not in STATUSES:
+            raise ValueError(f"Unknown job status: {status}")
+        self._conn.execute(
+            """
+            UPDATE jobs SET status = ?, result = ?, error = ?, updated = ?
+            WHERE id = ?
+            """,
+            (
+                status,
+                json.dumps(result, ensure_ascii=False) if result else None,
+                error,
+                time.time(),
+                job_id,
+            ),
+        )
+        self._conn.commit()
+
+    def requeue_running(self) -> int:
+        """前回の終了時に実行中だったジョブを待機中に戻し、件数を返す"""
+        cursor = self._conn.execute(
+            "UPDATE jobs SET status = ?, updated = ? WHERE status = ?",
+            (QUEUED, time.time(), RUNNING),
+        )
+        self._conn.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """接続を閉じる"""
+        self._conn.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        """行を辞書に変換（パスワードは含めない）"""
+        job = dict(row)
+        job["has_password"] = job.pop("password") is not None
+        if job["result"]:
+            job["result"] = json.loads(job["result"])
+        return job
@@ -0,0 +1,376 @@
+import asyncio
+import hmac
+import ipaddress
+import json
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiohttp import web
+
+from ..downloader.archive import ARCHIVE_FORMATS
+from ..downloader.go_file_downloader import GoFileDownloader
+from ..metrics import MetricsRegistry
+from .job_store import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    FINISHED,
+    MODES,
+    PAUSED,
+    QUEUED,
+    RUNNING,
+    STATUSES,
+    JobStore,
+)
+
+
+class DownloadService:
+    """永続化したジョブキューを1つのダウンローダーで処理するサービス
+
+    セッション・トークン・スケジューラーを保持したダウンローダーを
+    全ジョブで使い回し、同時に最大 ``max_jobs`` 件を実行する。
+    起動時には前回実行中だったジョブを待機中に戻して再開する
+    （ダウンロード済みの部分はジャーナルから続きを取得する）。
+    一時停止は実行中のジョブを中断して待機列から外し、再開すると
+    続きからダウンロードする。
+    """
+
+    def __init__(
+        self,
+        downloader: GoFileDownloader,
+        store: JobStore,
+        max_jobs: int = 4,
+    ):
+        self._downloader = downloader
+        self._store = store
+        self._max_jobs = max(1, max_jobs)
+        self._running: Dict[str, asyncio.Future] = {}
+        # 中断したジョブに設定する状態
+        self._interrupted: Dict[str, str] = {}
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Future] = None
+
+    @property
+    def store(self) -> JobStore:
+        """ジョブの保存先"""
+        return self._store
+
+    async def start(self) -> None:
+        """前回中断したジョブを戻してジョブの実行を開始"""
+        self._store.requeue_running()
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def stop(self) -> None:
+        """実行中のジョブを中断し、次回の起動時に再開できるようにする"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        for job_id in list(self._running):
+            self._interrupt(job_id, QUEUED)
+        await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+    def submit(self, **job: Any) -> Dict[str, Any]:
+        """ジョブを登録（引数は ``JobStore.add`` と同じ）"""
+        created = self._store.add(**job)
+        self._wakeup.set()
+        return created
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        """ジョブを取り消す"""
+        return self._change(job_id, CANCELLED, (QUEUED, RUNNING, PAUSED))
+
+    def pause(self, job_id: str) -> Dict[str, Any]:
+        """ジョブを一時停止"""
+        return self._change(job_id, PAUSED, (QUEUED, RUNNING))
+
+    def resume(self, job_id: str) -> Dict[str, Any]:
+        """一時停止したジョブを待機列に戻す"""
+        return self._change(job_id, QUEUED, (PAUSED,))
+
+    def _change(
+        self, job_id: str, status: str, allowed: tuple
+    ) -> Dict[str, Any]:
+        """ジョブの状態を変更（実行中なら中断）"""
+        job = self._store.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job["status"] not in allowed:
+            raise ValueError(f"Job is {job['status']}")
+        if job_id in self._running:
+            self._interrupt(job_id, status)
+        self._store.set_status(job_id, status)
+        self._wakeup.set()
+        return self._store.get(job_id)
+
+    def _interrupt(self, job_id: str, status: str) -> None:
+        """実行中のジョブを中断し、終了後の状態を予約"""
+        self._interrupted[job_id] = status
+        self._running[job_id].cancel()
+
+    async def _dispatch(self) -> None:
+        """空きがある限り待機中のジョブを開始"""
+        while True:
+            self._wakeup.clear()
+            while len(self._running) < self._max_jobs:
+                job = self._store.next_queued(exclude=list(self._running))
+                if job is None:
+                    break
+                self._store.set_status(job["id"], RUNNING)
+                task = asyncio.ensure_future(self._execute(job))
+                task.add_done_callback(
+                    lambda _, job_id=job["id"]: self._finished(job_id)
+                )
+                self._running[job["id"]] = task
+            await self._wakeup.wait()
+
+    def _finished(self, job_id: str) -> None:
+        """終了したジョブの枠を空けて次のジョブを開始させる"""
+        self._running.pop(job_id, None)
+        self._interrupted.pop(job_id, None)
+        self._wakeup.set()
+
+    async def _execute(self, job: Dict[str, Any]) -> None:
+        """ジョブを実行して結果を保存"""
+        job_id = job["id"]
+        try:
+            result = await self._run_job(job)
+        except asyncio.CancelledError:
+            self._store.set_status(
+                job_id, self._interrupted.get(job_id, CANCELLED)
+            )
+            raise
+        except Exception as e:
+            self._store.set_status(job_id, FAILED, error=str(e))
+            return
+
+        if result["status"] == "error":
+            self._store.set_status(job_id, FAILED, result, result["message"])
+        else:
+            self._store.set_status(job_id, DONE, result)
+
+    async def _run_job(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """ジョブの種類に応じてダウンロード"""
+        password = self._store.password(job["id"])
+        if job["mode"] == "sync":
+            return await self._downloader.sync(
+                job["url"], password, job["output"], priority=job["priority"]
+            )
+        if job["mode"] == "archive":
+            return await self._downloader.download_archive(
+                job["url"],
+                Path(job["output"]),
+                job["archive_format"],
+                password,
+                priority=job["priority"],
+            )
+        return await self._downloader.download(
+            job["url"], password, job["output"], job["priority"]
+        )
+
+
+def _json_error(status: int, message: str) -> web.Response:
+    """エラーをJSONで返す"""
+    return web.json_response({"error": message}, status=status)
+
+
+def is_loopback(host: str) -> bool:
+    """待ち受けるアドレスが自ホストからしか接続できないかどうか"""
+    host = host.strip("[]")
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def resolve_output(output: Any, root: str) -> Path:
+    """出力先を root の下の絶対パスに変換（root の外なら ValueError）
+
+    相対パスは root からのパスとみなす。
+    """
+    if not isinstance(output, str):
+        raise ValueError("output must be a string")
+    base = Path(root).resolve()
+    path = (base / output).resolve()
+    if path != base and base not in path.parents:
+        raise ValueError(f"output must be inside {base}")
+    return path
+
+
+def parse_job(body: Any, default_output: str) -> Dict[str, Any]:
+    """リクエストの本文を ``JobStore.add`` の引数に変換
+
+    output は default_output の下に限る。``archive`` で output が
+    なければ default_output の下に ``<ID>.<形式>`` として保存する。
+    """
+    if not isinstance(body, dict) or not body.get("url"):
+        raise ValueError("url is required")
+    url = str(body["url"])
+    mode = body.get("mode", "download")
+    archive_format = body.get("archive_format")
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    if mode == "archive" and archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"archive_format must be one of {ARCHIVE_FORMATS}")
+    try:
+        priority = int(body.get("priority", 0))
+    except (TypeError, ValueError):
+        raise ValueError("priority must be an integer") from None
+
+    output = body.get("output")
+    if not output and mode == "archive":
+        name = url.rstrip("/").rsplit("/", 1)[-1]
+        output = f"{name}.{archive_format}"
+    return {
+        "url": url,
+        "output": str(resolve_output(output or ".", default_output)),
+        "password": body.get("password"),
+        "mode": mode,
+        "archive_format": archive_format,
+        "priority": priority,
+    }
+
+
+class _ControlAPI:
+    """ジョブを操作するHTTP APIのハンドラー"""
+
+    def __init__(
+        self,
+        service: DownloadService,
+        metrics: Optional[MetricsRegistry],
+        default_output: str,
+    ):
+        self._service = service
+        self._metrics = metrics
+        self._default_output = default_output
+
+    async def submit(self, request: web.Request) -> web.Response:
+        """ジョブを登録"""
+        try:
+            job = parse_job(await request.json(), self._default_output)
+        except json.JSONDecodeError:
+            return _json_error(400, "Request body must be JSON")
+        except ValueError as e:
+            return _json_error(400, str(e))
+        return web.json_response(self._service.submit(**job), status=201)
+
+    async def list_jobs(self, request: web.Request) -> web.Response:
+        """ジョブの一覧"""
+        status = request.query.get("status")
+        if status and status not in STATUSES:
+            return _json_error(400, f"status must be one of {STATUSES}")
+        return web.json_response(self._service.store.list(status))
+
+    async def get_job(self, request: web.Request) -> web.Response:
+        """ジョブの状態と結果"""
+        job = self._service.store.get(request.match_info["job_id"])
+        if job is None:
+            return _json_error(404, "Job not found")
+        return web.json_response(job)
+
+    async def change_job(self, request: web.Request) -> web.Response:
+        """ジョブの取り消し・一時停止・再開"""
+        action = getattr(self._service, request.match_info["action"])
+        try:
+            job = action(request.match_info["job_id"])
+        except KeyError:
+            return _json_error(404, "Job not found")
+        except ValueError as e:
+            return _json_error(409, str(e))
+        return web.json_response(job)
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        """Prometheus形式のメトリクス"""
+        if self._metrics is None:
+            return _json_error(404, "Metrics are disabled")
+        return web.Response(
+            text=self._metrics.to_prometheus(), content_type="text/plain"
+        )
+
+    async def health(self, request: web.Request) -> web.Response:
+        """サービスの状態とジョブの件数"""
+        counts = {status: 0 for status in STATUSES}
+        for job in self._service.store.list():
+            counts[job["status"]] += 1
+        return web.json_response(
+            {
+                "status": "ok",
+                "jobs": counts,
+                "finished": sum(counts[status] for status in FINISHED),
+            }
+        )
+
+
+def _require_token(
+    api_token: str,
+) -> Callable[..., Awaitable[web.StreamResponse]]:
+    """``Authorization: Bearer <api_token>`` のないリクエストを拒否"""
+    expected = f"Bearer {api_token}".encode()
+
+    @web.middleware
+    async def middleware(
+        request: web.Request,
+        handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+    ) -> web.StreamResponse:
+        given = request.headers.get("Authorization", "").encode()
+        if not hmac.compare_digest(given, expected):
+            return _json_error(401, "Invalid or missing API token")
+        return await handler(request)
+
+    return middleware
+
+
+@web.middleware
+async def _require_json(
+    request: web.Request,
+    handler: Callable[[web.Request], Awaitable[web.StreamResponse]],
+) -> web.StreamResponse:
+    """``application/json`` 以外の POST を拒否
+
+    ブラウザーはプリフライトなしにJSONのリクエストを送れないため、
+    ユーザーが開いた他のサイトからジョブを操作されるのを防ぐ。
+    """
+    if request.method == "POST" and request.content_type != "application/json":
+        return _json_error(415, "Content-Type must be application/json")
+    return await handler(request)
+
+
+def create_app(
+    service: DownloadService,
+    metrics: Optional[MetricsRegistry] = None,
+    default_output: str = "./downloads",
+    api_token: Optional[str] = None,
+) -> web.Application:
+    """ジョブを操作するHTTP APIのアプリケーションを生成
+
+    api_token を指定すると、全てのリクエストに
+    ``Authorization: Bearer <api_token>`` を求める。POST は本文がなくても
+    ``Content-Type: application/json`` を付ける。ジョブの output は
+    default_output の下に限る。
+
+    - ``POST /jobs``: ``{"url", "password", "output", "mode",
+      "archive_format", "priority"}`` でジョブを登録（``archive`` では
+      output はアーカイブのパス）
+    - ``GET /jobs``: ジョブの一覧（``?status=`` で絞り込み）
+    - ``GET /jobs/{id}``: ジョブの状態と結果
+    - ``POST /jobs/{id}/cancel|pause|resume``: 状態を変更
+    - ``GET /metrics``: Prometheus形式のメトリクス
+    - ``GET /health``: サービスの状態
+    """
+    api = _ControlAPI(service, metrics, default_output)
+    middlewares = [_require_token(api_token)] if api_token else []
+    app = web.Application(middlewares=[*middlewares, _require_json])
+    app.add_routes(
+        [
+            web.post("/jobs", api.submit),
+            web.get("/jobs", api.list_jobs),
+            web.get("/jobs/{job_id}", api.get_job),
+            web.post(
+                "/jobs/{job_id}/{action:cancel|pause|resume}", api.change_job
+            ),
+            web.get("/metrics", api.metrics),
+            web.get("/health", api.health),
+        ]
+    )
+    return app
@@ -0,0 +1,103 @@
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+if TYPE_CHECKING:
+    from .metrics import MetricsRegistry
+
+
+@dataclass
+class ConnectionPoolConfig:
+    """共有するコネクションプールの設定"""
+
+    limit: int = 100
+    limit_per_host: int = 0
+    ttl_dns_cache: Optional[int] = 300
+    keepalive_timeout: float = 60.0
+    enable_cleanup_closed: bool = False
+    # 大きなファイルの転送を打ち切らないよう全体の時間は制限せず、
+    # 接続とデータの受信が止まった場合だけタイムアウトにする
+    connect_timeout: Optional[float] = 30.0
+    read_timeout: Optional[float] = 60.0
+
+    def client_timeout(self) -> aiohttp.ClientTimeout:
+        """セッションに設定するタイムアウト"""
+        return aiohttp.ClientTimeout(
+            total=None,
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout,
+        )
+
+
+class ConnectionStats:
+    """新規に開いた接続と再利用した接続の数を数える"""
+
+    def __init__(self) -> None:
+        """初期化: カウンターを0にする"""
+        self.opened = 0
+        self.reused = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        """カウンターを辞書で返す"""
+        return {"opened": self.opened, "reused": self.reused}
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """カウンターを更新するトレース設定を生成"""
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_create)
+        trace_config.on_connection_reuseconn.append(self._on_reuse)
+        return trace_config
+
+    async def _on_create(self, session, context, params) -> None:
+        """新規に開いた接続を数える"""
+        self.opened += 1
+
+    async def _on_reuse(self, session, context, params) -> None:
+        """再利用した接続を数える"""
+        self.reused += 1
+
+
+def create_session(
+    config: Optional[ConnectionPoolConfig] = None,
+    stats: Optional[ConnectionStats] = None,
+    metrics: Optional["MetricsRegistry"] = None,
+    **kwargs,
+) -> aiohttp.ClientSession:
+    """調整したコネクションプールを使うセッションを生成
+
+    全てのリクエストで接続を再利用できるよう、全てのAPIクライアントと
+    ダウンローダーで共有する。metrics を指定すると、DNS、接続、
+    最初のバイトまでの時間を記録する。
+    """
+    config = config or ConnectionPoolConfig()
+    connector = aiohttp.TCPConnector(
+        limit=config.limit,
+        limit_per_host=config.limit_per_host,
+        ttl_dns_cache=config.ttl_dns_cache,
+        use_dns_cache=config.ttl_dns_cache is not None,
+        keepalive_timeout=config.keepalive_timeout,
+        enable_cleanup_closed=config.enable_cleanup_closed,
+    )
+    kwargs.setdefault("timeout", config.client_timeout())
+    trace_configs = list(kwargs.pop("trace_configs", []))
+    if stats:
+        trace_configs.append(stats.trace_config())
+    if metrics:
+        trace_configs.append(metrics.trace_config())
+    return aiohttp.ClientSession(
+        connector=connector, trace_configs=trace_configs, **kwargs
+    )
+
+
+@asynccontextmanager
+async def optional_session(
+    session: Optional[aiohttp.ClientSession],
+) -> AsyncIterator[aiohttp.ClientSession]:
+    """指定されたセッションを使う（なければ一時的なセッションを作成）"""
+    if session is not None:
+        yield session
+        return
+    async with create_session() as temporary_session:
+        yield temporary_session
@@ -1,11 +1,20 @@
+from .account_status import AccountStatusCache, QuotaPolicy
 from .get_status import GofileAccountManager
 from .go_file_api_manager import GoFileAPIManager
 from .token_file_manager import TokenFileManager
-from .token_manager import TokenManager
+from .token_manager import TokenManager, create_token_store
+from .token_pool import TokenPool
+from .token_store import SqliteTokenStore, TokenStore
 
 __all__ = [
+    "AccountStatusCache",
     "GoFileAPIManager",
+    "QuotaPolicy",
+    "SqliteTokenStore",
     "TokenFileManager",
     "TokenManager",
+    "TokenPool",
+    "TokenStore",
     "GofileAccountManager",
+    "create_token_store",
 ]
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+Account = Dict[str, Any]
+
+
+class AccountStatusCache:
+    """トークンごとのアカウント情報をTTL付きで保持するキャッシュ
+
+    取得から ``ttl * refresh_ahead`` 秒を過ぎたエントリーは、保持している
+    値を返しつつバックグラウンドで取得し直すため、呼び出し元はAPIの
+    往復を待たない。同じトークンの取得は1つにまとめ、失敗した場合は
+    ``retry_after`` 秒後まで古い値を使い続ける。
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Awaitable[Account]],
+        ttl: float = 300.0,
+        refresh_ahead: float = 0.8,
+        retry_after: float = 30.0,
+    ):
+        self._loader = loader
+        self._ttl = ttl
+        self._refresh_ahead = refresh_ahead
+        self._retry_after = retry_after
+        # トークン -> (取得時刻, アカウント情報)
+        self._entries: Dict[str, Tuple[float, Account]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._errors: Dict[str, Exception] = {}
+
+    def set(self, token: str, account: Account) -> None:
+        """取得済みのアカウント情報を保存"""
+        self._entries[token] = (time.monotonic(), account)
+        self._retry_at.pop(token, None)
+        self._errors.pop(token, None)
+
+    def invalidate(self, token: str) -> None:
+        """エントリーを削除"""
+        self._entries.pop(token, None)
+
+    def peek(self, token: str) -> Optional[Account]:
+        """保持している値を待たずに返す（期限が近ければ裏で取得し直す）"""
+        entry = self._entries.get(token)
+        if (
+            entry is None
+            or self._age(entry) >= self._ttl * self._refresh_ahead
+        ):
+            self._refresh(token)
+        return entry[1] if entry else None
+
+    async def get(self, token: str) -> Account:
+        """アカウント情報を返す（期限切れか未取得の場合のみ取得を待つ）
+
+        取得に失敗した場合は古い値を返し、値がなければ ValueError。
+        """
+        entry = self._entries.get(token)
+        if entry is not None and self._age(entry) < self._ttl:
+            return self.peek(token)
+        future = self._refresh(token)
+        if future is not None:
+            await asyncio.shield(future)
+        entry = self._entries.get(token)
+        if entry is not None:
+            return entry[1]
+        error = self._errors.get(token)
+        raise ValueError(f"Account status unavailable: {error}") from error
+
+    async def close(self) -> None:
+        """実行中の取得を中断"""
+        for future in list(self._inflight.values()):
+            future.cancel()
+        await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+
+    def _refresh(self, token: str) -> Optional[asyncio.Future]:
+        """取得を開始（実行中なら相乗りし、失敗後の待機中なら None）"""
+        future = self._inflight.get(token)
+        if future is not None:
+            return future
+        if time.monotonic() < self._retry_at.get(token, 0.0):
+            return None
+        future = asyncio.ensure_future(self._load(token))
+        self._inflight[token] = future
+        future.add_done_callback(lambda _: self._inflight.pop(token, None))
+        return future
+
+    async def _load(self, token: str) -> None:
+        """アカウント情報を取得して保存（失敗は記録して次の試行を遅らせる）"""
+        try:
+            self.set(token, await self._loader(token))
+        except Exception as e:
+            self._errors[token] = e
+            self._retry_at[token] = time.monotonic() + self._retry_after
+
+    @staticmethod
+    def _age(entry: Tuple[float, Account]) -> float:
+        """取得からの経過秒数"""
+        return time.monotonic() - entry[0]
+
+
+@dataclass
+class QuotaPolicy:
+    """アカウントの通信量の上限と、上限に近いとみなす余裕の割合
+
+    limits はティア（``guest`` など）ごとのバイト数で、``*`` は
+    その他のティアに使う。使用量は ``statsCurrent.trafficWebDownloaded``
+    で、``ipTraffic30`` はIPごとの値のためアカウントの選択には使わない。
+    """
+
+    limits: Dict[str, int] = field(default_factory=dict)
+    reserve: float = 0.05
+
+    def limit_for(self, account: Account) -> Optional[int]:
+        """アカウントの上限（分からなければ None）"""
+        return self.limits.get(account.get("tier"), self.limits.get("*"))
+
+    @staticmethod
+    def used(account: Account) -> int:
+        """アカウントの使用済みの通信量"""
+        stats = account.get("statsCurrent") or {}
+        return int(stats.get("trafficWebDownloaded") or 0)
+
+    def headroom(self, account: Account, pending: int = 0) -> Optional[int]:
+        """残りの通信量（pending は取得後に使った・使う予定の量）"""
+        limit = self.limit_for(account)
+        if limit is None:
+            return None
+        return limit - self.used(account) - pending
+
+    def is_near_limit(self, account: Account, pending: int = 0) -> bool:
+        """残りが上限の reserve 未満かどうか"""
+        limit = self.limit_for(account)
+        headroom = self.headroom(account, pending)
+        return headroom is not None and headroom < limit * self.reserve
@@ -2,17 +2,39 @@ from typing import Any, Dict, Optional
 
 import aiohttp
 
+from ..metrics import MetricsRegistry, track_api
+from ..session import optional_session
+from .account_status import AccountStatusCache
 from .go_file_api_manager import GoFileAPIManager
 
 
 class GofileAccountManager:
     """Gofile.ioのアカウント情報を管理するクラス"""
 
-    def __init__(self, api_server: str = "api"):
-        """初期化"""
+    def __init__(
+        self,
+        api_server: str = "api",
+        session: Optional[aiohttp.ClientSession] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        status_ttl: float = 300.0,
+    ):
+        """初期化
+
+        Args:
+            api_server (str): APIサーバー名
+            session (Optional[aiohttp.ClientSession]): 共有するセッション。
+                指定しない場合はリクエストごとに一時的なセッションを使う
+            metrics (Optional[MetricsRegistry]): リクエストを記録する
+                メトリクス
+            status_ttl (float): アカウント情報をキャッシュする秒数
+        """
         self.api_server = api_server
+        self._session = session
+        self._metrics = metrics
         self._accounts: Dict[str, Dict[str, Any]] = {}
-        self._api_manager = GoFileAPIManager()
+        self._api_manager = GoFileAPIManager(session, metrics)
+        # トークンごとのアカウント情報（期限が近づくと裏で取得し直す）
+        self.status_cache = AccountStatusCache(self.fetch_account, status_ttl)
 
     async def fetch_account(self, token: str) -> Dict[str, Any]:
         """トークンに紐づくアカウント情報を取得
@@ -41,33 +63,42 @@ class GofileAccountManager:
             }
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                response = await session.get(
+            with track_api(self._metrics, "accounts_website") as call:
+                async with optional_session(
+                    self._session
+                ) as session, session.get(
                     f"https://{self.api_server}.gofile.io/accounts/website",
                     headers={"Authorization": f"Bearer {token}"},
-                    timeout=10,
-                )
-                response.raise_for_status()
-                data = await response.json()
-                return data.get("data", {})
+                    timeout=aiohttp.ClientTimeout(total=10),
+                ) as response:
+                    call.status = response.status
+                    response.raise_for_status()
+                    data = await response.json()
+                    return data.get("data", {})
         except aiohttp.ClientError as e:
             raise ValueError(f"Failed to fetch account: {e}") from e
 
     async def sync_account(self, token: str) -> Dict[str, Any]:
         """トークンに紐づくアカウント情報を取得して同期する"""
         account_data = await self.fetch_account(token)
+        self.status_cache.set(token, account_data)
         self._accounts[account_data["email"]] = account_data
         return account_data
 
     async def get_account_status(
         self, token: Optional[str] = None
     ) -> Dict[str, Any]:
-        """アクティブなアカウント情報を取得"""
+        """アクティブなアカウント情報を取得
+
+        token を指定した場合はキャッシュしたアカウント情報を使い、
+        期限切れか未取得の場合のみAPIに問い合わせる。
+        """
         if not self._accounts and not token:
             raise ValueError("No accounts available and no token provided.")
 
         if token:
-            await self.sync_account(token)
+            account_data = await self.status_cache.get(token)
+            self._accounts[account_data["email"]] = account_data
             return await self.get_first_active_account()
 
         if not self._accounts:
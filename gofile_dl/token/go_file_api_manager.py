@@ -1,5 +1,10 @@
+from typing import Optional
+
 import aiohttp
 
+from ..metrics import MetricsRegistry, track_api
+from ..session import optional_session
+
 
 class GoFileAPIManager:
     """GoFile APIとの通信を管理するクラス"""
@@ -7,21 +12,32 @@ class GoFileAPIManager:
     API_BASE = "https://api.gofile.io"
     ACCOUNT_URL = f"{API_BASE}/accounts"
 
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ):
+        """初期化: 共有するセッションを指定しない場合は都度作成する"""
+        self._session = session
+        self._metrics = metrics
+
     async def fetch_new_token(self) -> str:
         """GoFile APIから新しいトークンを取得し返す"""
-        async with aiohttp.ClientSession() as session, session.post(
-            self.ACCOUNT_URL
-        ) as response:
-            data = await response.json()
-            if response.status != 200:
-                raise RuntimeError(
-                    f"アカウント作成に失敗しました: HTTP {response.status}"
-                )
-
-            if data.get("status") != "ok":
-                raise RuntimeError(
-                    "アカウント作成に失敗しました: "
-                    f"{data.get('message', 'Unknown error')}"
-                )
-
-            return data["data"]["token"]
+        with track_api(self._metrics, "accounts") as call:
+            async with optional_session(
+                self._session
+            ) as session, session.post(self.ACCOUNT_URL) as response:
+                call.status = response.status
+                data = await response.json()
+                if response.status != 200:
+                    raise RuntimeError(
+                        f"アカウント作成に失敗しました: HTTP {response.status}"
+                    )
+
+                if data.get("status") != "ok":
+                    raise RuntimeError(
+                        "アカウント作成に失敗しました: "
+                        f"{data.get('message', 'Unknown error')}"
+                    )
+
+                return data["data"]["token"]
@@ -1,27 +1,104 @@
 import json
 import os
-from typing import Dict, List
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from .token_store import TokenStore, merge_token, open_locked
 
-class TokenFileManager:
-    """トークンファイルを管理するクラス"""
+
+class TokenFileManager(TokenStore):
+    """トークンファイル（tokens.json）を管理するクラス
+
+    書き込みは ``<ファイル>.lock`` の排他ロックを取ってから読み直して
+    変更を適用し、一時ファイルからの置き換えで保存する。複数のプロセスが
+    同時に更新しても変更は失われず、読み込みで書きかけのファイルが
+    見えることもない。
+    """
 
     def __init__(
         self, token_file: str = os.getenv("TOKEN_FILE_PATH", "tokens.json")
     ):
+        super().__init__(token_file)
         self.token_file_path = token_file
+        # 最後に読み書きしたファイルの (inode, 更新日時, サイズ)
+        self._signature: Optional[Tuple[int, int, int]] = None
 
-    def load_tokens(self) -> List[Dict[str, str]]:
+    def load_tokens(self) -> List[Dict[str, Any]]:
         """tokens.json からトークンリストを読み込む"""
         try:
             with open(self.token_file_path, "r") as f:
+                self._signature = self._stat_signature(os.fstat(f.fileno()))
                 data = json.load(f)
                 return data.get("tokens", [])
-        except (FileNotFoundError, json.JSONDecodeError):
+        except FileNotFoundError:
+            self._signature = None
             return []
+        except json.JSONDecodeError:
+            return []
+
+    async def changed(self) -> bool:
+        return await self._run(self._file_signature) != self._signature
+
+    async def add(self, token: Dict[str, Any]) -> List[Dict[str, Any]]:
+        def append(tokens: List[Dict[str, Any]]) -> None:
+            if all(t.get("token") != token["token"] for t in tokens):
+                tokens.append(token)
+
+        return await self._run(self._modify, append)
+
+    async def update(
+        self, token: str, changes: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        def apply(tokens: List[Dict[str, Any]]) -> None:
+            for record in tokens:
+                if record.get("token") == token:
+                    merge_token(record, changes)
+
+        return await self._run(self._modify, apply)
+
+    async def save_tokens(self, tokens: List[Dict[str, Any]]) -> None:
+        """トークンリスト全体で tokens.json を置き換える"""
+
+        def replace(current: List[Dict[str, Any]]) -> None:
+            current[:] = tokens
+
+        await self._run(self._modify, replace)
+
+    def _modify(
+        self, change: Callable[[List[Dict[str, Any]]], None]
+    ) -> List[Dict[str, Any]]:
+        """ロックを取って最新の内容に変更を適用し、保存した内容を返す"""
+        with open_locked(f"{self.token_file_path}.lock"):
+            tokens = self.load_tokens()
+            change(tokens)
+            self._write(tokens)
+            return tokens
+
+    def _write(self, tokens: List[Dict[str, Any]]) -> None:
+        """一時ファイルに書き込んでから置き換える（所有者のみ読み書き可）"""
+        directory = os.path.dirname(os.path.abspath(self.token_file_path))
+        fd, tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=".tokens-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"tokens": tokens}, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+                signature = self._stat_signature(os.fstat(f.fileno()))
+            os.replace(tmp_path, self.token_file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._signature = signature
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int]]:
+        """現在のファイルの (inode, 更新日時, サイズ)"""
+        try:
+            return self._stat_signature(os.stat(self.token_file_path))
+        except FileNotFoundError:
+            return None
 
-    async def save_tokens(self, tokens: List[Dict[str, str]]) -> None:
-        """トークンリストを tokens.json に保存"""
-        data = {"tokens": tokens}
-        with open(self.token_file_path, "w") as f:
-            json.dump(data, f, indent=4)
+    @staticmethod
+    def _stat_signature(stat: os.stat_result) -> Tuple[int, int, int]:
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
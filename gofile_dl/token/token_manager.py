@@ -1,44 +1,87 @@
+import asyncio
 import os
 import time
 from datetime import datetime
-from typing import Optional
+from typing import Collection, List, Optional
 
+import aiohttp
+
+from ..metrics import MetricsRegistry
 from .get_status import GofileAccountManager
 from .go_file_api_manager import GoFileAPIManager
 from .token_file_manager import TokenFileManager
+from .token_store import SqliteTokenStore, TokenStore
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+def create_token_store(path: str) -> TokenStore:
+    """パスの拡張子からトークンの保存先を生成（.sqlite なら SQLite）"""
+    if path.endswith(SQLITE_SUFFIXES):
+        return SqliteTokenStore(path)
+    return TokenFileManager(path)
 
 
 class TokenManager:
-    """GoFile API トークンを管理するクラス"""
+    """GoFile API トークンを管理するクラス
+
+    トークンは同じホストの全プロセスで共有する。他のプロセスが
+    保存先を更新していれば読み直し、新しいトークンの作成は
+    プロセスをまたいで1つずつ行う。
+    """
 
     def __init__(
-        self, token_file: str = os.getenv("TOKEN_FILE_PATH", "tokens.json")
+        self,
+        token_file: str = os.getenv("TOKEN_FILE_PATH", "tokens.json"),
+        session: Optional[aiohttp.ClientSession] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        token_store: Optional[TokenStore] = None,
     ) -> None:
-        """初期化: トークンファイル、API管理、アカウント管理の準備"""
-        self.token_file_manager = TokenFileManager(token_file)
-        self.api_manager = GoFileAPIManager()
-        self.account_manager = GofileAccountManager()
-        self.tokens = self.token_file_manager.load_tokens()
+        """初期化: トークンの保存先、API管理、アカウント管理の準備"""
+        self.token_store = token_store or create_token_store(token_file)
+        self.api_manager = GoFileAPIManager(session, metrics)
+        self.account_manager = GofileAccountManager(
+            session=session, metrics=metrics
+        )
+        self.tokens = self.token_store.load_tokens()
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """トークン作成を直列化するロック"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def valid_tokens(self) -> List[str]:
+        """有効なトークンの一覧を取得"""
+        return [t["token"] for t in self.tokens if t.get("valid")]
+
+    async def refresh(self) -> None:
+        """他のプロセスが保存先を更新していればトークンを読み直す"""
+        if await self.token_store.changed():
+            self.tokens = await self.token_store.load()
 
     async def get_valid_token(self) -> Optional[str]:
         """有効なトークンを取得（環境変数またはtokens.json）"""
         # 環境変数GF_TOKENが設定されている場合、それを確認
         token = os.getenv("GF_TOKEN")
-        if token and any(
-            t["token"] == token and t["valid"] for t in self.tokens
-        ):
+        if token and token in self.valid_tokens():
             return token
 
-        # tokens.jsonにトークンが存在すれば、最初のトークンを返す
-        if self.tokens:
-            return self.tokens[0]["token"]
+        async with self.lock, self.token_store.create_lock():
+            # 保存先に有効なトークンが存在すれば、最初のトークンを返す
+            await self.refresh()
+            valid_tokens = self.valid_tokens()
+            if valid_tokens:
+                return valid_tokens[0]
 
-        # トークンがない場合は新しいトークンを取得
-        new_token = await self.api_manager.fetch_new_token()
-        await self.token_file_manager.save_tokens(
-            [{"token": new_token, "valid": True, "account": {}}]
-        )
-        return new_token
+            # トークンがない場合は新しいトークンを取得
+            new_token = await self.api_manager.fetch_new_token()
+            self.tokens = await self.token_store.add(
+                {"token": new_token, "valid": True, "account": {}}
+            )
+            return new_token
 
     async def get_or_create_token(self) -> str:
         """有効なトークンがない場合、新しいトークンを取得"""
@@ -46,6 +89,23 @@ class TokenManager:
         return token if token else await self.create_new_token()
 
     async def create_new_token(self) -> str:
+        """新しいトークンを生成し、アカウント情報を追加して保存"""
+        async with self.lock, self.token_store.create_lock():
+            return await self._create_new_token()
+
+    async def claim_token(self, known: Collection[str]) -> str:
+        """known にない有効なトークンを返す（なければ作成）
+
+        他のプロセスが作成したトークンがあれば、新たに作成せずに使う。
+        """
+        async with self.lock, self.token_store.create_lock():
+            await self.refresh()
+            for token in self.valid_tokens():
+                if token not in known:
+                    return token
+            return await self._create_new_token()
+
+    async def _create_new_token(self) -> str:
         """新しいトークンを生成し、アカウント情報を追加して保存"""
         new_token = await self.api_manager.fetch_new_token()
         generated_at = time.time()
@@ -64,10 +124,8 @@ class TokenManager:
             "valid": True,
             "account": account_data,
         }
-        self.tokens.append(token_data)
-
-        # トークンファイルに保存
-        await self.token_file_manager.save_tokens(self.tokens)
+        # 保存先に追加（他のプロセスが追加したトークンも読み込まれる）
+        self.tokens = await self.token_store.add(token_data)
 
         # 環境変数に新しいトークンを設定
         os.environ["GF_TOKEN"] = new_token
@@ -76,12 +134,10 @@ class TokenManager:
 
     async def invalidate_token(self, token: str) -> None:
         """指定したトークンを無効化"""
-        for t in self.tokens:
-            if t["token"] == token:
-                t["valid"] = False
-                t["account"]["status"] = "invalid"  # ステータスを無効に更新
-                break
-        await self.token_file_manager.save_tokens(self.tokens)
+        # アカウントのステータスも無効に更新
+        self.tokens = await self.token_store.update(
+            token, {"valid": False, "account": {"status": "invalid"}}
+        )
 
     async def replace_token(self) -> str:
         """現在のトークンが無効な場合、新しいトークンを生成して利用する"""
@@ -0,0 +1,277 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Set
+
+from .account_status import Account, QuotaPolicy
+from .token_manager import TokenManager
+
+# トークン自体が拒否されたことを示すステータス
+REJECTED_STATUSES = (401, 403)
+# レート制限を示すステータス
+RATE_LIMITED_STATUSES = (429,)
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """Retry-Afterヘッダーから待機秒数を取得"""
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class _TokenState:
+    """プール内のトークンの状態"""
+
+    __slots__ = (
+        "token",
+        "in_flight",
+        "failures",
+        "rejections",
+        "blocked_until",
+        "reserved",
+        "used",
+        "account",
+    )
+
+    def __init__(self, token: str):
+        self.token = token
+        self.in_flight = 0
+        self.failures = 0
+        # 続けて 401/403 を返された回数
+        self.rejections = 0
+        self.blocked_until = 0.0
+        # 実行中のダウンロードが使う予定のバイト数
+        self.reserved = 0
+        # アカウント情報の取得後にダウンロードしたバイト数
+        self.used = 0
+        self.account: Optional[Account] = None
+
+
+class TokenPool:
+    """複数のトークンに同時リクエストを分散するプール
+
+    レスポンスのステータスを ``report`` で受け取り、401/403 のトークンは
+    しばらく使わず、``reject_limit`` 回続けて拒否されたら無効化して
+    プールから外す。429 のトークンは指数的に待機させる。
+    新しいトークンの作成はロックで直列化し、同時に必要になっても
+    作成は1回だけ行う。他のプロセスが作成した有効なトークンがあれば
+    作成せずにプールへ加えるため、同じホストのプロセスは同じ
+    トークンを共有する。
+
+    quota を指定すると、キャッシュしたアカウント情報から残りの通信量を
+    見積もり、余裕の大きいトークンほど多くのダウンロードに使う。
+    上限に近いアカウントのトークンは使わず、全てが上限に近ければ
+    プールから外して新しいトークンに入れ替える。
+    """
+
+    def __init__(
+        self,
+        token_manager: Optional[TokenManager] = None,
+        max_size: int = 3,
+        min_size: int = 1,
+        cooldown: float = 30.0,
+        max_cooldown: float = 600.0,
+        quota: Optional[QuotaPolicy] = None,
+        reject_limit: int = 2,
+    ):
+        self._token_manager = token_manager or TokenManager()
+        self._max_size = max(1, max_size)
+        self._min_size = min(max(1, min_size), self._max_size)
+        self._cooldown = cooldown
+        self._max_cooldown = max_cooldown
+        self._reject_limit = max(1, reject_limit)
+        self._states: Dict[str, _TokenState] = {}
+        self._quota = quota
+        self._status = (
+            self._token_manager.account_manager.status_cache if quota else None
+        )
+        # 上限に近いためプールから外したトークン
+        self._retired: Set[str] = set()
+        self._loaded = False
+        self._generation = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def tokens(self) -> List[str]:
+        """プール内のトークン"""
+        return list(self._states)
+
+    @property
+    def max_size(self) -> int:
+        """プールに置くトークンの最大数"""
+        return self._max_size
+
+    async def acquire(self, size: Optional[int] = None) -> str:
+        """利用中のリクエストが最も少ない利用可能なトークンを取得
+
+        size にはダウンロードするバイト数を指定する。quota があれば
+        残りの通信量で重み付けし、size が収まるトークンを優先する。
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ensure_tokens()
+            now = loop.time()
+            state = self._pick(now, size or 0)
+            if state is not None:
+                state.in_flight += 1
+                state.reserved += size or 0
+                return state.token
+
+            # 全てのトークンが待機中か上限間近: 枠があれば補充し、
+            # なければ上限間近のものを入れ替えるか解除を待つ
+            if len(self._states) < self._max_size or self._retire():
+                await self._create_token()
+                continue
+            wait = min(s.blocked_until for s in self._states.values()) - now
+            await asyncio.sleep(wait)
+
+    def release(self, token: str, size: Optional[int] = None) -> None:
+        """トークンの利用を終了（size は acquire に指定した値）"""
+        state = self._states.get(token)
+        if state and state.in_flight:
+            state.in_flight -= 1
+        if state and size:
+            # 次にアカウント情報を取得するまでは使用済みとみなす
+            state.reserved -= size
+            state.used += size
+
+    @asynccontextmanager
+    async def lease(self, size: Optional[int] = None) -> AsyncIterator[str]:
+        """トークンを借りて、終了時に返却するコンテキストマネージャー"""
+        token = await self.acquire(size)
+        try:
+            yield token
+        finally:
+            self.release(token, size)
+
+    def _pick(self, now: float, size: int) -> Optional[_TokenState]:
+        """次に使うトークンを選ぶ（使えるものがなければ None）"""
+        available = [
+            state
+            for state in self._states.values()
+            if state.blocked_until <= now and not self._is_near_limit(state)
+        ]
+        if not available or self._quota is None:
+            return min(available, key=lambda s: s.in_flight, default=None)
+
+        headroom = {id(state): self._headroom(state) for state in available}
+        fits = [
+            state
+            for state in available
+            if headroom[id(state)] is None or headroom[id(state)] >= size
+        ]
+
+        def load(state: _TokenState) -> float:
+            # 残りの割合が小さいほど同じ利用数でも重く数える
+            account = state.account
+            limit = self._quota.limit_for(account) if account else None
+            if not limit or headroom[id(state)] is None:
+                return state.in_flight + 1
+            share = max(headroom[id(state)] / limit, 1e-6)
+            return (state.in_flight + 1) / share
+
+        return min(fits or available, key=load)
+
+    def _refresh_account(self, state: _TokenState) -> Optional[Account]:
+        """キャッシュからアカウント情報を取得（更新されたら使用量を戻す）"""
+        account = self._status.peek(state.token)
+        if account is not state.account:
+            state.account = account
+            state.used = 0
+        return account
+
+    def _headroom(self, state: _TokenState) -> Optional[int]:
+        """アカウントの残りの通信量（分からなければ None）"""
+        account = self._refresh_account(state)
+        if account is None:
+            return None
+        return self._quota.headroom(account, state.used + state.reserved)
+
+    def _is_near_limit(self, state: _TokenState) -> bool:
+        """アカウントの通信量が上限に近いかどうか"""
+        if self._quota is None:
+            return False
+        account = self._refresh_account(state)
+        return account is not None and self._quota.is_near_limit(
+            account, state.used + state.reserved
+        )
+
+    def _retire(self) -> bool:
+        """上限に近いトークンをプールから外し、外したかどうかを返す"""
+        retired = [
+            token
+            for token, state in self._states.items()
+            if self._is_near_limit(state)
+        ]
+        for token in retired:
+            del self._states[token]
+            self._retired.add(token)
+        return bool(retired)
+
+    async def report(
+        self, token: str, status: int, retry_after: Optional[float] = None
+    ) -> None:
+        """リクエストの結果を反映
+
+        Args:
+            token: リクエストに使ったトークン
+            status: HTTPステータスコード
+            retry_after: Retry-Afterヘッダーの秒数
+        """
+        state = self._states.get(token)
+        if state is None:
+            return
+
+        if status in REJECTED_STATUSES:
+            await self._reject(state)
+        elif status in RATE_LIMITED_STATUSES:
+            state.failures += 1
+            backoff = retry_after or min(
+                self._cooldown * 2 ** (state.failures - 1), self._max_cooldown
+            )
+            state.blocked_until = asyncio.get_running_loop().time() + backoff
+        elif status < 400:
+            state.failures = 0
+            state.rejections = 0
+
+    async def _reject(self, state: _TokenState) -> None:
+        """拒否されたトークンを待機させ、続けば無効化する
+
+        ファイルによって 403 が返ることもあるため、1回の拒否では
+        他のプロセスと共有しているトークンを無効化しない。
+        """
+        state.rejections += 1
+        if state.rejections < self._reject_limit:
+            loop = asyncio.get_running_loop()
+            state.blocked_until = loop.time() + self._cooldown
+            return
+        del self._states[state.token]
+        await self._token_manager.invalidate_token(state.token)
+
+    async def _ensure_tokens(self) -> None:
+        """プールのトークンが min_size 未満なら読み込むか作成する"""
+        if not self._loaded:
+            self._loaded = True
+            await self._token_manager.refresh()
+            for token in self._token_manager.valid_tokens()[: self._max_size]:
+                self._states[token] = _TokenState(token)
+        while len(self._states) < self._min_size:
+            await self._create_token()
+
+    async def _create_token(self) -> None:
+        """トークンを追加（同時に呼ばれても1回だけ作成または取得）"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        generation = self._generation
+        async with self._lock:
+            # 待っている間に他の呼び出し元が作成した場合はそれを使う
+            if self._generation != generation:
+                return
+            token = await self._token_manager.claim_token(
+                self._states.keys() | self._retired
+            )
+            self._states[token] = _TokenState(token)
+            self._generation += 1
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager, closing
+from typing import IO, Any, AsyncIterator, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def open_locked(path: str) -> IO[str]:
+    """ロックファイルを開いて排他ロックを取る（取れるまで待つ）
+
+    fcntl がない環境ではロックせず、プロセス内の排他のみになる。
+    """
+    handle = open(path, "a")  # noqa: SIM115 ロックを保持したまま返す
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            handle.close()
+            raise
+    return handle
+
+
+def merge_token(record: Dict[str, Any], changes: Dict[str, Any]) -> None:
+    """トークンの記録に変更を反映（辞書の値は1段だけ統合する）"""
+    for key, value in changes.items():
+        current = record.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            record[key] = {**current, **value}
+        else:
+            record[key] = value
+
+
+class TokenStore:
+    """トークンを保存するバックエンド
+
+    読み書きはスレッドプールで行い、イベントループを止めない。
+    追加と更新はその時点の保存内容に対して行うため、他のプロセスの
+    変更を上書きしない。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load_tokens(self) -> List[Dict[str, Any]]:
+        """全トークンを読み込む（初期化用の同期版）"""
+        raise NotImplementedError
+
+    async def load(self) -> List[Dict[str, Any]]:
+        """全トークンを読み込む"""
+        return await self._run(self.load_tokens)
+
+    async def changed(self) -> bool:
+        """前回の読み書きの後に他のプロセスが更新したかどうか"""
+        raise NotImplementedError
+
+    async def add(self, token: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """トークンを追加し、追加後の全トークンを返す"""
+        raise NotImplementedError
+
+    async def update(
+        self, token: str, changes: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """トークンの記録を更新し、更新後の全トークンを返す"""
+        raise NotImplementedError
+
+    @asynccontextmanager
+    async def create_lock(self) -> AsyncIterator[None]:
+        """トークンの作成をホスト上の全プロセスで直列化するロック"""
+        future = asyncio.get_running_loop().run_in_executor(
+            None, open_locked, f"{self.path}.create.lock"
+        )
+        try:
+            handle = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # 待っている間に中断された場合は取れた時点で手放す
+            future.add_done_callback(
+                lambda f: f.exception() is None and f.result().close()
+            )
+            raise
+        try:
+            yield
+        finally:
+            handle.close()
+
+    @staticmethod
+    async def _run(func: Any, *args: Any) -> Any:
+        """スレッドプールで実行して結果を返す"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+
+class SqliteTokenStore(TokenStore):
+    """SQLiteにトークンを1行ずつ保存するバックエンド
+
+    追加と更新は対象の行だけを書き換える。書き込みのたびに増える
+    リビジョンを比べて他のプロセスの更新を検出する。トークンを
+    保存するため、ファイルは所有者のみ読み書きできるようにする。
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        super().__init__(path)
+        self._timeout = timeout
+        self._revision: Optional[int] = None
+        with closing(self._connect()) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tokens (
+                    token TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    added REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS revision (value INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "INSERT INTO revision (value) SELECT 0 "
+                "WHERE NOT EXISTS (SELECT 1 FROM revision)"
+            )
+        os.chmod(path, 0o600)
+
+    def load_tokens(self) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            return self._read(conn)
+
+    async def changed(self) -> bool:
+        return await self._run(self._current_revision) != self._revision
+
+    async def add(self, token: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return await self._run(self._write, token["token"], token, True)
+
+    async def update(
+        self, token: str, changes: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        return await self._run(self._write, token, changes, False)
+
+    def _connect(self) -> sqlite3.Connection:
+        """操作ごとに接続する（スレッドをまたいで共有しない）"""
+        conn = sqlite3.connect(
+            self.path, timeout=self._timeout, isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _current_revision(self) -> int:
+        """保存されているリビジョン"""
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT value FROM revision").fetchone()[0]
+
+    def _read(self, conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+        """全トークンを追加順に読み込み、リビジョンを記録"""
+        conn.execute("BEGIN")
+        try:
+            self._revision = conn.execute(
+                "SELECT value FROM revision"
+            ).fetchone()[0]
+            rows = conn.execute("SELECT data FROM tokens ORDER BY added")
+            return [json.loads(row["data"]) for row in rows]
+        finally:
+            conn.execute("COMMIT")
+
+    def _write(
+        self, token: str, changes: Dict[str, Any], insert: bool
+    ) -> List[Dict[str, Any]]:
+        """1つのトークンを追加または更新"""
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT data FROM tokens WHERE token = ?", (token,)
+                ).fetchone()
+                if row is not None or insert:
+                    record = json.loads(row["data"]) if row else {}
+                    merge_token(record, changes)
+                    conn.execute(
+                        """
+                        INSERT INTO tokens (token, data, added)
+                        VALUES (?, ?, ?)
+                        ON CONFLICT (token) DO UPDATE SET data = excluded.data
+                        """,
+                        (token, json.dumps(record), time.time()),
+                    )
+                    conn.execute("UPDATE revision SET value = value + 1")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return self._read(conn)
@@ -1,3 +1,702 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
+
+from aiohttp import web
+
+from ..downloader.archive import ARCHIVE_FORMATS
+from ..downloader.concurrency import ConcurrencyController
+from ..downloader.content_cache import ContentCache
+from ..downloader.dedup_store import LINK_MODES, DedupStore
+from ..downloader.go_file_downloader import GoFileDownloader
+from ..downloader.progress import MODES, ProgressTracker
+from ..downloader.retry import RetryPolicy
+from ..downloader.scheduler import DownloadScheduler
+from ..downloader.stream import stdout_sink
+from ..downloader.work_queue import FAILED, WorkQueue
+from ..downloader.writer import WRITERS, create_writer
+from ..logger import Logger
+from ..metrics import MetricsRegistry
+from ..service.job_store import JobStore
+from ..service.server import DownloadService, create_app, is_loopback
+from ..session import ConnectionPoolConfig, ConnectionStats, create_session
+from ..token.account_status import QuotaPolicy
+from ..token.token_manager import TokenManager
+from ..token.token_pool import TokenPool
+
+Job = Tuple[str, Optional[str]]
+
+RATE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+# --token の既定値（ワーカープロセスへもこれで渡す）
+TOKEN_ENV = "GOFILE_DL_TOKEN"  # noqa: S105
+
+
+def _parse_bytes(value: str, kind: str) -> float:
+    """``500K`` や ``10M`` のような指定をバイト数に変換"""
+    number, unit = value[:-1], value[-1:].upper()
+    if unit not in RATE_UNITS:
+        number, unit = value, ""
+    try:
+        amount = float(number) * RATE_UNITS[unit]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid {kind}: {value!r}"
+        ) from None
+    if amount <= 0:
+        raise argparse.ArgumentTypeError(f"{kind} must be positive: {value!r}")
+    return amount
+
+
+def parse_rate(value: str) -> float:
+    """``500K`` や ``10M`` のような帯域の指定をバイト/秒に変換"""
+    return _parse_bytes(value, "rate")
+
+
+def parse_size(value: str) -> int:
+    """``500M`` や ``20G`` のような大きさの指定をバイト数に変換"""
+    return int(_parse_bytes(value, "size"))
+
+
+def parse_traffic_limit(value: str) -> Tuple[str, int]:
+    """``[ティア=]大きさ`` をティアとバイト数に変換（ティアの既定は ``*``）"""
+    tier, _, size = value.rpartition("=")
+    return tier or "*", parse_size(size)
+
+
 class CLI:
+    """複数のGoFile URLを1つのセッションでダウンロードするCLI
+
+    URLは引数、ファイル、標準入力から受け付ける。入力の各行は
+    ``<URLまたはID> [パスワード]`` の形式で、空行と ``#`` で始まる行は
+    無視する。終了時に機械可読なJSONのサマリーを出力する。
+    """
+
     def __init__(self) -> None:
-        pass
+        self._parser = self._build_parser()
+
+    def run(self, argv: Optional[Sequence[str]] = None) -> int:
+        """CLIを実行して終了コードを返す"""
+        args = self._parser.parse_args(argv)
+        if args.serve:
+            host = args.listen.rpartition(":")[0]
+            if not args.api_token and not is_loopback(host or "127.0.0.1"):
+                self._parser.error(
+                    "--listen on a non-loopback address requires --api-token"
+                )
+            asyncio.run(self._serve(args))
+            return 0
+        jobs: List[Job] = [(url, args.password) for url in args.urls]
+        if args.input:
+            jobs.extend(self._read_jobs(args.input))
+        if args.queue:
+            summary = asyncio.run(self._run_queue(jobs, args))
+            self._write_summary(summary, args.summary)
+            return 0 if summary["queue"][FAILED] == 0 else 1
+        if not jobs:
+            self._parser.error("no URLs or IDs given")
+        if args.stdout and len(jobs) != 1:
+            self._parser.error("--stdout takes exactly one URL or ID")
+
+        summary = asyncio.run(self._run_jobs(jobs, args))
+        # --stdout では標準出力をファイルの内容に使う
+        stream = sys.stderr if args.stdout else sys.stdout
+        self._write_summary(summary, args.summary, stream)
+        return 0 if summary["failed"] == 0 else 1
+
+    @staticmethod
+    def _build_parser() -> argparse.ArgumentParser:
+        """引数パーサーを生成"""
+        parser = argparse.ArgumentParser(
+            prog="gofile-dl", description="Download files from gofile.io"
+        )
+        parser.add_argument("urls", nargs="*", help="GoFile URLs or IDs")
+        parser.add_argument(
+            "-i",
+            "--input",
+            help="file with one '<url> [password]' per line ('-' for stdin)",
+        )
+        parser.add_argument("-p", "--password", help="password for URLs")
+        parser.add_argument(
+            "-o", "--output", default="./downloads", help="output directory"
+        )
+        parser.add_argument(
+            "-t",
+            "--token",
+            default=os.getenv(TOKEN_ENV),
+            help=f"GoFile API token (default: ${TOKEN_ENV})",
+        )
+        parser.add_argument(
+            "--token-file",
+            default=os.getenv("TOKEN_FILE_PATH", "tokens.json"),
+            help="token store shared by all processes on this host "
+            "(*.sqlite for SQLite, else JSON)",
+        )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=4,
+            help="number of URLs processed at the same time",
+        )
+        parser.add_argument(
+            "-c",
+            "--connections",
+            type=int,
+            default=10,
+            help="maximum number of concurrent connections",
+        )
+        parser.add_argument(
+            "--adaptive",
+            action="store_true",
+            help="start at --connections and tune it from the throughput",
+        )
+        parser.add_argument(
+            "--max-connections",
+            type=int,
+            default=64,
+            help="upper bound for --adaptive",
+        )
+        parser.add_argument(
+            "--token-pool",
+            type=int,
+            default=1,
+            help="spread requests across this many tokens",
+        )
+        parser.add_argument(
+            "--traffic-limit",
+            type=parse_traffic_limit,
+            action="append",
+            help="with --token-pool, traffic allowed per account "
+            "('[tier=]size', e.g. 100G or guest=100G); accounts near it "
+            "are avoided and replaced",
+        )
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=5,
+            help="attempts per file before giving up",
+        )
+        parser.add_argument(
+            "--read-timeout",
+            type=float,
+            default=60.0,
+            help="seconds without receiving data before a transfer fails "
+            "(the whole transfer has no time limit)",
+        )
+        parser.add_argument(
+            "--limit-rate",
+            type=parse_rate,
+            help="maximum total download speed in bytes/s (e.g. 500K, 10M); "
+            "with --workers it is split between this host's processes",
+        )
+        parser.add_argument(
+            "--writer",
+            choices=WRITERS,
+            default="auto",
+            help="disk write backend",
+        )
+        parser.add_argument(
+            "--cache-ttl",
+            type=float,
+            default=300.0,
+            help="seconds to reuse a fetched content listing "
+            "(0 disables the cache)",
+        )
+        parser.add_argument(
+            "--cache-dir",
+            help="also keep content listings in this directory across runs",
+        )
+        parser.add_argument(
+            "--dedup-store",
+            help="link files with a known md5/size from this directory "
+            "instead of downloading them, and add new downloads to it",
+        )
+        parser.add_argument(
+            "--dedup-max-size",
+            type=parse_size,
+            help="with --dedup-store, evict least recently used files "
+            "above this size (e.g. 500G)",
+        )
+        parser.add_argument(
+            "--link-mode",
+            choices=LINK_MODES,
+            default="auto",
+            help="how --dedup-store places files "
+            "(auto tries reflink, then hardlink, then copy)",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="only download files added or changed since the last sync",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="with --sync, delete local files removed from GoFile",
+        )
+        parser.add_argument(
+            "--archive",
+            choices=ARCHIVE_FORMATS,
+            help="write each URL as one <output>/<id>.<format> archive",
+        )
+        parser.add_argument(
+            "--stdout",
+            action="store_true",
+            help="write a single file (or --archive) to stdout",
+        )
+        parser.add_argument(
+            "--path",
+            help="with --stdout, the file to write when the URL is a folder",
+        )
+        parser.add_argument(
+            "--queue",
+            help="share the files of the URLs through this work queue "
+            "(SQLite on a shared volume); without URLs, only work on it",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="with --queue, worker processes to run on this host",
+        )
+        parser.add_argument(
+            "--serve",
+            action="store_true",
+            help="run as a service that takes jobs over HTTP",
+        )
+        parser.add_argument(
+            "--listen",
+            default="127.0.0.1:8765",
+            help="with --serve, the address to listen on",
+        )
+        parser.add_argument(
+            "--api-token",
+            default=os.getenv("GOFILE_DL_API_TOKEN"),
+            help="with --serve, require 'Authorization: Bearer <token>' "
+            "(required to listen on a non-loopback address)",
+        )
+        parser.add_argument(
+            "--state",
+            help="with --serve, the job database "
+            "(default: <output>/.gofile-jobs.sqlite)",
+        )
+        parser.add_argument(
+            "--progress",
+            choices=MODES,
+            default="bar",
+            help="progress display ('json' writes JSON lines to stderr)",
+        )
+        parser.add_argument(
+            "--metrics",
+            help="write metrics here (JSON for *.json, else Prometheus text)",
+        )
+        parser.add_argument(
+            "-v",
+            "--verbose",
+            action="store_true",
+            help="log every finished file with its timing",
+        )
+        parser.add_argument(
+            "--summary",
+            default="-",
+            help="where to write the JSON summary ('-' for stdout)",
+        )
+        return parser
+
+    @staticmethod
+    def _read_jobs(source: str) -> List[Job]:
+        """入力ファイルまたは標準入力からジョブを読み込む"""
+        if source == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(source, "r") as f:
+                lines = f.read().splitlines()
+
+        jobs = []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split(maxsplit=1)
+            jobs.append((parts[0], parts[1] if len(parts) > 1 else None))
+        return jobs
+
+    async def _run_jobs(
+        self, jobs: List[Job], args: argparse.Namespace
+    ) -> Dict[str, Any]:
+        """全ジョブを1つのセッションとトークンで実行"""
+        started = time.monotonic()
+        stats = ConnectionStats()
+        async with self._open_downloader(args, stats) as downloader:
+            semaphore = asyncio.Semaphore(max(1, args.jobs))
+
+            async def run_job(url: str, password: Optional[str]):
+                async with semaphore:
+                    return await self._run_job(downloader, url, password, args)
+
+            results = await asyncio.gather(
+                *(run_job(url, password) for url, password in jobs)
+            )
+
+        failed = sum(1 for result in results if result["status"] != "success")
+        summary = {
+            "total": len(results),
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "elapsed": round(time.monotonic() - started, 3),
+            "connections": stats.as_dict(),
+            "jobs": results,
+        }
+        if downloader.concurrency:
+            summary["concurrency"] = downloader.concurrency.limit
+        return summary
+
+    async def _run_queue(
+        self, jobs: List[Job], args: argparse.Namespace
+    ) -> Dict[str, Any]:
+        """URLをワークキューに登録し、複数のプロセスで分担する"""
+        started = time.monotonic()
+        with WorkQueue(args.queue) as queue:
+            async with self._open_downloader(args) as downloader:
+                if args.limit_rate:
+                    # 全体の制限をこのホストのプロセスで等分する
+                    downloader.rate_limiter.rate = self._worker_rate(args)
+                published = [
+                    await downloader.publish(url, queue, password)
+                    for url, password in jobs
+                ]
+                # 残りのワーカーは別のプロセスで動かし、複数のコアを使う
+                workers = [
+                    await asyncio.create_subprocess_exec(
+                        sys.executable,
+                        "-m",
+                        "gofile_dl",
+                        *self._worker_argv(args),
+                        env=self._worker_env(args),
+                    )
+                    for _ in range(max(1, args.workers) - 1)
+                ]
+                try:
+                    result = await downloader.work(queue, args.output)
+                finally:
+                    await asyncio.gather(
+                        *(worker.wait() for worker in workers)
+                    )
+            return {
+                "published": published,
+                "worker": {
+                    "id": result["worker"],
+                    "status": result["status"],
+                    "message": result["message"],
+                    "files": len(result["files"]),
+                    "errors": result["errors"],
+                },
+                "workers": len(workers) + 1,
+                "queue": await queue.counts(),
+                "elapsed": round(time.monotonic() - started, 3),
+            }
+
+    @staticmethod
+    def _worker_argv(args: argparse.Namespace) -> List[str]:
+        """ワーカープロセスに渡す引数"""
+        argv = [
+            "--queue",
+            args.queue,
+            "--output",
+            args.output,
+            "--connections",
+            str(args.connections),
+            "--retries",
+            str(args.retries),
+            "--read-timeout",
+            str(args.read_timeout),
+            "--writer",
+            args.writer,
+            "--token-pool",
+            str(args.token_pool),
+            "--token-file",
+            args.token_file,
+            "--progress",
+            "none",
+            "--summary",
+            os.devnull,
+        ]
+        if args.limit_rate:
+            argv += ["--limit-rate", str(CLI._worker_rate(args))]
+        if args.adaptive:
+            argv += ["--adaptive"]
+            argv += ["--max-connections", str(args.max_connections)]
+        if args.dedup_store:
+            argv += ["--dedup-store", args.dedup_store]
+            argv += ["--link-mode", args.link_mode]
+        for tier, size in args.traffic_limit or ():
+            argv += ["--traffic-limit", f"{tier}={size}"]
+        if args.dedup_max_size:
+            argv += ["--dedup-max-size", str(args.dedup_max_size)]
+        return argv
+
+    @staticmethod
+    def _content_cache(args: argparse.Namespace) -> Optional[ContentCache]:
+        """--cache-ttl と --cache-dir からコンテンツのキャッシュを生成"""
+        if args.cache_ttl <= 0:
+            return None
+        return ContentCache(ttl=args.cache_ttl, cache_dir=args.cache_dir)
+
+    @staticmethod
+    def _worker_env(args: argparse.Namespace) -> Dict[str, str]:
+        """ワーカープロセスの環境変数
+
+        トークンはコマンドラインに載せると他のユーザーから見えるため、
+        環境変数で渡す。
+        """
+        env = dict(os.environ)
+        if args.token:
+            env[TOKEN_ENV] = args.token
+        return env
+
+    @staticmethod
+    def _worker_rate(args: argparse.Namespace) -> float:
+        """--limit-rate を --workers のプロセス数で割った1プロセスの帯域"""
+        return args.limit_rate / max(1, args.workers)
+
+    async def _serve(self, args: argparse.Namespace) -> None:
+        """ジョブを受け付けるサービスを停止されるまで実行"""
+        host, _, port = args.listen.rpartition(":")
+        state = args.state or str(Path(args.output) / ".gofile-jobs.sqlite")
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            # Windowsではシグナルハンドラーを登録できない
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(signum, stopped.set)
+
+        async with self._open_downloader(args) as downloader:
+            with JobStore(state) as store:
+                service = DownloadService(downloader, store, args.jobs)
+                runner = web.AppRunner(
+                    create_app(
+                        service,
+                        downloader.metrics,
+                        args.output,
+                        args.api_token,
+                    )
+                )
+                await runner.setup()
+                try:
+                    await web.TCPSite(
+                        runner, host or "127.0.0.1", int(port)
+                    ).start()
+                    await service.start()
+                    await stopped.wait()
+                finally:
+                    await service.stop()
+                    await runner.cleanup()
+
+    @contextlib.asynccontextmanager
+    async def _open_downloader(
+        self,
+        args: argparse.Namespace,
+        stats: Optional[ConnectionStats] = None,
+    ) -> AsyncIterator[GoFileDownloader]:
+        """引数の設定でセッションとダウンローダーを用意"""
+        max_connections = args.connections
+        if args.adaptive:
+            max_connections = max(args.connections, args.max_connections)
+        config = ConnectionPoolConfig(
+            limit=max_connections, read_timeout=args.read_timeout
+        )
+        progress = ProgressTracker(args.progress)
+        writer = create_writer(args.writer)
+        logger = Logger("gofile_dl")
+        metrics = None
+        if args.metrics or args.verbose or args.serve:
+            metrics = MetricsRegistry(logger if args.verbose else None)
+        scheduler = DownloadScheduler(args.connections, metrics=metrics)
+        concurrency = None
+        if args.adaptive:
+            concurrency = ConcurrencyController(
+                scheduler, max_limit=max_connections
+            )
+        dedup_store = None
+        if args.dedup_store:
+            dedup_store = DedupStore(
+                args.dedup_store, args.dedup_max_size, args.link_mode
+            )
+        with dedup_store or contextlib.nullcontext():
+            async with create_session(
+                config, stats, metrics
+            ) as session, progress:
+                token_manager = TokenManager(
+                    args.token_file, session=session, metrics=metrics
+                )
+                token, token_pool = args.token, None
+                if not token and args.token_pool > 1:
+                    token_pool = TokenPool(
+                        token_manager,
+                        max_size=args.token_pool,
+                        min_size=args.token_pool,
+                        quota=(
+                            QuotaPolicy(dict(args.traffic_limit))
+                            if args.traffic_limit
+                            else None
+                        ),
+                    )
+                elif not token:
+                    token = await token_manager.get_or_create_token()
+                downloader = GoFileDownloader(
+                    session,
+                    token,
+                    scheduler=scheduler,
+                    token_pool=token_pool,
+                    rate_limit=args.limit_rate,
+                    progress=progress,
+                    writer=writer,
+                    metrics=metrics,
+                    retry_policy=RetryPolicy(attempts=max(1, args.retries)),
+                    concurrency=concurrency,
+                    dedup_store=dedup_store,
+                    logger=logger,
+                    content_cache=self._content_cache(args),
+                )
+                await downloader.init()
+                yield downloader
+        writer.close()
+        if metrics and args.metrics:
+            self._write_metrics(metrics, args.metrics)
+
+    @staticmethod
+    async def _run_job(
+        downloader: GoFileDownloader,
+        url: str,
+        password: Optional[str],
+        args: argparse.Namespace,
+    ) -> Dict[str, Any]:
+        """1つのURLをダウンロードしてサマリーを返す"""
+        started = time.monotonic()
+        if args.archive:
+            result = await CLI._archive_job(downloader, url, password, args)
+        elif args.stdout:
+            return await CLI._stream_job(downloader, url, password, args)
+        elif args.sync:
+            result = await downloader.sync(
+                url, password, args.output, prune=args.prune
+            )
+        else:
+            result = await downloader.download(url, password, args.output)
+        summary = {
+            "url": url,
+            "status": result["status"],
+            "message": result["message"],
+            "files": len(result["files"]),
+            "bytes": sum(file["size"] or 0 for file in result["files"]),
+            "errors": result["errors"],
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+        if "sync" in result:
+            summary["sync"] = result["sync"]
+        return summary
+
+    @staticmethod
+    async def _archive_job(
+        downloader: GoFileDownloader,
+        url: str,
+        password: Optional[str],
+        args: argparse.Namespace,
+    ) -> Dict[str, Any]:
+        """1つのURLをアーカイブとして書き込む"""
+        if not args.stdout:
+            name = url.rstrip("/").rsplit("/", 1)[-1]
+            destination = Path(args.output) / f"{name}.{args.archive}"
+            return await downloader.download_archive(
+                url, destination, args.archive, password
+            )
+        sink = stdout_sink()
+        try:
+            return await downloader.download_archive(
+                url, sink, args.archive, password
+            )
+        finally:
+            await sink.close()
+
+    @staticmethod
+    async def _stream_job(
+        downloader: GoFileDownloader,
+        url: str,
+        password: Optional[str],
+        args: argparse.Namespace,
+    ) -> Dict[str, Any]:
+        """1つのファイルを標準出力に書き込んでサマリーを返す"""
+        started = time.monotonic()
+        sink = stdout_sink()
+        written, error = 0, None
+        try:
+            written = await downloader.stream_to(
+                url, sink, password, args.path
+            )
+        except Exception as e:
+            error = str(e)
+        finally:
+            await sink.close()
+        return {
+            "url": url,
+            "status": "error" if error else "success",
+            "message": error or f"Wrote {written} bytes to stdout",
+            "files": 0 if error else 1,
+            "bytes": written,
+            "errors": [error] if error else [],
+            "elapsed": round(time.monotonic() - started, 3),
+        }
+
+    @staticmethod
+    def _write_summary(
+        summary: Dict[str, Any],
+        destination: str,
+        stream: Optional[TextIO] = None,
+    ) -> None:
+        """サマリーをJSONで出力（``-`` の場合は stream に書く）"""
+        if destination == "-":
+            CLI._dump(summary, stream or sys.stdout)
+            return
+        with open(destination, "w") as f:
+            CLI._dump(summary, f)
+
+    @staticmethod
+    def _write_metrics(metrics: MetricsRegistry, destination: str) -> None:
+        """メトリクスをファイルに出力"""
+        with open(destination, "w") as f:
+            if destination.endswith(".json"):
+                CLI._dump(metrics.to_json(), f)
+            else:
+                f.write(metrics.to_prometheus())
+
+    @staticmethod
+    def _dump(summary: Dict[str, Any], stream: TextIO) -> None:
+        """サマリーをストリームに書き込む"""
+        json.dump(summary, stream, indent=2, ensure_ascii=False)
+        stream.write("\n")
+
+
+def main() -> None:
+    """コマンドラインのエントリーポイント"""
+    sys.exit(CLI().run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, TypeVar
+
+import pytest
+
+from benchmarks.mock_gofile import MockGofile
+from gofile_dl.downloader import GoFileAPI, GoFileDownloader, ProgressTracker
+from gofile_dl.session import create_session
+
+# 1つのテストが待つ最大秒数（止まったままのテストを失敗にする）
+TIMEOUT = 30.0
+
+T = TypeVar("T")
+
+
+@pytest.fixture
+def run() -> Callable[[Awaitable[T]], T]:
+    """コルーチンを新しいイベントループで実行（TIMEOUT 秒で失敗）"""
+
+    def runner(coro: Awaitable[T]) -> T:
+        return asyncio.run(asyncio.wait_for(coro, TIMEOUT))
+
+    return runner
+
+
+@pytest.fixture
+def mock() -> MockGofile:
+    """起動前のモックサーバー（テストでファイルを追加してから使う）"""
+    return MockGofile()
+
+
+@pytest.fixture
+def open_downloader(
+    mock: MockGofile, monkeypatch: pytest.MonkeyPatch
+) -> Callable[..., Any]:
+    """モックサーバーを起動し、そこを参照する GoFileDownloader を開く"""
+
+    @asynccontextmanager
+    async def opener(**kwargs: Any) -> AsyncIterator[GoFileDownloader]:
+        kwargs.setdefault("progress", ProgressTracker("none"))
+        async with mock, create_session() as session:
+            monkeypatch.setattr(GoFileAPI, "CONTENT_URL", mock.content_url)
+            downloader = GoFileDownloader(session, "test", **kwargs)
+            await downloader.init()
+            yield downloader
+
+    return opener
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from gofile_dl.token import account_status
+from gofile_dl.token.account_status import AccountStatusCache, QuotaPolicy
+
+
+class FakeClock:
+    """account_status の time を置き換える時計（asyncio の時計は変えない）"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Loader:
+    """呼び出しを数え、gate が開くまで返さないアカウント情報の取得"""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.error = None
+
+    async def __call__(self, token):
+        self.calls += 1
+        await self.gate.wait()
+        if self.error:
+            raise self.error
+        return {"token": token, "version": self.calls}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(account_status, "time", clock)
+    return clock
+
+
+def test_fresh_entry_is_served_without_loading(run, clock):
+    async def scenario():
+        loader = Loader()
+        cache = AccountStatusCache(loader, ttl=100)
+        first = await cache.get("a")
+        clock.now += 79
+        second = await cache.get("a")
+        return first, second, loader.calls
+
+    first, second, calls = run(scenario())
+    assert first == second == {"token": "a", "version": 1}
+    assert calls == 1
+
+
+def test_stale_entry_is_returned_while_revalidating(run, clock):
+    async def scenario():
+        loader = Loader()
+        cache = AccountStatusCache(loader, ttl=100, refresh_ahead=0.8)
+        await cache.get("a")
+        clock.now += 80
+        loader.gate.clear()
+        # 取得し直している間も古い値をすぐに返す
+        stale = await cache.get("a")
+        await asyncio.sleep(0)
+        assert loader.calls == 2
+        loader.gate.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return stale, await cache.get("a"), loader.calls
+
+    stale, fresh, calls = run(scenario())
+    assert stale["version"] == 1
+    assert fresh["version"] == 2
+    assert calls == 2
+
+
+def test_expired_entry_waits_for_one_shared_load(run, clock):
+    async def scenario():
+        loader = Loader()
+        cache = AccountStatusCache(loader, ttl=100)
+        await cache.get("a")
+        clock.now += 100
+        results = await asyncio.gather(*(cache.get("a") for _ in range(3)))
+        return results, loader.calls
+
+    results, calls = run(scenario())
+    assert [r["version"] for r in results] == [2, 2, 2]
+    assert calls == 2
+
+
+def test_failed_refresh_keeps_stale_value_until_retry(run, clock):
+    async def scenario():
+        loader = Loader()
+        cache = AccountStatusCache(loader, ttl=100, retry_after=30)
+        await cache.get("a")
+        clock.now += 100
+        loader.error = RuntimeError("down")
+        stale = await cache.get("a")
+        # retry_after の間は取得し直さない
+        clock.now += 29
+        await cache.get("a")
+        calls_during_backoff = loader.calls
+        loader.error = None
+        clock.now += 1
+        return stale, calls_during_backoff, await cache.get("a")
+
+    stale, calls_during_backoff, fresh = run(scenario())
+    assert stale["version"] == 1
+    assert calls_during_backoff == 2
+    assert fresh["version"] == 3
+
+
+def test_missing_value_raises_when_load_fails(run, clock):
+    async def scenario():
+        loader = Loader()
+        loader.error = RuntimeError("down")
+        await AccountStatusCache(loader).get("a")
+
+    with pytest.raises(ValueError, match="down"):
+        run(scenario())
+
+
+def test_quota_policy_headroom_and_reserve():
+    policy = QuotaPolicy({"guest": 1000, "*": 5000}, reserve=0.1)
+    guest = {"tier": "guest", "statsCurrent": {"trafficWebDownloaded": 800}}
+
+    assert policy.headroom(guest) == 200
+    assert not policy.is_near_limit(guest)
+    assert policy.is_near_limit(guest, pending=150)
+    assert policy.headroom({"tier": "premium"}) == 5000
+    assert QuotaPolicy().headroom(guest) is None
+    assert not QuotaPolicy().is_near_limit(guest)
@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import tarfile
+import zipfile
+
+import pytest
+
+
+def read_archive(path, archive_format):
+    """アーカイブのエントリー名と内容を格納順に返す"""
+    if archive_format == "tar":
+        with tarfile.open(path) as archive:
+            return [
+                (member.name, archive.extractfile(member).read())
+                for member in archive.getmembers()
+            ]
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        return [(name, archive.read(name)) for name in archive.namelist()]
+
+
+@pytest.mark.parametrize("archive_format", ["tar", "zip"])
+def test_archive_contains_files_in_listing_order(
+    run, mock, open_downloader, tmp_path, archive_format
+):
+    root = mock.add_folder("root")
+    parents = [root, mock.add_folder("a", root), mock.add_folder("b", root)]
+    file_ids = [
+        mock.add_file(parents[i % 3], f"file{i}.bin", 200 * 1024)
+        for i in range(12)
+    ]
+    path = tmp_path / f"share.{archive_format}"
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            return await downloader.download_archive(
+                root,
+                path,
+                archive_format,
+                max_buffered_files=4,
+                buffer_size=64 * 1024,
+            )
+
+    result = run(scenario())
+    assert result["status"] == "success", result
+    entries = read_archive(path, archive_format)
+    assert [name for name, _ in entries] == [
+        file["filename"] for file in result["files"]
+    ]
+    digests = {hashlib.md5(data).hexdigest() for _, data in entries}  # noqa: S324
+    assert len(entries) == 12
+    assert digests == {mock.describe(i)["md5"] for i in file_ids}
+
+
+def test_large_entry_between_small_ones_does_not_stall(
+    run, mock, open_downloader, tmp_path
+):
+    # 後ろの小さいファイルが接続枠を埋めても、先頭の大きいファイルが
+    # 開始されなければアーカイブへの追加が進まない
+    root = mock.add_folder("root")
+    sizes = [256 * 1024] * 2 + [1024 * 1024] + [256 * 1024] * 4
+    for i, size in enumerate(sizes):
+        mock.add_file(root, f"file{i}.bin", size)
+    path = tmp_path / "share.tar"
+
+    async def scenario():
+        async with open_downloader(max_concurrent_downloads=2) as downloader:
+            return await asyncio.wait_for(
+                downloader.download_archive(
+                    root,
+                    path,
+                    max_buffered_files=6,
+                    buffer_size=64 * 1024,
+                ),
+                10,
+            )
+
+    result = run(scenario())
+    assert result["status"] == "success", result
+    names = [name for name, _ in read_archive(path, "tar")]
+    assert [name.rsplit("/", 1)[-1] for name in names] == [
+        f"file{i}.bin" for i in range(len(sizes))
+    ]
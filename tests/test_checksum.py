@@ -0,0 +1,70 @@
+import hashlib
+import os
+
+from gofile_dl.downloader import checksum
+from gofile_dl.downloader.checksum import ChecksumIndex, is_identical
+
+
+def rehash_counter(monkeypatch):
+    """ファイルのハッシュを計算した回数を数える"""
+    calls = []
+    original = checksum._file_md5
+
+    def counting(path):
+        calls.append(path)
+        return original(path)
+
+    monkeypatch.setattr(checksum, "_file_md5", counting)
+    return calls
+
+
+def test_identical_file_is_skipped_on_rerun(
+    run, mock, open_downloader, tmp_path, monkeypatch
+):
+    root = mock.add_folder("root")
+    mock.add_file(root, "a.bin", 64 * 1024)
+    calls = rehash_counter(monkeypatch)
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            await downloader.download(root, output_dir=str(tmp_path))
+            return await downloader.download(root, output_dir=str(tmp_path))
+
+    result = run(scenario())
+    assert result["status"] == "success", result
+    assert [f["skipped"] for f in result["files"]] == [True]
+    assert mock.stats["downloads"] == 1
+    # ダウンロード時に検証したMD5を使い、読み直さない
+    assert calls == []
+
+
+def test_index_is_trusted_only_while_size_and_mtime_match(
+    run, tmp_path, monkeypatch
+):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"a" * 100)
+    md5 = hashlib.md5(b"a" * 100).hexdigest()  # noqa: S324
+    index = ChecksumIndex(tmp_path / ChecksumIndex.FILE_NAME)
+    calls = rehash_counter(monkeypatch)
+
+    async def scenario():
+        first = await is_identical(path, 100, md5, index)
+        second = await is_identical(path, 100, md5, index)
+        # 同じサイズのまま書き換えられたファイルは計算し直す
+        path.write_bytes(b"b" * 100)
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        third = await is_identical(path, 100, md5, index)
+        return first, second, third
+
+    assert run(scenario()) == (True, True, False)
+    assert calls == [path, path]
+
+
+def test_size_mismatch_is_not_hashed(run, tmp_path, monkeypatch):
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"a" * 100)
+    calls = rehash_counter(monkeypatch)
+
+    assert not run(is_identical(path, 101, "0" * 32))
+    assert calls == []
@@ -0,0 +1,43 @@
+from gofile_dl.ui.cli import CLI, TOKEN_ENV
+
+
+def test_worker_argv_forwards_throttling_and_concurrency():
+    parser = CLI()._parser
+    args = parser.parse_args(
+        [
+            "XXXXXX",
+            "--token",
+            "secret",
+            "--queue",
+            "queue.sqlite",
+            "--workers",
+            "4",
+            "--limit-rate",
+            "40M",
+            "--adaptive",
+            "--max-connections",
+            "32",
+            "--read-timeout",
+            "120",
+        ]
+    )
+    worker = parser.parse_args(CLI._worker_argv(args))
+    # 全体の帯域はこのホストの4プロセスで等分する
+    assert worker.limit_rate == 10 * 1024 * 1024
+    assert worker.adaptive
+    assert worker.max_connections == 32
+    assert worker.connections == args.connections
+    assert worker.read_timeout == 120
+    assert worker.urls == []
+    # トークンはコマンドラインではなく環境変数で渡す
+    assert "secret" not in CLI._worker_argv(args)
+    env = CLI._worker_env(args)
+    assert env[TOKEN_ENV] == args.token
+
+
+def test_worker_argv_without_limits():
+    parser = CLI()._parser
+    args = parser.parse_args(["--queue", "queue.sqlite", "--workers", "2"])
+    worker = parser.parse_args(CLI._worker_argv(args))
+    assert worker.limit_rate is None
+    assert not worker.adaptive
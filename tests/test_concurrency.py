@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from gofile_dl.downloader.concurrency import ConcurrencyController
+
+
+class FakeScheduler:
+    """上限と待機数だけを持つ DownloadScheduler の代わり"""
+
+    def __init__(self, max_connections, pending=1, active=1):
+        self.max_connections = max_connections
+        self.pending = pending
+        self.active = active
+
+
+def controller(limit=4, **kwargs):
+    scheduler = FakeScheduler(limit)
+    kwargs.setdefault("hold", 2)
+    return scheduler, ConcurrencyController(scheduler, **kwargs)
+
+
+def test_limit_grows_while_throughput_improves():
+    scheduler, control = controller()
+    control._adjust(100.0, 0.0)
+    control._adjust(110.0, 0.0)
+    assert scheduler.max_connections == 6
+
+
+def test_limit_steps_back_and_holds_when_throughput_stalls():
+    scheduler, control = controller()
+    control._adjust(100.0, 0.0)
+    # 5% 以上伸びなければ増やした分を戻す
+    control._adjust(104.0, 0.0)
+    assert scheduler.max_connections == 4
+    # hold 回の間は増やさない
+    control._adjust(104.0, 0.0)
+    control._adjust(104.0, 0.0)
+    assert scheduler.max_connections == 4
+    control._adjust(104.0, 0.0)
+    assert scheduler.max_connections == 5
+
+
+def test_errors_halve_the_limit_within_range():
+    scheduler, control = controller(limit=8, min_limit=3)
+    control._adjust(100.0, 0.2)
+    assert scheduler.max_connections == 4
+    control._adjust(100.0, 0.5)
+    assert scheduler.max_connections == 3
+
+
+def test_limit_is_kept_without_waiting_transfers():
+    scheduler, control = controller()
+    scheduler.pending = 0
+    control._adjust(100.0, 0.0)
+    assert scheduler.max_connections == 4
+
+
+def test_limit_never_exceeds_maximum():
+    scheduler, control = controller(limit=4, max_limit=5)
+    for throughput in (100.0, 200.0, 400.0):
+        control._adjust(throughput, 0.0)
+    assert scheduler.max_connections == 5
+
+
+def test_recorded_errors_drive_the_next_interval(run):
+    scheduler, control = controller(limit=8, interval=0.01)
+
+    async def scenario():
+        control.record_bytes(1024)
+        control.record_success()
+        await asyncio.sleep(0.02)
+        control.record_error()
+
+    run(scenario())
+    # 区間内の転送の半分が失敗したので乗算的に減らす
+    assert scheduler.max_connections == 4
+
+
+def test_chunk_size_follows_per_transfer_throughput():
+    scheduler, control = controller()
+    scheduler.active = 2
+    control._update_chunk_size(10 * 1024 * 1024)
+    # 1本あたり 5MiB/s の0.1秒分（512KiB）
+    assert control.chunk_size == 512 * 1024
+    control._update_chunk_size(10**12)
+    assert control.chunk_size == 4 * 1024 * 1024
+
+
+def test_invalid_range_is_rejected():
+    with pytest.raises(ValueError):
+        ConcurrencyController(FakeScheduler(4), min_limit=5, max_limit=2)
@@ -0,0 +1,113 @@
+import asyncio
+import hashlib
+import stat
+
+from gofile_dl.downloader import GoFileDownloader, ProgressTracker
+from gofile_dl.downloader.content_cache import ContentCache
+from gofile_dl.ui.cli import CLI
+
+
+def test_entry_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.time", lambda: now[0])
+    cache = ContentCache(ttl=10)
+    cache.set("a:", {"id": "a"})
+
+    now[0] += 10
+    assert cache.get("a:") == {"id": "a"}
+    now[0] += 1
+    assert cache.get("a:") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ContentCache(max_entries=2)
+    cache.set("a:", {"id": "a"})
+    cache.set("b:", {"id": "b"})
+    # a を参照したので、次に追い出されるのは b
+    assert cache.get("a:") is not None
+    cache.set("c:", {"id": "c"})
+
+    assert cache.get("a:") is not None
+    assert cache.get("b:") is None
+    assert cache.get("c:") is not None
+
+
+def test_concurrent_loads_share_one_request(run):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": "a"}
+
+    async def scenario():
+        cache = ContentCache()
+        return await asyncio.gather(
+            *(cache.get_or_load("a:", loader) for _ in range(3))
+        )
+
+    assert run(scenario()) == [{"id": "a"}] * 3
+    assert calls == [1]
+
+
+def test_disk_cache_is_private_and_survives_restart(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache = ContentCache(cache_dir=cache_dir)
+    key = cache.make_key("a", "hunter2")
+    cache.set(key, {"id": "a"})
+
+    restarted = ContentCache(cache_dir=cache_dir)
+    assert restarted.make_key("a", "hunter2") == key
+    assert restarted.get(key) == {"id": "a"}
+    assert stat.S_IMODE(cache_dir.stat().st_mode) == 0o700
+    for path in cache_dir.iterdir():
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+
+def test_password_is_not_stored_as_plain_hash(tmp_path):
+    cache = ContentCache(cache_dir=tmp_path)
+    cache.set(cache.make_key("a", "hunter2"), {"id": "a"})
+
+    plain = hashlib.sha256(b"hunter2").hexdigest()
+    for path in tmp_path.iterdir():
+        assert plain.encode() not in path.read_bytes()
+    assert cache.make_key("a", "hunter2") != ContentCache().make_key(
+        "a", "hunter2"
+    )
+
+
+def test_cli_reuses_cached_listing_across_runs(
+    run, mock, open_downloader, tmp_path
+):
+    root = mock.add_folder("root")
+    mock.add_file(root, "a.bin", 1024)
+    args = CLI()._parser.parse_args(
+        ["--cache-dir", str(tmp_path / "cache"), "x"]
+    )
+
+    async def scenario():
+        async with open_downloader(
+            content_cache=CLI._content_cache(args)
+        ) as first:
+            await first.download(root, output_dir=str(tmp_path / "one"))
+            # 再起動後の実行はディスクのキャッシュから一覧を読む
+            second = GoFileDownloader(
+                first.session,
+                "test",
+                progress=ProgressTracker("none"),
+                content_cache=CLI._content_cache(args),
+            )
+            await second.init()
+            return await second.download(
+                root, output_dir=str(tmp_path / "two")
+            )
+
+    result = run(scenario())
+    assert result["status"] == "success", result
+
+    assert mock.stats["contents"] == 1
+
+
+def test_cli_cache_can_be_disabled():
+    args = CLI()._parser.parse_args(["--cache-ttl", "0", "x"])
+    assert CLI._content_cache(args) is None
@@ -0,0 +1,89 @@
+import hashlib
+import os
+import sqlite3
+
+from gofile_dl.downloader import FileEntry
+from gofile_dl.downloader.dedup_store import DedupStore
+
+
+def write(path, data):
+    path.write_bytes(data)
+    digest = hashlib.md5(data).hexdigest()  # noqa: S324
+    return FileEntry(
+        path.name, "http://store/x", len(data), digest, path.name, None
+    )
+
+
+def test_stored_file_is_linked(run, tmp_path):
+    entry = write(tmp_path / "a.bin", b"a" * 100)
+
+    async def scenario():
+        store = DedupStore(tmp_path / "store", link_mode="copy")
+        assert not await store.link(entry, tmp_path / "b.bin")
+        assert await store.add(entry, tmp_path / "a.bin")
+        assert await store.link(entry, tmp_path / "b.bin")
+        return await store.total_bytes()
+
+    assert run(scenario()) == 100
+    assert (tmp_path / "b.bin").read_bytes() == b"a" * 100
+
+
+def test_least_recently_used_files_are_evicted(run, tmp_path):
+    entries = [
+        write(tmp_path / f"{i}.bin", bytes([i]) * 100) for i in range(3)
+    ]
+
+    async def scenario():
+        store = DedupStore(tmp_path / "store", max_bytes=250, link_mode="copy")
+        for entry in entries[:2]:
+            await store.add(entry, tmp_path / entry.name)
+        # 0 を使ったので 1 が最も長く使われていない
+        assert await store.link(entries[0], tmp_path / "copy.bin")
+        await store.add(entries[2], tmp_path / entries[2].name)
+        linked = [
+            await store.link(entry, tmp_path / "out.bin") for entry in entries
+        ]
+        return linked, await store.total_bytes()
+
+    assert run(scenario()) == ([True, False, True], 200)
+
+
+def test_edited_hardlink_target_is_dropped(run, tmp_path):
+    path = tmp_path / "a.bin"
+    entry = write(path, b"a" * 100)
+
+    async def scenario():
+        store = DedupStore(tmp_path / "store", link_mode="hardlink")
+        await store.add(entry, path)
+        # 保存先を書き換えるとストアの中身も変わる
+        with open(path, "r+b") as f:
+            f.write(b"b" * 200)
+        os.utime(path, ns=(1, 1))
+        linked = await store.link(entry, tmp_path / "b.bin")
+        return linked, await store.total_bytes()
+
+    assert run(scenario()) == (False, 0)
+    assert not (tmp_path / "b.bin").exists()
+
+
+def test_store_failure_does_not_fail_the_download(
+    run, mock, open_downloader, tmp_path, monkeypatch
+):
+    root = mock.add_folder("root")
+    mock.add_file(root, "a.bin", 64 * 1024)
+    store = DedupStore(tmp_path / "store")
+
+    async def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "add", locked)
+
+    async def scenario():
+        async with open_downloader(dedup_store=store) as downloader:
+            return await downloader.download(
+                root, output_dir=str(tmp_path / "out")
+            )
+
+    result = run(scenario())
+    assert result["status"] == "success", result
+    assert not result["errors"]
@@ -0,0 +1,174 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from benchmarks.mock_gofile import MockGofile
+from gofile_dl.downloader import FileDownloader, ProgressTracker
+from gofile_dl.downloader.journal import DownloadJournal
+from gofile_dl.session import create_session
+
+MiB = 1024 * 1024
+
+
+async def download(
+    mock: MockGofile, file_id: str, path: Path, **kwargs
+) -> bool:
+    """モックサーバーのファイルを FileDownloader でダウンロード"""
+    info = mock.describe(file_id)
+    kwargs.setdefault("progress", ProgressTracker("none"))
+    async with create_session() as session:
+        downloader = FileDownloader(session, "test", **kwargs)
+        return await downloader.download_file(
+            info["link"], path, info["size"], info["md5"]
+        )
+
+
+def test_segmented_download(run, mock, tmp_path):
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", 4 * MiB)
+    path = tmp_path / "a.bin"
+
+    async def scenario():
+        async with mock:
+            return await download(
+                mock, file_id, path, segments=4, min_segment_size=MiB
+            )
+
+    assert run(scenario())
+    assert path.read_bytes() == mock.content(file_id)
+    assert mock.stats["downloads"] == 4
+    assert not list(tmp_path.glob("*.part*"))
+
+
+def test_falls_back_without_range_support(run, mock, tmp_path):
+    mock.config.range_support = False
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", 4 * MiB)
+    path = tmp_path / "a.bin"
+
+    async def scenario():
+        async with mock:
+            return await download(
+                mock, file_id, path, segments=4, min_segment_size=MiB
+            )
+
+    assert run(scenario())
+    assert path.read_bytes() == mock.content(file_id)
+    assert mock.stats["bytes_sent"] == 4 * MiB
+
+
+@pytest.mark.parametrize("known_size", [True, False])
+def test_downloads_are_not_compressed(run, mock, tmp_path, known_size):
+    mock.config.compress = True
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", MiB)
+    path = tmp_path / "a.bin"
+
+    async def scenario():
+        async with mock:
+            info = mock.describe(file_id)
+            async with create_session() as session:
+                downloader = FileDownloader(
+                    session, "test", progress=ProgressTracker("none")
+                )
+                return await downloader.download_file(
+                    info["link"], path, info["size"] if known_size else None
+                )
+
+    assert run(scenario())
+    # 圧縮されると Content-Length が受信するデータの長さと一致しない
+    assert mock.stats["compressed"] == 0
+    assert path.read_bytes() == mock.content(file_id)
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_resumes_after_disconnect(run, mock, tmp_path, segments):
+    size = 4 * MiB
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", size)
+    path = tmp_path / "a.bin"
+    options = {
+        "segments": segments,
+        "min_segment_size": MiB,
+        "chunk_size": 64 * 1024,
+        "journal_interval": 256 * 1024,
+    }
+
+    async def scenario():
+        async with mock:
+            # 全ての転送が途中で切断される（受信済みのデータが捨てられ
+            # ないよう、データは少しずつ送る）
+            mock.config.disconnect_rate = 1.0
+            mock.config.bandwidth = 16 * MiB
+            with pytest.raises(Exception):  # noqa: B017
+                await download(mock, file_id, path, **options)
+            journal = DownloadJournal.load(path.with_suffix(".bin.part"), size)
+            sent = mock.stats["bytes_sent"]
+
+            mock.config.disconnect_rate = 0.0
+            assert await download(mock, file_id, path, **options)
+            return journal.completed_bytes, mock.stats["bytes_sent"] - sent
+
+    recorded, resent = run(scenario())
+    assert recorded > 0
+    assert resent == size - recorded
+    assert path.read_bytes() == mock.content(file_id)
+
+
+@pytest.mark.parametrize("segments", [1, 4])
+def test_resumes_after_cancel(run, mock, tmp_path, segments):
+    size = 8 * MiB
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", size)
+    path = tmp_path / "a.bin"
+    options = {
+        "segments": segments,
+        "min_segment_size": MiB,
+        "chunk_size": 64 * 1024,
+        # 一定間隔の記録に頼らず、キャンセル時の記録だけを確かめる
+        "journal_interval": 64 * MiB,
+    }
+
+    async def scenario():
+        async with mock:
+            mock.config.bandwidth = 4 * MiB
+            task = asyncio.ensure_future(
+                download(mock, file_id, path, **options)
+            )
+            while mock.stats["bytes_sent"] < 2 * MiB:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # サーバー側が切断に気付いて送信をやめるまで待つ
+            sent = -1
+            while sent != mock.stats["bytes_sent"]:
+                sent = mock.stats["bytes_sent"]
+                await asyncio.sleep(0.1)
+            journal = DownloadJournal.load(path.with_suffix(".bin.part"), size)
+
+            mock.config.bandwidth = None
+            assert await download(mock, file_id, path, **options)
+            return sent, journal.completed_bytes, mock.stats["bytes_sent"]
+
+    sent, recorded, total_sent = run(scenario())
+    # 送られたデータのうち受信済みの分はキャンセル時に記録される
+    assert recorded >= sent // 2
+    assert total_sent - sent == size - recorded
+    assert path.read_bytes() == mock.content(file_id)
+
+
+def test_checksum_mismatch_discards_part_file(run, mock, tmp_path):
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", MiB)
+    path = tmp_path / "a.bin"
+
+    async def scenario():
+        async with mock, create_session() as session:
+            info = mock.describe(file_id)
+            downloader = FileDownloader(
+                session, "test", progress=ProgressTracker("none")
+            )
+            with pytest.raises(ValueError, match="Checksum mismatch"):
+                await downloader.download_file(
+                    info["link"], path, info["size"], "0" * 32
+                )
+
+    run(scenario())
+    assert not path.exists()
+    assert not list(tmp_path.glob("*.part*"))
@@ -0,0 +1,36 @@
+import stat
+
+from gofile_dl.service import JobStore
+
+
+def test_jobs_run_by_priority_then_submission(tmp_path):
+    with JobStore(tmp_path / "jobs.sqlite") as store:
+        low = store.add("a", "out")
+        high = store.add("b", "out", priority=5)
+        later = store.add("c", "out", priority=5)
+        assert store.next_queued()["id"] == high["id"]
+        assert store.next_queued(exclude=[high["id"]])["id"] == later["id"]
+        store.set_status(high["id"], "running")
+        store.set_status(later["id"], "done", {"files": []})
+        assert store.next_queued()["id"] == low["id"]
+        assert store.get(later["id"])["result"] == {"files": []}
+
+
+def test_running_jobs_are_requeued_after_restart(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    with JobStore(path) as store:
+        job = store.add("a", "out")
+        store.set_status(job["id"], "running")
+    with JobStore(path) as store:
+        assert store.requeue_running() == 1
+        assert store.get(job["id"])["status"] == "queued"
+
+
+def test_passwords_are_not_exposed(tmp_path):
+    path = tmp_path / "jobs.sqlite"
+    with JobStore(path) as store:
+        job = store.add("a", "out", password="secret")  # noqa: S106
+        assert job["has_password"]
+        assert "password" not in job
+        assert store.password(job["id"]) == "secret"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
@@ -0,0 +1,52 @@
+import pytest
+
+from gofile_dl.metrics import MetricsRegistry
+
+
+def test_histogram_value_above_top_bucket():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("seconds", "Test", (1, 10))
+    histogram.observe(0.5)
+    histogram.observe(120)
+    text = registry.to_prometheus()
+    assert 'seconds_bucket{le="1"} 1\n' in text
+    assert 'seconds_bucket{le="10"} 1\n' in text
+    assert 'seconds_bucket{le="+Inf"} 2\n' in text
+    assert "seconds_sum 120.5\n" in text
+    assert "seconds_count 2\n" in text
+    [values] = registry.to_json()["metrics"]["seconds"]["values"]
+    assert values["sum"] == 120.5
+    assert values["mean"] == 60.25
+
+
+def test_counter_labels_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Test")
+    counter.inc(endpoint='a"b')
+    counter.inc(2, endpoint='a"b')
+    assert 'requests_total{endpoint="a\\"b"} 3\n' in registry.to_prometheus()
+    # 同じ名前で登録し直しても同じメトリクスを返す
+    assert registry.counter("requests_total", "Other") is counter
+
+
+def test_track_api_records_errors():
+    registry = MetricsRegistry()
+    with registry.track_api("contents") as call:
+        call.status = "ok"
+    with pytest.raises(RuntimeError), registry.track_api("contents"):
+        raise RuntimeError
+    values = {
+        value["labels"]["status"]: value["value"]
+        for value in registry.api_requests.as_dict()
+    }
+    assert values == {"ok": 1, "error": 1}
+    assert registry.api_seconds.as_dict()[0]["count"] == 2
+
+
+def test_record_file_keeps_recent_files():
+    registry = MetricsRegistry(max_files=1)
+    registry.record_file("a", "store1", 100, 2.0, True)
+    registry.record_file("b", "store1", 100, 0.0, False)
+    assert [file["name"] for file in registry.files] == ["b"]
+    assert registry.files[0]["throughput"] is None
+    assert registry.download_throughput.as_dict()[0]["sum"] == 50
@@ -0,0 +1,99 @@
+import io
+import json
+
+import pytest
+
+from gofile_dl.downloader import ProgressTracker
+
+
+def events(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_mode_reports_start_progress_and_finish(run):
+    stream = io.StringIO()
+
+    async def scenario():
+        async with ProgressTracker("json", stream=stream) as tracker:
+            with tracker.start_file("a.bin", 100) as a:
+                a.update(60)
+                a.update(40)
+            b = tracker.start_file("b.bin", 50, initial=10)
+            b.close(success=False)
+
+    run(scenario())
+    assert [e["event"] for e in events(stream)] == [
+        "start",
+        "finish",
+        "start",
+        "finish",
+        "progress",
+    ]
+    start, finish, _, failed, progress = events(stream)
+    assert start == {
+        "event": "start",
+        "file": "a.bin",
+        "total": 100,
+        "bytes": 0,
+    }
+    assert finish["success"] and finish["bytes"] == 100
+    assert not failed["success"] and failed["bytes"] == 10
+    assert progress["bytes"] == 110
+    assert progress["total"] == 150
+    assert (progress["finished"], progress["failed"]) == (2, 1)
+
+
+def test_json_mode_aggregates_updates_per_interval(run):
+    stream = io.StringIO()
+
+    async def scenario():
+        async with ProgressTracker(
+            "json", interval=3600, stream=stream
+        ) as tracker:
+            progress = tracker.start_file("a.bin", 1000)
+            # 間隔内の更新は出力せず、カウンターを増やすだけ
+            for _ in range(100):
+                progress.update(10)
+            assert stream.getvalue() == ""
+            progress.close()
+
+    run(scenario())
+    reported = [e for e in events(stream) if e["event"] == "progress"]
+    assert len(reported) == 1
+    assert reported[0]["bytes"] == 1000
+
+
+def test_bar_mode_lists_largest_remaining_files(run):
+    stream = io.StringIO()
+
+    async def scenario():
+        tracker = ProgressTracker("bar", interval=3600, top_n=2, stream=stream)
+        files = [
+            tracker.start_file(name, 100, initial=done)
+            for name, done in (("a", 90), ("b", 10), ("c", 50))
+        ]
+        top = [p.name for p in tracker._top_files()]
+        for progress in files:
+            progress.close()
+        await tracker.close()
+        return top
+
+    assert run(scenario()) == ["b", "c"]
+    assert "Total" in stream.getvalue()
+
+
+def test_none_mode_writes_nothing(run):
+    stream = io.StringIO()
+
+    async def scenario():
+        async with ProgressTracker("none", stream=stream) as tracker:
+            with tracker.start_file("a.bin", 100) as progress:
+                progress.update(100)
+
+    run(scenario())
+    assert stream.getvalue() == ""
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ProgressTracker("fancy")
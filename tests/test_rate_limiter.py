@@ -0,0 +1,18 @@
+from gofile_dl.downloader import RateLimiter
+
+
+def test_limiter_without_rate_is_falsy():
+    parent = RateLimiter()
+    job = RateLimiter(parent=parent)
+    assert not parent
+    assert not job
+    # 全体の制限は実行中に設定されても子に反映される
+    parent.rate = 1024
+    assert parent
+    assert job
+    parent.rate = None
+    assert not job
+
+
+def test_job_rate_enables_limiter():
+    assert RateLimiter(1024, parent=RateLimiter())
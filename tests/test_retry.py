@@ -0,0 +1,77 @@
+import asyncio
+
+from gofile_dl.downloader import CircuitBreaker, RetryPolicy
+
+
+def test_retry_delay_is_bounded():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    assert all(0 <= policy.delay(attempt) <= 5.0 for attempt in range(1, 10))
+    # Retry-After があればそれに従う（上限は max_delay）
+    assert policy.delay(1, retry_after=2.0) == 2.0
+    assert policy.delay(1, retry_after=600.0) == 5.0
+
+
+def test_circuit_opens_after_consecutive_failures(run):
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        opened = [breaker.record_failure("host") for _ in range(3)]
+        assert opened == [False, False, True]
+        assert breaker.is_open("host")
+        # 他のサーバーには影響しない
+        await breaker.acquire("other")
+        waiting = asyncio.ensure_future(breaker.acquire("host"))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        waiting.cancel()
+
+    run(scenario())
+
+
+def test_half_open_lets_one_trial_through(run):
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure("host")
+        waiters = [
+            asyncio.ensure_future(breaker.acquire("host")) for _ in range(3)
+        ]
+        await asyncio.sleep(0.1)
+        # 1件だけが試行として通り、残りは結果を待つ
+        assert sum(waiter.done() for waiter in waiters) == 1
+        breaker.record_success("host")
+        await asyncio.gather(*waiters)
+        assert not breaker.is_open("host")
+
+    run(scenario())
+
+
+def test_failed_trial_reopens_circuit(run):
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure("host")
+        trial = await breaker.acquire("host")
+        assert trial is not None
+        assert breaker.record_failure("host", trial)
+        waiting = asyncio.ensure_future(breaker.acquire("host"))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await waiting
+
+    run(scenario())
+
+
+def test_only_the_trial_ends_the_trial(run):
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure("host")
+        trial = await breaker.acquire("host")
+        waiting = asyncio.ensure_future(breaker.acquire("host"))
+        # 開く前から実行中だった転送の失敗や中断は試行の結果ではない
+        assert not breaker.record_failure("host")
+        breaker.release("host")
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        breaker.release("host", trial)
+        # 取り消された試行の代わりに待っていた転送が試行になる
+        assert await waiting is not None
+
+    run(scenario())
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from gofile_dl.downloader.scheduler import DownloadScheduler
+
+
+async def start_order(scheduler, requests):
+    """接続枠を塞いだ状態で requests を登録し、開始された順を返す"""
+    order = []
+    release = asyncio.Event()
+
+    async def blocker():
+        await release.wait()
+
+    def transfer(name):
+        async def func():
+            order.append(name)
+
+        return func
+
+    blocking = asyncio.ensure_future(scheduler.run(blocker))
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.ensure_future(scheduler.run(transfer(name), **kwargs))
+        for name, kwargs in requests
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(blocking, *tasks)
+    return order
+
+
+@pytest.mark.parametrize(
+    "policy, expected",
+    [
+        ("fifo", ["big", "small", "unknown", "mid"]),
+        ("smallest_first", ["small", "mid", "big", "unknown"]),
+        ("largest_first", ["big", "mid", "small", "unknown"]),
+    ],
+)
+def test_policy_orders_waiting_transfers(run, policy, expected):
+    requests = [
+        ("big", {"size": 300}),
+        ("small", {"size": 100}),
+        ("unknown", {}),
+        ("mid", {"size": 200}),
+    ]
+    scheduler = DownloadScheduler(max_connections=1, policy=policy)
+    assert run(start_order(scheduler, requests)) == expected
+
+
+def test_priority_comes_before_policy(run):
+    requests = [
+        ("small", {"size": 1}),
+        ("urgent", {"size": 1000, "priority": 1}),
+        ("background", {"size": 0, "priority": -1}),
+    ]
+    scheduler = DownloadScheduler(max_connections=1)
+    assert run(start_order(scheduler, requests)) == [
+        "urgent",
+        "small",
+        "background",
+    ]
+
+
+def test_per_host_limit_lets_other_hosts_start(run):
+    scheduler = DownloadScheduler(max_connections=4, max_per_host=1)
+    running = []
+    release = asyncio.Event()
+
+    async def transfer():
+        running.append(scheduler.active)
+        await release.wait()
+
+    async def scenario():
+        tasks = [
+            asyncio.ensure_future(scheduler.run(transfer, host=host))
+            for host in ("a", "a", "b")
+        ]
+        await asyncio.sleep(0.01)
+        started = (len(running), scheduler.active, scheduler.pending)
+        release.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    # a の2件目は a の1件目が終わるまで待つ
+    assert run(scenario()) == (2, 2, 1)
+    assert scheduler.active == 0
+
+
+def test_cancelled_waiter_releases_nothing(run):
+    scheduler = DownloadScheduler(max_connections=1)
+    release = asyncio.Event()
+
+    async def scenario():
+        blocking = asyncio.ensure_future(scheduler.run(release.wait))
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(scheduler.run(release.wait))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.pending == 0
+        release.set()
+        await blocking
+
+    run(scenario())
+    assert scheduler.active == 0
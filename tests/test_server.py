@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from gofile_dl.service import DownloadService, JobStore, create_app
+from gofile_dl.service.server import is_loopback, parse_job
+from gofile_dl.ui.cli import CLI
+
+
+def test_output_stays_under_the_output_directory(tmp_path):
+    root = tmp_path / "downloads"
+    job = parse_job({"url": "XXXXXX", "output": "shared"}, str(root))
+    assert job["output"] == str(root.resolve() / "shared")
+    job = parse_job(
+        {"url": "XXXXXX", "mode": "archive", "archive_format": "tar"},
+        str(root),
+    )
+    assert job["output"] == str(root.resolve() / "XXXXXX.tar")
+    for output in ("../outside", "/etc", str(tmp_path)):
+        with pytest.raises(ValueError):
+            parse_job({"url": "XXXXXX", "output": output}, str(root))
+
+
+def test_loopback_addresses():
+    assert is_loopback("127.0.0.1")
+    assert is_loopback("[::1]")
+    assert is_loopback("localhost")
+    assert not is_loopback("0.0.0.0")  # noqa: S104
+    assert not is_loopback("example.com")
+
+
+def test_non_loopback_listen_requires_token(monkeypatch):
+    monkeypatch.delenv("GOFILE_DL_API_TOKEN", raising=False)
+    with pytest.raises(SystemExit):
+        CLI().run(["--serve", "--listen", "0.0.0.0:8765"])
+
+
+def test_api_token_is_required(run, tmp_path):
+    async def scenario():
+        with JobStore(tmp_path / "jobs.sqlite") as store:
+            service = DownloadService(None, store)
+            app = create_app(
+                service,
+                default_output=str(tmp_path),
+                api_token="s3cret",  # noqa: S106
+            )
+            async with TestClient(TestServer(app)) as client:
+                denied = await client.get("/health")
+                wrong = await client.post(
+                    "/jobs",
+                    json={"url": "XXXXXX"},
+                    headers={"Authorization": "Bearer nope"},
+                )
+                allowed = await client.get(
+                    "/health", headers={"Authorization": "Bearer s3cret"}
+                )
+                return denied.status, wrong.status, allowed.status
+
+    assert run(scenario()) == (401, 401, 200)
+
+
+def test_posts_must_be_json(run, tmp_path):
+    async def scenario():
+        with JobStore(tmp_path / "jobs.sqlite") as store:
+            service = DownloadService(None, store)
+            app = create_app(service, default_output=str(tmp_path))
+            async with TestClient(TestServer(app)) as client:
+                # 他のサイトのフォームから送れる形式は受け付けない
+                plain = await client.post(
+                    "/jobs",
+                    data='{"url": "XXXXXX"}',
+                    headers={"Content-Type": "text/plain"},
+                )
+                created = await client.post("/jobs", json={"url": "XXXXXX"})
+                job = await created.json()
+                pause = f"/jobs/{job['id']}/pause"
+                bare = await client.post(pause)
+                paused = await client.post(
+                    pause, headers={"Content-Type": "application/json"}
+                )
+                outside = await client.post(
+                    "/jobs", json={"url": "XXXXXX", "output": "../x"}
+                )
+                return (
+                    plain.status,
+                    created.status,
+                    bare.status,
+                    paused.status,
+                    outside.status,
+                    store.get(job["id"])["status"],
+                )
+
+    assert run(scenario()) == (415, 201, 415, 200, 400, "paused")
+
+
+def test_service_runs_submitted_jobs(run, mock, open_downloader, tmp_path):
+    root = mock.add_folder("root")
+    mock.add_file(root, "a.bin", 64 * 1024)
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            with JobStore(tmp_path / "jobs.sqlite") as store:
+                service = DownloadService(downloader, store)
+                await service.start()
+                try:
+                    job = service.submit(
+                        url=root, output=str(tmp_path / "out")
+                    )
+                    while store.get(job["id"])["status"] != "done":
+                        await asyncio.sleep(0.05)
+                finally:
+                    await service.stop()
+                return store.get(job["id"])
+
+    job = run(scenario())
+    assert [f["filename"] for f in job["result"]["files"]] == ["root/a.bin"]
+    assert (tmp_path / "out" / root / "root" / "a.bin").exists()
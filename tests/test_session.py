@@ -0,0 +1,14 @@
+from gofile_dl.session import ConnectionPoolConfig, create_session
+
+
+def test_session_does_not_limit_whole_transfers(run):
+    async def scenario():
+        config = ConnectionPoolConfig(read_timeout=5)
+        async with create_session(config) as session:
+            return session.timeout
+
+    timeout = run(scenario())
+    # 大きなファイルの転送が全体の時間で打ち切られない
+    assert timeout.total is None
+    assert timeout.sock_connect == 30
+    assert timeout.sock_read == 5
@@ -0,0 +1,104 @@
+import io
+
+import aiohttp
+import pytest
+
+from gofile_dl.downloader import FileDownloader, ProgressTracker
+from gofile_dl.downloader.stream import BinaryIOSink
+from gofile_dl.session import create_session
+
+MiB = 1024 * 1024
+
+
+async def collect(mock, file_id, **kwargs):
+    """FileDownloader.stream_file のチャンクを全て受け取る"""
+    info = mock.describe(file_id)
+    kwargs.setdefault("md5", info["md5"])
+    async with create_session() as session:
+        downloader = FileDownloader(
+            session, "test", progress=ProgressTracker("none")
+        )
+        chunks = [
+            chunk
+            async for chunk in downloader.stream_file(
+                info["link"], info["size"], **kwargs
+            )
+        ]
+    return b"".join(chunks)
+
+
+def test_stream_resumes_with_range_after_disconnect(run, mock):
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", MiB)
+    mock.config.disconnect_rate = 1.0
+
+    async def scenario():
+        async with mock:
+            return await collect(mock, file_id, max_resumes=20)
+
+    assert run(scenario()) == mock.content(file_id)
+    assert mock.stats["downloads"] > 1
+    # 続きから再開するため、同じバイトを2回受信しない
+    assert mock.stats["bytes_sent"] == MiB
+
+
+def test_stream_gives_up_after_max_resumes(run, mock):
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", MiB)
+    mock.config.disconnect_rate = 1.0
+
+    async def scenario():
+        async with mock:
+            return await collect(mock, file_id, max_resumes=1)
+
+    with pytest.raises(aiohttp.ClientPayloadError):
+        run(scenario())
+    assert mock.stats["downloads"] == 2
+
+
+def test_stream_rejects_checksum_mismatch(run, mock):
+    file_id = mock.add_file(mock.add_folder("root"), "a.bin", 1024)
+
+    async def scenario():
+        async with mock:
+            return await collect(mock, file_id, md5="0" * 32)
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        run(scenario())
+
+
+def test_stream_selects_a_file_by_path(run, mock, open_downloader):
+    root = mock.add_folder("root")
+    mock.add_file(root, "a.bin", 1024)
+    file_id = mock.add_file(root, "b.bin", 2048)
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            with pytest.raises(ValueError, match="specify a path"):
+                async for _ in downloader.stream(root):
+                    pass
+            return b"".join(
+                [
+                    chunk
+                    async for chunk in downloader.stream(
+                        root, path="root/b.bin"
+                    )
+                ]
+            )
+
+    assert run(scenario()) == mock.content(file_id)
+
+
+def test_stream_to_writes_into_a_binary_sink(run, mock, open_downloader):
+    root = mock.add_folder("root")
+    file_id = mock.add_file(root, "a.bin", 256 * 1024)
+    output = io.BytesIO()
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            sink = BinaryIOSink(output)
+            try:
+                return await downloader.stream_to(root, sink)
+            finally:
+                await sink.close()
+
+    assert run(scenario()) == 256 * 1024
+    assert output.getvalue() == mock.content(file_id)
@@ -0,0 +1,81 @@
+from gofile_dl.downloader import SyncManifest
+
+
+def test_sync_downloads_only_changes_and_prunes(
+    run, mock, open_downloader, tmp_path
+):
+    root = mock.add_folder("root")
+    mock.add_file(root, "a.bin", 1024)
+    removed = mock.add_file(root, "b.bin", 1024)
+    content_dir = tmp_path / root / "root"
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            first = await downloader.sync(root, output_dir=str(tmp_path))
+            second = await downloader.sync(root, output_dir=str(tmp_path))
+            mock.remove(removed)
+            mock.add_file(root, "c.bin", 1024)
+            third = await downloader.sync(
+                root, output_dir=str(tmp_path), prune=True
+            )
+            return first, second, third
+
+    first, second, third = run(scenario())
+    assert first["sync"] == {
+        "added": 2,
+        "changed": 0,
+        "unchanged": 0,
+        "pruned": 0,
+    }
+    assert second["sync"]["unchanged"] == 2
+    assert third["sync"] == {
+        "added": 1,
+        "changed": 0,
+        "unchanged": 1,
+        "pruned": 1,
+    }
+    assert mock.stats["downloads"] == 3
+    assert sorted(p.name for p in content_dir.glob("*.bin")) == [
+        "a.bin",
+        "c.bin",
+    ]
+    with SyncManifest(tmp_path / root / SyncManifest.FILE_NAME) as manifest:
+        assert sorted(r["name"] for r in manifest.load(root).values()) == [
+            "root/a.bin",
+            "root/c.bin",
+        ]
+
+
+def test_sync_without_prune_keeps_removed_files(
+    run, mock, open_downloader, tmp_path
+):
+    root = mock.add_folder("root")
+    removed = mock.add_file(root, "a.bin", 1024)
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            await downloader.sync(root, output_dir=str(tmp_path))
+            mock.remove(removed)
+            return await downloader.sync(root, output_dir=str(tmp_path))
+
+    result = run(scenario())
+    assert result["sync"]["pruned"] == 0
+    assert (tmp_path / root / "root" / "a.bin").exists()
+
+
+def test_sync_redownloads_a_truncated_local_file(
+    run, mock, open_downloader, tmp_path
+):
+    root = mock.add_folder("root")
+    file_id = mock.add_file(root, "a.bin", 1024)
+    path = tmp_path / root / "root" / "a.bin"
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            await downloader.sync(root, output_dir=str(tmp_path))
+            path.write_bytes(b"x")
+            return await downloader.sync(root, output_dir=str(tmp_path))
+
+    result = run(scenario())
+    assert result["sync"]["changed"] == 1
+    assert path.read_bytes() == mock.content(file_id)
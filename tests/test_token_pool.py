@@ -0,0 +1,83 @@
+from gofile_dl.token.token_pool import TokenPool
+
+
+class FakeTokenManager:
+    """固定のトークンを配る TokenManager の代わり"""
+
+    def __init__(self, *tokens):
+        self.tokens = list(tokens)
+        self.invalidated = []
+
+    async def refresh(self):
+        pass
+
+    def valid_tokens(self):
+        return [t for t in self.tokens if t not in self.invalidated]
+
+    async def claim_token(self, known):
+        raise AssertionError("No token should be created")
+
+    async def invalidate_token(self, token):
+        self.invalidated.append(token)
+
+
+def test_single_rejection_does_not_invalidate(run):
+    manager = FakeTokenManager("a", "b")
+
+    async def scenario():
+        pool = TokenPool(manager, max_size=2, min_size=2)
+        assert await pool.acquire() == "a"
+        await pool.report("a", 403)
+        # 拒否されたトークンはしばらく他のトークンに譲る
+        assert await pool.acquire() == "b"
+        assert manager.invalidated == []
+        return pool.tokens
+
+    assert run(scenario()) == ["a", "b"]
+
+
+def test_repeated_rejection_invalidates(run):
+    manager = FakeTokenManager("a", "b")
+
+    async def scenario():
+        pool = TokenPool(manager, max_size=2, min_size=2)
+        await pool.acquire()
+        await pool.report("a", 403)
+        await pool.report("a", 401)
+        return pool.tokens
+
+    assert run(scenario()) == ["b"]
+    assert manager.invalidated == ["a"]
+
+
+def test_success_resets_rejections(run):
+    manager = FakeTokenManager("a", "b")
+
+    async def scenario():
+        pool = TokenPool(manager, max_size=2, min_size=2, cooldown=0)
+        await pool.acquire()
+        await pool.report("a", 403)
+        await pool.report("a", 200)
+        await pool.report("a", 403)
+
+    run(scenario())
+    assert manager.invalidated == []
+
+
+def test_rejected_download_retries_with_another_token(
+    run, mock, open_downloader, tmp_path
+):
+    root = mock.add_folder("root")
+    mock.add_file(root, "a.bin", 64 * 1024)
+    mock.config.rejected_tokens = {"bad"}
+    manager = FakeTokenManager("bad", "good")
+
+    async def scenario():
+        pool = TokenPool(manager, max_size=2, min_size=2)
+        async with open_downloader(token_pool=pool) as downloader:
+            return await downloader.download(root, output_dir=str(tmp_path))
+
+    result = run(scenario())
+    assert result["status"] == "success", result
+    assert mock.stats["downloads"] == 1
+    assert manager.invalidated == []
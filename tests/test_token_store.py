@@ -0,0 +1,112 @@
+import asyncio
+import multiprocessing
+import os
+import stat
+
+import pytest
+
+from gofile_dl.token.token_manager import create_token_store
+from gofile_dl.token.token_store import fcntl, open_locked
+
+pytestmark = pytest.mark.skipif(
+    fcntl is None, reason="cross-process locking requires fcntl"
+)
+
+STORES = ["tokens.json", "tokens.sqlite"]
+PROCESSES = 4
+TOKENS_PER_PROCESS = 10
+
+
+def add_tokens(path, worker):
+    """別のプロセスからトークンを追加し、共有のトークンを更新"""
+
+    async def scenario():
+        store = create_token_store(path)
+        for i in range(TOKENS_PER_PROCESS):
+            await store.add({"token": f"{worker}-{i}", "valid": True})
+            await store.update("shared", {"seen": {str(worker): i}})
+
+    asyncio.run(scenario())
+
+
+def run_processes(target, *args):
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=target, args=(*args, worker))
+        for worker in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+
+@pytest.mark.parametrize("name", STORES)
+def test_concurrent_writers_do_not_lose_updates(run, tmp_path, name):
+    path = str(tmp_path / name)
+    run(create_token_store(path).add({"token": "shared", "seen": {}}))
+
+    run_processes(add_tokens, path)
+
+    tokens = create_token_store(path).load_tokens()
+    assert len(tokens) == PROCESSES * TOKENS_PER_PROCESS + 1
+    shared = next(t for t in tokens if t["token"] == "shared")  # noqa: S105
+    # 辞書の値は他のプロセスの更新と統合される
+    assert shared["seen"] == {
+        str(worker): TOKENS_PER_PROCESS - 1 for worker in range(PROCESSES)
+    }
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+@pytest.mark.parametrize("name", STORES)
+def test_changes_by_other_processes_are_detected(run, tmp_path, name):
+    path = str(tmp_path / name)
+    store = create_token_store(path)
+
+    async def scenario():
+        await store.add({"token": "a", "valid": True})
+        before = await store.changed()
+        await create_token_store(path).update("a", {"valid": False})
+        after = await store.changed()
+        return before, after, await store.load()
+
+    before, after, tokens = run(scenario())
+    assert not before
+    assert after
+    assert tokens == [{"token": "a", "valid": False}]
+
+
+def hold_lock(path, ready, release):
+    """ロックを取って release まで保持する"""
+    with open_locked(path):
+        ready.set()
+        release.wait(30)
+
+
+def test_create_lock_waits_for_other_processes(run, tmp_path):
+    store = create_token_store(str(tmp_path / "tokens.json"))
+    context = multiprocessing.get_context("spawn")
+    ready, release = context.Event(), context.Event()
+    holder = context.Process(
+        target=hold_lock,
+        args=(f"{store.path}.create.lock", ready, release),
+    )
+    holder.start()
+    assert ready.wait(30)
+
+    async def acquire():
+        async with store.create_lock():
+            pass
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(acquire(), 0.2)
+        release.set()
+        await acquire()
+
+    try:
+        run(scenario())
+    finally:
+        release.set()
+        holder.join(30)
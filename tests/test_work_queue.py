@@ -0,0 +1,128 @@
+import asyncio
+import sqlite3
+
+from gofile_dl.downloader import FileEntry, WorkQueue
+
+
+def entry(name, size=1):
+    return FileEntry(name, f"http://store/{name}", size, None, name, None)
+
+
+def test_claims_largest_first_and_completes(run, tmp_path):
+    async def scenario():
+        queue = WorkQueue(tmp_path / "queue.sqlite")
+        assert await queue.publish("c", [entry("a", 1), entry("b", 3)]) == 2
+        # 同じファイルを公開し直しても増えない
+        assert await queue.publish("c", [entry("a", 1)]) == 0
+
+        claimed = await queue.claim("w1", 1)
+        assert [e.name for _, e in claimed] == ["b"]
+        assert await queue.complete("w1", "c", claimed[0][1])
+        assert (await queue.counts())["done"] == 1
+        assert await queue.remaining() == 1
+
+    run(scenario())
+
+
+def test_expired_lease_is_claimed_by_another_worker(run, tmp_path):
+    async def scenario():
+        queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=0)
+        await queue.publish("c", [entry("a")])
+        assert await queue.claim("w1")
+        # w1 はリースを更新しないまま落ちた
+        assert [e.name for _, e in await queue.claim("w2")] == ["a"]
+
+    run(scenario())
+
+
+def test_failed_file_is_retried_until_max_attempts(run, tmp_path):
+    async def scenario():
+        queue = WorkQueue(tmp_path / "queue.sqlite", max_attempts=2)
+        await queue.publish("c", [entry("a")])
+        _, claimed = (await queue.claim("w1"))[0]
+        assert not await queue.fail("w1", "c", claimed, "boom")
+        _, claimed = (await queue.claim("w2"))[0]
+        assert await queue.fail("w2", "c", claimed, "boom")
+        assert (await queue.counts())["failed"] == 1
+        assert await queue.claim("w3") == []
+
+    run(scenario())
+
+
+def test_stale_worker_cannot_report_a_re_leased_file(run, tmp_path):
+    async def scenario():
+        queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=0)
+        await queue.publish("c", [entry("a")])
+        _, stale = (await queue.claim("w1"))[0]
+        # w1 が止まっている間にリースが切れて w2 に渡った
+        assert await queue.claim("w2")
+        assert not await queue.fail("w1", "c", stale, "boom")
+        assert not await queue.complete("w1", "c", stale)
+        counts = await queue.counts()
+        assert counts["leased"] == 1
+        assert await queue.complete("w2", "c", stale)
+
+    run(scenario())
+
+
+def test_file_that_keeps_crashing_workers_fails(run, tmp_path):
+    async def scenario():
+        queue = WorkQueue(
+            tmp_path / "queue.sqlite", lease_seconds=0, max_attempts=3
+        )
+        await queue.publish("c", [entry("a"), entry("b", 0)])
+        # a を借りたワーカーが毎回落ちる
+        for worker in ("w1", "w2", "w3"):
+            assert [e.name for _, e in await queue.claim(worker)] == ["a"]
+        assert [e.name for _, e in await queue.claim("w4")] == ["b"]
+        counts = await queue.counts()
+        assert counts["failed"] == 1
+        assert counts["leased"] == 1
+
+    run(scenario())
+
+
+def test_waiting_for_the_lock_does_not_block_the_loop(run, tmp_path):
+    path = tmp_path / "queue.sqlite"
+
+    async def scenario():
+        queue = WorkQueue(path, timeout=5)
+        await queue.publish("c", [entry("a")])
+        # 他のプロセスが書き込みロックを持ったまま
+        other = sqlite3.connect(str(path), isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        claim = asyncio.ensure_future(queue.claim("w1"))
+        # ロックを待つ間もイベントループは動き続ける
+        await asyncio.sleep(0.1)
+        assert not claim.done()
+        other.execute("COMMIT")
+        other.close()
+        assert len(await claim) == 1
+
+    run(scenario())
+
+
+def test_workers_share_published_files(run, mock, open_downloader, tmp_path):
+    root = mock.build_tree(20, 64 * 1024, folders=2)
+    path = tmp_path / "queue.sqlite"
+
+    async def scenario():
+        async with open_downloader() as downloader:
+            published = await downloader.publish(root, WorkQueue(path))
+            results = await asyncio.gather(
+                *(
+                    downloader.work(
+                        WorkQueue(path), tmp_path / "out", poll_interval=0.05
+                    )
+                    for _ in range(2)
+                )
+            )
+            return published, results
+
+    published, results = run(scenario())
+    assert published["published"] == 20
+    names = [file["filename"] for r in results for file in r["files"]]
+    assert sorted(names) == sorted(set(names))
+    assert len(names) == 20
+    assert mock.stats["downloads"] == 20
+    assert all(r["status"] == "success" for r in results)